@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped columnar cache of activity summaries.
+Stores the numeric and date fields of every activity as fixed-width NumPy .npy columns
+(strings as codes into a small table) next to a fingerprint of data/activities.json, so
+stats code can mmap the columns instead of parsing the whole JSON document. The cache is
+rebuilt automatically when the fingerprint no longer matches the source file.
+"""
+
+import hashlib
+import os
+import numpy as np
+from timezone_config import get_derived_fields, DERIVED_FIELDS_VERSION
+from activity_model import load_activity_models, extract_city_from_activity
+from storage_codec import stored_path
+from serialization import load_json, dump_json
+
+ACTIVITIES_FILE = 'data/activities.json'
+CACHE_DIR = 'data/activity_columns'
+META_FILE = 'meta.json'
+
+# Bump when the columns change so stale caches are rebuilt
+CACHE_VERSION = 1
+
+# Missing numbers are stored as NaN (floats) or 0 (ids, times, years)
+NUMERIC_COLUMNS = {
+    'id': np.int64,
+    'epoch': np.int64,
+    'year': np.int16,
+    'distance': np.float64,
+    'moving_time': np.int32,
+    'elapsed_time': np.int32,
+    'total_elevation_gain': np.float64,
+    'average_speed': np.float64,
+    'average_heartrate': np.float64,
+    'max_heartrate': np.float64,
+    'suffer_score': np.float64,
+    'pace': np.float64
+}
+
+# Stored as int32 codes into a per-column string table
+STRING_COLUMNS = ('sport_type', 'local_date', 'city')
+
+
+def source_fingerprint(file_path=ACTIVITIES_FILE, known=None):
+    """
+    Fingerprint of the source file: size, mtime and content hash.
+
+    The hash is only recomputed when size or mtime differ from a known fingerprint, so a
+    fresh cache is confirmed with a single stat call.
+    """
+    file_path = stored_path(file_path)
+    stat = os.stat(file_path)
+    if known and known.get('size') == stat.st_size and known.get('mtime_ns') == stat.st_mtime_ns:
+        return known
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+
+
+def number(value, missing=np.nan):
+    """Column value of an optional number."""
+    return missing if value is None else value
+
+
+def build_columns(activities):
+    """Flatten activities into numeric arrays and (codes, table) string columns."""
+    values = {name: [] for name in NUMERIC_COLUMNS}
+    strings = {name: [] for name in STRING_COLUMNS}
+
+    for activity in activities:
+        derived = get_derived_fields(activity)
+        values['id'].append(activity.get('id') or 0)
+        values['epoch'].append(derived.get('epoch') or 0)
+        values['year'].append(derived.get('year') or 0)
+        values['distance'].append(activity.get('distance') or 0)
+        values['moving_time'].append(activity.get('moving_time') or 0)
+        values['elapsed_time'].append(activity.get('elapsed_time') or 0)
+        values['total_elevation_gain'].append(number(activity.get('total_elevation_gain')))
+        values['average_speed'].append(number(activity.get('average_speed')))
+        values['average_heartrate'].append(number(activity.get('average_heartrate')))
+        values['max_heartrate'].append(number(activity.get('max_heartrate')))
+        values['suffer_score'].append(number(activity.get('suffer_score')))
+        values['pace'].append(number(derived.get('pace')))
+        strings['sport_type'].append(activity.get('sport_type') or activity.get('type') or 'Unknown')
+        strings['local_date'].append(derived.get('local_date') or '')
+        strings['city'].append(extract_city_from_activity(activity))
+
+    columns = {name: np.array(column, dtype=NUMERIC_COLUMNS[name]) for name, column in values.items()}
+    tables = {}
+    for name, column in strings.items():
+        table, codes = np.unique(np.array(column, dtype=object), return_inverse=True)
+        tables[name] = [str(value) for value in table]
+        columns[name] = codes.astype(np.int32).reshape(-1)
+    return columns, tables
+
+
+def write_activity_columns(activities, source_file=ACTIVITIES_FILE, cache_dir=CACHE_DIR):
+    """Write the column cache for activities just saved to source_file."""
+    columns, tables = build_columns(activities)
+    os.makedirs(cache_dir, exist_ok=True)
+    for name, column in columns.items():
+        np.save(os.path.join(cache_dir, f'{name}.npy'), column, allow_pickle=False)
+
+    # Written last: a cache without matching meta is treated as stale
+    dump_json(os.path.join(cache_dir, META_FILE), {
+        'version': CACHE_VERSION,
+        'derived_version': DERIVED_FIELDS_VERSION,
+        'fingerprint': source_fingerprint(source_file),
+        'count': len(activities),
+        'strings': tables
+    })
+    return len(activities)
+
+
+class ActivityColumns:
+    """
+    Read-only view of the cached columns.
+
+    Numeric columns are memory-mapped arrays (columns['distance']); string columns are int32
+    codes, decoded with text(name, position) or compared via code(name, value).
+    """
+
+    def __init__(self, columns, tables, count):
+        self.columns = columns
+        self.tables = tables
+        self.count = count
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return self.count
+
+    def text(self, name, position):
+        """Decoded string value of one row."""
+        return self.tables[name][self.columns[name][position]]
+
+    def code(self, name, value):
+        """Code of a string value, or -1 if no row has it."""
+        try:
+            return self.tables[name].index(value)
+        except ValueError:
+            return -1
+
+
+def read_activity_columns(source_file=ACTIVITIES_FILE, cache_dir=CACHE_DIR):
+    """Map the cached columns, or return None if the cache is missing or stale."""
+    try:
+        meta = load_json(os.path.join(cache_dir, META_FILE))
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != CACHE_VERSION or meta.get('derived_version') != DERIVED_FIELDS_VERSION:
+        return None
+
+    fingerprint = source_fingerprint(source_file, meta.get('fingerprint'))
+    if fingerprint.get('sha256') != meta['fingerprint'].get('sha256'):
+        return None
+    if fingerprint is not meta['fingerprint']:
+        # Same content with a new mtime (e.g. a fresh checkout): remember it to skip the hash
+        meta['fingerprint'] = fingerprint
+        dump_json(os.path.join(cache_dir, META_FILE), meta)
+
+    columns = {}
+    try:
+        for name in list(NUMERIC_COLUMNS) + list(STRING_COLUMNS):
+            columns[name] = np.load(os.path.join(cache_dir, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to map {cache_dir}, rebuilding: {e}")
+        return None
+    if any(len(column) != meta['count'] for column in columns.values()):
+        return None
+    return ActivityColumns(columns, meta['strings'], meta['count'])
+
+
+def load_activity_columns(source_file=ACTIVITIES_FILE, cache_dir=CACHE_DIR, activities=None):
+    """
+    Map the column cache, rebuilding it first if the source file changed.
+
+    activities, when the caller has already loaded them, saves re-reading the source.
+    """
+    columns = read_activity_columns(source_file, cache_dir)
+    if columns is None:
+        if activities is None:
+            activities = load_activity_models(source_file)
+        write_activity_columns(activities, source_file, cache_dir)
+        columns = read_activity_columns(source_file, cache_dir)
+    return columns
+
+
+if __name__ == "__main__":
+    count = write_activity_columns(load_json(ACTIVITIES_FILE))
+    print(f"Cached columns of {count} activities in {CACHE_DIR}/")
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Compact activity model.
+Keeps the fields the stats and rendering code actually read in __slots__ attributes and
+parks the heavy nested Strava data (laps, splits, efforts, athlete, photos, ...) behind a
+lazy loader, so analysis scripts hold a fraction of the memory of the raw JSON dicts.
+"""
+
+from cold_storage import load_cold
+from serialization import dumps, loads, load_json
+
+ACTIVITIES_FILE = 'data/activities.json'
+
+# Types checked when loading activities.json; a mismatch means a corrupt or foreign file
+ACTIVITY_SCHEMA = {
+    'id': int, 'name': str, 'type': str, 'sport_type': str,
+    'start_date': str, 'start_date_local': str, 'utc_offset': (int, float),
+    'distance': (int, float), 'moving_time': int, 'elapsed_time': int,
+    'average_heartrate': (int, float), 'max_heartrate': (int, float),
+    'start_latlng': list, 'end_latlng': list, 'map': dict, 'derived': dict, 'cold': dict
+}
+
+# Fields read by the stats, aggregate, index and rendering code
+HOT_FIELDS = (
+    'id', 'name', 'type', 'sport_type', 'resource_state',
+    'start_date', 'start_date_local', 'timezone', 'utc_offset',
+    'distance', 'moving_time', 'elapsed_time', 'total_elevation_gain', 'average_speed', 'max_speed',
+    'average_heartrate', 'max_heartrate', 'suffer_score',
+    'start_latlng', 'end_latlng', 'location_city', 'location_country',
+    'device_name', 'gear_id', 'derived'
+)
+HOT_FIELD_SET = frozenset(HOT_FIELDS)
+
+_MISSING = object()
+
+
+def encode_cold(cold):
+    """Serialize cold fields to compact JSON bytes."""
+    return dumps(cold)
+
+
+def decode_cold(reference):
+    """Default cold loader: the reference is the encoded JSON itself."""
+    return loads(reference) if reference else {}
+
+
+def extract_city_from_activity(activity):
+    """Extract city information from activity data."""
+    # First try explicit location fields
+    if activity.get('location_city'):
+        return activity['location_city']
+
+    # Try to extract from timezone
+    timezone = activity.get('timezone', '')
+    if timezone:
+        # Format: "(GMT+08:00) Asia/Shanghai" -> "Shanghai"
+        if 'Asia/' in timezone:
+            city = timezone.split('Asia/')[-1].strip(')')
+            return city
+        elif 'Europe/' in timezone:
+            city = timezone.split('Europe/')[-1].strip(')')
+            return city
+        elif 'America/' in timezone:
+            city = timezone.split('America/')[-1].strip(')')
+            # Handle cases like "America/New_York" -> "New York"
+            city = city.replace('_', ' ')
+            return city
+        elif 'Australia/' in timezone:
+            city = timezone.split('Australia/')[-1].strip(')')
+            return city
+
+    # Try location_country as fallback
+    if activity.get('location_country'):
+        return activity['location_country']
+
+    # Final fallback
+    return "Unknown"
+
+
+
+class Activity:
+    """
+    One activity with hot fields as attributes and cold fields loaded on demand.
+
+    Supports the dict operations the scripts use (get, [], in, item assignment), so code
+    written against raw Strava dicts works unchanged. Cold fields are decoded the first time
+    one is read and then kept; detail in cold storage is only read for the fields stored
+    there, so reading the route never touches the disk.
+    """
+
+    __slots__ = HOT_FIELDS + ('polyline', '_cold', '_cold_ref', '_cold_keys', '_ref_keys', '_loader',
+                              '_inline_cache', '_cold_cache')
+
+    def __init__(self):
+        self._cold = None
+        self._cold_ref = None
+        self._cold_keys = ()
+        self._ref_keys = frozenset()
+        self._loader = decode_cold
+        self._inline_cache = None
+        self._cold_cache = None
+
+    @classmethod
+    def from_dict(cls, data, encode=encode_cold, loader=decode_cold):
+        """Split a Strava activity dict into hot attributes and an encoded cold part."""
+        activity = cls()
+        cold = {}
+        for key, value in data.items():
+            if key in HOT_FIELD_SET:
+                setattr(activity, key, value)
+            elif key == 'cold' and isinstance(value, dict):
+                # Detail fields moved to data/cold/ by the sync; read only when asked for
+                activity._cold_ref = value['ref']
+            elif key == 'map' and isinstance(value, dict):
+                if 'summary_polyline' in value:
+                    activity.polyline = value['summary_polyline']
+                rest = {k: v for k, v in value.items() if k != 'summary_polyline'}
+                if rest:
+                    cold['map'] = rest
+            else:
+                cold[key] = value
+
+        ref_fields = data['cold'].get('fields', []) if activity._cold_ref else []
+        activity._cold_keys = tuple(cold) + tuple(field for field in ref_fields if field not in cold)
+        activity._ref_keys = frozenset(field for field in ref_fields if field not in cold)
+        activity._cold = encode(cold) if cold else None
+        activity._loader = loader
+        return activity
+
+    @property
+    def summary_polyline(self):
+        """Encoded route, or None (read from its slot, without decoding any cold data)."""
+        return getattr(self, 'polyline', None)
+
+    def inline_cold(self):
+        """Decode the cold fields kept in activities.json (not those in cold storage)."""
+        if self._inline_cache is None:
+            self._inline_cache = self._loader(self._cold)
+        return self._inline_cache
+
+    def cold(self):
+        """Decode the cold fields, reading referenced detail from cold storage."""
+        if not self._cold_keys:
+            return {}
+        if self._cold_cache is None:
+            cold = dict(self.inline_cold())
+            if self._cold_ref:
+                for key, value in load_cold(self._cold_ref).items():
+                    cold.setdefault(key, value)
+            self._cold_cache = cold
+        return self._cold_cache
+
+    def get(self, key, default=None):
+        if key in HOT_FIELD_SET:
+            return getattr(self, key, default)
+        if key == 'map':
+            if not hasattr(self, 'polyline') and 'map' not in self._cold_keys:
+                return default
+            value = dict(self.inline_cold().get('map', {}))
+            if hasattr(self, 'polyline'):
+                value['summary_polyline'] = self.polyline
+            return value
+        if key in self._ref_keys:
+            return self.cold()[key]
+        if key in self._cold_keys:
+            return self.inline_cold()[key]
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        if key in HOT_FIELD_SET:
+            return hasattr(self, key)
+        if key == 'map':
+            return hasattr(self, 'polyline') or 'map' in self._cold_keys
+        return key in self._cold_keys
+
+    def __setitem__(self, key, value):
+        if key in HOT_FIELD_SET:
+            setattr(self, key, value)
+            return
+        cold = dict(self.cold())
+        if key == 'map' and isinstance(value, dict):
+            # The route stays in its slot, as from_dict puts it
+            if 'summary_polyline' in value:
+                self.polyline = value['summary_polyline']
+            elif hasattr(self, 'polyline'):
+                del self.polyline
+            rest = {k: v for k, v in value.items() if k != 'summary_polyline'}
+            if rest:
+                cold['map'] = rest
+            else:
+                cold.pop('map', None)
+        else:
+            cold[key] = value
+        self._cold_keys = tuple(cold)
+        self._ref_keys = frozenset()
+        self._cold = encode_cold(cold) if cold else None
+        self._cold_ref = None
+        self._loader = decode_cold
+        self._inline_cache = None
+        self._cold_cache = None
+
+    def to_dict(self):
+        """Rebuild the full Strava dict (hot and cold fields)."""
+        data = {field: getattr(self, field) for field in HOT_FIELDS if hasattr(self, field)}
+        data.update(self.cold())
+        if hasattr(self, 'polyline'):
+            data['map'] = dict(data.get('map', {}), summary_polyline=self.polyline)
+        return data
+
+    def __repr__(self):
+        return f"Activity(id={getattr(self, 'id', None)!r}, name={getattr(self, 'name', None)!r})"
+
+
+def load_activity_models(file_path=ACTIVITIES_FILE):
+    """Load activities.json as Activity models, checking field types on the way in."""
+    return [Activity.from_dict(data) for data in load_json(file_path, schema=ACTIVITY_SCHEMA)]
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Local activity API server.
+Serves the data_interface.md endpoints from an in-memory, date-indexed activity store on a
+single asyncio event loop, with ETag revalidation, gzip and hot reload of data/activities.json.
+
+Usage:
+    python api_server.py            # listens on API_SERVER_HOST:API_SERVER_PORT (127.0.0.1:8788)
+"""
+
+import asyncio
+import bisect
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+from daily_aggregates import load_daily_aggregates, update_daily_aggregates, sport_slug
+from generate_api import to_api_activity, build_stats
+from storage_codec import read_stored, stored_path
+from serialization import dumps, loads
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ACTIVITIES_FILE = 'data/activities.json'
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# Seconds between checks of the activities file for changes
+RELOAD_INTERVAL = 2.0
+
+# Responses smaller than this are sent uncompressed
+GZIP_MIN_SIZE = 1024
+
+# Encoded responses kept per store version; cleared on reload
+RESPONSE_CACHE_SIZE = 512
+
+MAX_HEADER_SIZE = 16384
+
+# Unused request bodies are drained in pieces of this size
+BODY_CHUNK_SIZE = 65536
+
+STATUS_TEXT = {
+    200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 409: 'Conflict', 503: 'Service Unavailable'
+}
+
+
+class ActivitySnapshot:
+    """Immutable, indexed view of one version of the activities file."""
+
+    def __init__(self, activities, version):
+        self.version = version
+        # Oldest first so date ranges are bisect slices; responses walk it backwards
+        self.records = sorted(
+            (to_api_activity(activity) for activity in activities if activity.get('id')),
+            key=lambda record: (record['derived'].get('local_date', ''), record['derived'].get('epoch', 0))
+        )
+        self.dates = [record['derived'].get('local_date', '') for record in self.records]
+
+        # Sport slug -> ascending positions into records
+        self.by_type = {}
+        for position, record in enumerate(self.records):
+            sport = record.get('sport_type') or record.get('type') or 'Unknown'
+            self.by_type.setdefault(sport_slug(sport), []).append(position)
+
+    def query(self, after=None, before=None, sport=None, min_distance=None, max_distance=None):
+        """Positions of matching records, newest first."""
+        lo = bisect.bisect_left(self.dates, after) if after else 0
+        hi = bisect.bisect_right(self.dates, before) if before else len(self.dates)
+
+        if sport is not None:
+            positions = self.by_type.get(sport, [])
+            candidates = positions[bisect.bisect_left(positions, lo):bisect.bisect_left(positions, hi)]
+        else:
+            candidates = range(lo, hi)
+
+        if min_distance is None and max_distance is None:
+            return candidates[::-1]
+        return [
+            position for position in reversed(candidates)
+            if (min_distance is None or (self.records[position].get('distance') or 0) >= min_distance)
+            and (max_distance is None or (self.records[position].get('distance') or 0) <= max_distance)
+        ]
+
+
+class ActivityStore:
+    """Holds the current snapshot and daily aggregates, reloading them when the file changes."""
+
+    def __init__(self, file_path=ACTIVITIES_FILE):
+        self.file_path = file_path
+        self.snapshot = ActivitySnapshot([], 'empty')
+        # Kept in memory and updated incrementally on every reload
+        self.aggregates = load_daily_aggregates()
+        self.file_state = None
+        self.responses = {}
+
+    def read(self):
+        """Read and index the activities file (runs in a worker thread)."""
+        content = read_stored(self.file_path)
+        activities = loads(content)
+        return activities, ActivitySnapshot(activities, hashlib.sha1(content).hexdigest()[:16])
+
+    async def reload_if_changed(self):
+        """Swap in a new snapshot if the activities file changed. Returns True if reloaded."""
+        try:
+            stat = os.stat(stored_path(self.file_path))
+        except OSError:
+            return False
+        file_state = (stat.st_mtime_ns, stat.st_size)
+        if file_state == self.file_state:
+            return False
+
+        loop = asyncio.get_running_loop()
+        try:
+            activities, snapshot = await loop.run_in_executor(None, self.read)
+        except (OSError, ValueError) as e:
+            # Likely caught mid-write; retry on the next check
+            logger.warning(f"Failed to reload {self.file_path}: {e}")
+            return False
+
+        self.file_state = file_state
+        if snapshot.version == self.snapshot.version:
+            return False
+
+        # Only changed days are rebuilt; done on the loop thread so readers never see a partial table
+        update_daily_aggregates(self.aggregates, activities)
+        self.snapshot = snapshot
+        self.responses = {}
+        logger.info(f"Loaded {len(snapshot.records)} activities (version {snapshot.version})")
+        return True
+
+    async def watch(self, interval=RELOAD_INTERVAL):
+        """Poll the activities file and hot-reload it."""
+        while True:
+            await asyncio.sleep(interval)
+            await self.reload_if_changed()
+
+
+def parse_date(value, name):
+    """Validate a YYYY-MM-DD query parameter."""
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"{name} must be a YYYY-MM-DD date")
+    return value
+
+
+def parse_number(value, name, cast=float, minimum=0):
+    """Validate a numeric query parameter."""
+    try:
+        number = cast(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+    # float() accepts 'nan' and 'inf', which would pass the minimum check
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be a number")
+    if number < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return number
+
+
+def request_body_length(headers):
+    """Length of the request body from Content-Length; chunked bodies are not accepted."""
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        raise ValueError("chunked request bodies are not supported")
+    value = headers.get('content-length', '').strip()
+    if not value:
+        return 0
+    if not value.isdigit():
+        raise ValueError("invalid Content-Length")
+    return int(value)
+
+
+def get_activities(snapshot, params):
+    """
+    GET /api/activities
+
+    Parameters: year, type (sport slug such as run or weighttraining), after and before
+    (inclusive local dates), min_distance and max_distance (meters), limit, offset.
+    """
+    after = parse_date(params['after'], 'after') if 'after' in params else None
+    before = parse_date(params['before'], 'before') if 'before' in params else None
+    if 'year' in params:
+        year = parse_number(params['year'], 'year', int, 1)
+        after = max(after or '', f'{year:04d}-01-01')
+        before = min(before or '9999-12-31', f'{year:04d}-12-31')
+
+    sport = sport_slug(params['type']) if 'type' in params else None
+    min_distance = parse_number(params['min_distance'], 'min_distance') if 'min_distance' in params else None
+    max_distance = parse_number(params['max_distance'], 'max_distance') if 'max_distance' in params else None
+    limit = min(parse_number(params.get('limit', DEFAULT_LIMIT), 'limit', int, 1), MAX_LIMIT)
+    offset = parse_number(params.get('offset', 0), 'offset', int)
+
+    positions = snapshot.query(after, before, sport, min_distance, max_distance)
+    return {
+        'total': len(positions),
+        'offset': offset,
+        'limit': limit,
+        'activities': [snapshot.records[position] for position in positions[offset:offset + limit]]
+    }
+
+
+def get_stats(aggregates, params):
+    """GET /api/stats with an optional year."""
+    year = parse_number(params['year'], 'year', int, 1) if 'year' in params else None
+    stats = build_stats(aggregates, year)
+    stats['year'] = year
+    return stats
+
+
+class APIServer:
+    """HTTP/1.1 server with keep-alive on asyncio streams."""
+
+    def __init__(self, store):
+        self.store = store
+        self.sync_lock = asyncio.Lock()
+        self.sync_client = None
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, protocol = lines[0].split(' ', 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                # Request bodies are not used, but must be drained to keep the connection usable.
+                # A body that cannot be framed leaves the stream unreadable, so close after the 400
+                try:
+                    length = request_body_length(headers)
+                except ValueError as e:
+                    writer.write(self.encode_response(*self.json_response(400, {'error': str(e)}, {'Connection': 'close'})))
+                    await writer.drain()
+                    break
+                while length:
+                    length -= len(await reader.readexactly(min(length, BODY_CHUNK_SIZE)))
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if protocol == 'HTTP/1.1' else connection == 'keep-alive'
+
+                status, response_headers, body = await self.dispatch(method, target, headers)
+                response_headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+                writer.write(self.encode_response(status, response_headers, b'' if method == 'HEAD' else body))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def encode_response(self, status, headers, body):
+        lines = [f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+    async def dispatch(self, method, target, headers):
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        if path == '/api/activities/sync':
+            if method != 'POST':
+                return self.json_response(405, {'error': 'use POST'}, {'Allow': 'POST'})
+            return await self.sync()
+
+        if path not in ('/api/activities', '/api/stats'):
+            return self.json_response(404, {'error': 'not found'})
+        if method not in ('GET', 'HEAD'):
+            return self.json_response(405, {'error': 'use GET'}, {'Allow': 'GET, HEAD'})
+
+        return self.cached_response(path, params, headers)
+
+    def cached_response(self, path, params, headers):
+        """Serve a GET from the per-version response cache, building it on first use."""
+        snapshot = self.store.snapshot
+        key = (path, tuple(sorted(params.items())))
+        entry = self.store.responses.get(key)
+
+        if entry is None:
+            try:
+                if path == '/api/activities':
+                    document = get_activities(snapshot, params)
+                else:
+                    document = get_stats(self.store.aggregates, params)
+            except ValueError as e:
+                return self.json_response(400, {'error': str(e)})
+
+            body = dumps(document)
+            etag = 'W/"' + hashlib.sha1(f'{snapshot.version}|{key}'.encode('utf-8')).hexdigest()[:20] + '"'
+            compressed = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_SIZE else None
+            entry = (etag, body, compressed)
+
+            if len(self.store.responses) >= RESPONSE_CACHE_SIZE:
+                self.store.responses.clear()
+            self.store.responses[key] = entry
+
+        etag, body, compressed = entry
+        response_headers = {
+            'Content-Type': 'application/json; charset=utf-8',
+            'ETag': etag,
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding',
+            'Access-Control-Allow-Origin': '*'
+        }
+
+        if_none_match = headers.get('if-none-match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+            response_headers['Content-Length'] = '0'
+            return 304, response_headers, b''
+
+        if compressed is not None and 'gzip' in headers.get('accept-encoding', ''):
+            body = compressed
+            response_headers['Content-Encoding'] = 'gzip'
+        response_headers['Content-Length'] = str(len(body))
+        return 200, response_headers, body
+
+    def json_response(self, status, document, extra_headers=None):
+        body = json.dumps(document, ensure_ascii=False).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json; charset=utf-8',
+            'Content-Length': str(len(body)),
+            'Access-Control-Allow-Origin': '*'
+        }
+        headers.update(extra_headers or {})
+        return status, headers, body
+
+    async def sync(self):
+        """POST /api/activities/sync: run one Strava sync in a worker thread, then reload."""
+        if self.sync_lock.locked():
+            return self.json_response(409, {'error': 'sync already running'})
+
+        async with self.sync_lock:
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(None, self.run_sync)
+            except ValueError as e:
+                return self.json_response(503, {'error': str(e)})
+            await self.store.reload_if_changed()
+            return self.json_response(200 if result['success'] else 503, result)
+
+    def run_sync(self):
+        """Sync with Strava and regenerate changed outputs (runs in a worker thread)."""
+        from sync_strava_data import StravaSync, regenerate_outputs
+
+        # One client for the server's lifetime keeps the token and HTTP session warm
+        if self.sync_client is None:
+            self.sync_client = StravaSync()
+        client = self.sync_client
+        client._activities = None
+
+        success = client.sync_activities()
+        changed = len(client.last_changed_ids) if success else 0
+        if changed:
+            try:
+                regenerate_outputs(client.load_existing_activities(), client.daily_aggregates, client.get_changed_years())
+            except Exception as e:
+                logger.error(f"Failed to regenerate outputs: {e}")
+        return {'success': success, 'changed': changed}
+
+
+async def serve(host, port, file_path=ACTIVITIES_FILE):
+    store = ActivityStore(file_path)
+    await store.reload_if_changed()
+    api = APIServer(store)
+
+    server = await asyncio.start_server(api.handle_connection, host, port, limit=MAX_HEADER_SIZE, backlog=1024)
+    asyncio.create_task(store.watch())
+    logger.info(f"API server listening on http://{host}:{port} (/api/activities, /api/stats, /api/activities/sync)")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    if os.path.exists('.env'):
+        from dotenv import load_dotenv
+        load_dotenv()
+
+    host = os.getenv('API_SERVER_HOST', '127.0.0.1')
+    port = int(os.getenv('API_SERVER_PORT', '8788'))
+    try:
+        asyncio.run(serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+Bulk import of a Strava account export.
+Reads activities.csv and the GPX, TCX and FIT files (optionally gzipped) of an export archive
+or its unpacked folder, parses the files across CPU cores, normalizes them into the activity
+schema the API sync stores (encoded summary polyline, derived block), skips activities that
+are already stored (same id, or a start time within DUPLICATE_WINDOW) and saves everything in
+one batch, so years of history can be backfilled without the API rate limits.
+
+Usage:
+    python bulk_import.py <export.zip or export folder>
+"""
+
+import csv
+import functools
+import gzip
+import io
+import math
+import os
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from polyline import encode_polyline
+from timezone_config import derive_activity_fields, get_derived_fields, load_timezone_config
+from storage_codec import stored_path
+from serialization import load_json
+
+try:
+    import fitparse
+except ImportError:
+    fitparse = None
+
+ACTIVITIES_FILE = 'data/activities.json'
+CSV_NAME = 'activities.csv'
+TRACK_SUFFIXES = ('.gpx', '.tcx', '.fit')
+
+# An activity starting within this many seconds of a stored one is the same activity
+DUPLICATE_WINDOW = 120
+
+# Points of the summary polyline are at least this far apart (meters)
+SUMMARY_SPACING = 15
+
+# Slower than this between two points counts as stopped (m/s)
+MOVING_SPEED = 0.5
+
+# Climbs smaller than this are treated as GPS/barometer noise (meters)
+ELEVATION_THRESHOLD = 2
+
+# Below this many files to parse, parsing in-process beats starting worker processes
+MIN_PARALLEL_FILES = 8
+
+EARTH_RADIUS = 6371008.8
+
+# Sport names of GPX <type>, TCX Sport and FIT sport values, as Strava sport types
+TRACK_SPORTS = {
+    'running': 'Run', 'run': 'Run', '9': 'Run',
+    'cycling': 'Ride', 'biking': 'Ride', 'ride': 'Ride', '1': 'Ride',
+    'walking': 'Walk', 'walk': 'Walk', '10': 'Walk',
+    'hiking': 'Hike', 'hike': 'Hike', '4': 'Hike',
+    'swimming': 'Swim', 'swim': 'Swim', '2': 'Swim',
+    'rowing': 'Rowing',
+}
+
+
+@functools.lru_cache(maxsize=None)
+def open_archive(archive_path):
+    """Open export zip, kept open for every file a worker reads from it."""
+    return zipfile.ZipFile(archive_path)
+
+
+def read_export_file(export_path, name):
+    """Bytes of a file in the export (gunzipped if it ends in .gz)."""
+    if os.path.isdir(export_path):
+        with open(os.path.join(export_path, name), 'rb') as f:
+            data = f.read()
+    else:
+        data = open_archive(export_path).read(name)
+    return gzip.decompress(data) if name.endswith('.gz') else data
+
+
+def track_format(name):
+    """'.gpx', '.tcx' or '.fit' for a track file name (gzipped or not), else None."""
+    base = name[:-len('.gz')] if name.endswith('.gz') else name
+    suffix = os.path.splitext(base)[1].lower()
+    return suffix if suffix in TRACK_SUFFIXES else None
+
+
+def list_export(export_path):
+    """(activities.csv name or None, track file names) of an export, paths relative to its root."""
+    if os.path.isdir(export_path):
+        names = [os.path.relpath(os.path.join(directory, name), export_path).replace(os.sep, '/')
+                 for directory, _, files in os.walk(export_path) for name in files]
+    else:
+        names = open_archive(export_path).namelist()
+    csv_names = sorted((name for name in names if os.path.basename(name) == CSV_NAME), key=len)
+    return (csv_names[0] if csv_names else None), sorted(name for name in names if track_format(name))
+
+
+def read_activities_csv(data):
+    """
+    Rows of activities.csv as dicts.
+
+    Newer exports repeat some columns (Distance in km, then in meters): the last one wins.
+    Returns (rows, whether Distance is in meters).
+    """
+    reader = csv.reader(io.StringIO(data.decode('utf-8-sig')))
+    header = next(reader, [])
+    rows = [{column: value for column, value in zip(header, row)} for row in reader]
+    return rows, header.count('Distance') > 1
+
+
+def csv_number(row, column):
+    """Number in a CSV cell, or None if empty or not a number."""
+    try:
+        return float(row.get(column, '').replace(',', ''))
+    except ValueError:
+        return None
+
+
+def parse_time(text):
+    """Timestamp of an ISO 8601 time in a track file (UTC unless an offset is given)."""
+    dt = datetime.fromisoformat(text.strip().replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def local_name(element):
+    """Tag name without its XML namespace."""
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def child_text(element, name):
+    """Text of the first direct child with a local name, or None."""
+    for child in element:
+        if local_name(child) == name:
+            return child.text
+    return None
+
+
+def parse_gpx(data):
+    """(points, sport, name) of a GPX file; points are (lat, lng, time, elevation, heart rate)."""
+    root = ET.fromstring(data.lstrip())
+    points = []
+    sport = name = None
+    for element in root.iter():
+        tag = local_name(element)
+        if tag == 'trk':
+            sport = child_text(element, 'type')
+            name = child_text(element, 'name')
+        elif tag == 'trkpt':
+            when = child_text(element, 'time')
+            elevation = child_text(element, 'ele')
+            heart_rate = next((node.text for node in element.iter() if local_name(node) == 'hr'), None)
+            points.append((
+                float(element.get('lat')), float(element.get('lon')),
+                parse_time(when) if when else None,
+                float(elevation) if elevation else None,
+                float(heart_rate) if heart_rate else None
+            ))
+    return points, sport, name
+
+
+def parse_tcx(data):
+    """(points, sport, name) of a TCX file; trackpoints without a position keep lat/lng None."""
+    root = ET.fromstring(data.lstrip())
+    points = []
+    sport = name = None
+    for element in root.iter():
+        tag = local_name(element)
+        if tag == 'Activity':
+            sport = element.get('Sport')
+        elif tag == 'Notes' and name is None:
+            name = element.text
+        elif tag == 'Trackpoint':
+            values = {local_name(node): node.text for node in element.iter()}
+            has_position = values.get('LatitudeDegrees') and values.get('LongitudeDegrees')
+            points.append((
+                float(values['LatitudeDegrees']) if has_position else None,
+                float(values['LongitudeDegrees']) if has_position else None,
+                parse_time(values['Time']) if values.get('Time') else None,
+                float(values['AltitudeMeters']) if values.get('AltitudeMeters') else None,
+                # HeartRateBpm wraps its number in a Value element
+                float(values['Value']) if values.get('Value') else None
+            ))
+    return points, sport, name
+
+
+def parse_fit(data):
+    """(points, sport, name) of a FIT file (needs the fitparse package)."""
+    if fitparse is None:
+        raise ValueError("FIT files need the fitparse package")
+    fit = fitparse.FitFile(io.BytesIO(data))
+    points = []
+    sport = None
+    for message in fit.get_messages(['record', 'session']):
+        values = message.get_values()
+        if message.name == 'session':
+            sport = sport or (str(values['sport']) if values.get('sport') is not None else None)
+            continue
+        has_position = values.get('position_lat') is not None and values.get('position_long') is not None
+        timestamp = values.get('timestamp')
+        elevation = values.get('enhanced_altitude')
+        if elevation is None:
+            elevation = values.get('altitude')
+        points.append((
+            values['position_lat'] * 180.0 / 2 ** 31 if has_position else None,
+            values['position_long'] * 180.0 / 2 ** 31 if has_position else None,
+            # FIT timestamps are naive UTC datetimes
+            timestamp.replace(tzinfo=timezone.utc).timestamp() if timestamp else None,
+            float(elevation) if elevation is not None else None,
+            float(values['heart_rate']) if values.get('heart_rate') is not None else None
+        ))
+    return points, sport, None
+
+
+TRACK_PARSERS = {'.gpx': parse_gpx, '.tcx': parse_tcx, '.fit': parse_fit}
+
+
+def distance_between(a, b):
+    """Great-circle distance in meters between two (lat, lng) points."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(h))
+
+
+def summarize_track(points):
+    """Start time, totals, heart rate and summary polyline of parsed track points."""
+    times = [point[2] for point in points if point[2] is not None]
+    positions = [point for point in points if point[0] is not None]
+    summary = {
+        'start': times[0] if times else None,
+        'elapsed_time': int(round(times[-1] - times[0])) if times else 0,
+        'distance': 0.0,
+        'moving_time': 0,
+        'max_speed': 0.0,
+        'total_elevation_gain': 0.0,
+        'start_latlng': [round(positions[0][0], 6), round(positions[0][1], 6)] if positions else [],
+        'end_latlng': [round(positions[-1][0], 6), round(positions[-1][1], 6)] if positions else [],
+        'polyline': ''
+    }
+
+    moving = 0.0
+    for previous, current in zip(positions, positions[1:]):
+        step = distance_between(previous, current)
+        summary['distance'] += step
+        if previous[2] is not None and current[2] is not None and current[2] > previous[2]:
+            speed = step / (current[2] - previous[2])
+            if speed >= MOVING_SPEED:
+                moving += current[2] - previous[2]
+                summary['max_speed'] = max(summary['max_speed'], speed)
+    # Indoor tracks have no positions to tell stops from: all of the time counts as moving
+    summary['moving_time'] = int(round(moving)) if positions else summary['elapsed_time']
+
+    elevations = [point[3] for point in points if point[3] is not None]
+    if elevations:
+        reference = elevations[0]
+        for elevation in elevations[1:]:
+            if elevation - reference >= ELEVATION_THRESHOLD:
+                summary['total_elevation_gain'] += elevation - reference
+                reference = elevation
+            elif elevation < reference:
+                reference = elevation
+
+    heart_rates = [point[4] for point in points if point[4]]
+    if heart_rates:
+        summary['average_heartrate'] = round(sum(heart_rates) / len(heart_rates), 1)
+        summary['max_heartrate'] = max(heart_rates)
+
+    if positions:
+        kept = [positions[0]]
+        for point in positions[1:-1]:
+            if distance_between(kept[-1], point) >= SUMMARY_SPACING:
+                kept.append(point)
+        if len(positions) > 1:
+            kept.append(positions[-1])
+        summary['polyline'] = encode_polyline([(point[0], point[1]) for point in kept])
+    return summary
+
+
+def parse_track_file(job):
+    """
+    Parse and summarize one track file (runs in a worker process).
+
+    Returns the summary with the file's sport and name, or {'error': message}.
+    """
+    export_path, name = job
+    try:
+        points, sport, track_name = TRACK_PARSERS[track_format(name)](read_export_file(export_path, name))
+    except Exception as e:
+        return {'file': name, 'error': str(e) or type(e).__name__}
+    summary = summarize_track(points)
+    summary.update({'file': name, 'sport': sport, 'name': track_name})
+    return summary
+
+
+def track_sport(sport):
+    """Strava sport type of a track file's sport name."""
+    return TRACK_SPORTS.get((sport or '').strip().lower(), 'Workout')
+
+
+def default_name(sport_type, local_dt):
+    """Name Strava gives untitled activities ('Morning Run')."""
+    hour = local_dt.hour
+    if 5 <= hour < 11:
+        part = 'Morning'
+    elif 11 <= hour < 14:
+        part = 'Lunch'
+    elif 14 <= hour < 18:
+        part = 'Afternoon'
+    elif 18 <= hour < 22:
+        part = 'Evening'
+    else:
+        part = 'Night'
+    return f"{part} {sport_type}"
+
+
+def build_activity(row, track, metric_distance):
+    """
+    Activity record of a CSV row and/or a parsed track, in the API sync's schema.
+
+    CSV values win over values computed from the track. Returns None without a start time.
+    """
+    row = row or {}
+    track = track or {}
+
+    start = track.get('start')
+    if row.get('Activity Date'):
+        try:
+            start = datetime.strptime(row['Activity Date'], '%b %d, %Y, %I:%M:%S %p').replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            pass
+    if start is None:
+        return None
+
+    # Export times are UTC; the local offset is the configured timezone's, as for the charts
+    config = load_timezone_config()
+    utc_offset = int(round(config['offset'] * 3600))
+    start_dt = datetime.fromtimestamp(int(start), timezone.utc)
+    local_dt = start_dt.replace(tzinfo=None) + timedelta(seconds=utc_offset)
+    sign = '+' if utc_offset >= 0 else '-'
+    offset_text = f"{sign}{abs(utc_offset) // 3600:02d}:{abs(utc_offset) % 3600 // 60:02d}"
+
+    sport_type = row.get('Activity Type', '').replace(' ', '').replace('-', '') or track_sport(track.get('sport'))
+    # Older exports have a single Distance column in km; the track's distance is more precise
+    csv_distance = csv_number(row, 'Distance')
+    if metric_distance:
+        distance = csv_distance or track.get('distance', 0.0)
+    else:
+        distance = track.get('distance') or (csv_distance or 0.0) * 1000
+    moving_time = csv_number(row, 'Moving Time') or track.get('moving_time', 0)
+    elapsed_time = csv_number(row, 'Elapsed Time') or track.get('elapsed_time', 0) or moving_time
+    # Manual entries in older exports have no moving time
+    moving_time = moving_time or elapsed_time
+    average_heartrate = csv_number(row, 'Average Heart Rate') or track.get('average_heartrate')
+    max_heartrate = csv_number(row, 'Max Heart Rate') or track.get('max_heartrate')
+
+    activity = {
+        # File-only activities have no Strava id: minus the start time is stable across imports
+        'id': int(row['Activity ID']) if row.get('Activity ID') else -int(start),
+        'name': row.get('Activity Name') or track.get('name') or default_name(sport_type, local_dt),
+        'type': sport_type,
+        'sport_type': sport_type,
+        'start_date': start_dt.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        # Strava gives local wall-clock time a 'Z' suffix too
+        'start_date_local': local_dt.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'timezone': f"(GMT{offset_text}) {config['name']}",
+        'utc_offset': float(utc_offset),
+        'distance': round(distance, 1),
+        'moving_time': int(moving_time),
+        'elapsed_time': int(elapsed_time),
+        'total_elevation_gain': round(csv_number(row, 'Elevation Gain') or track.get('total_elevation_gain', 0.0), 1),
+        'average_speed': round(csv_number(row, 'Average Speed') or (distance / moving_time if moving_time else 0.0), 3),
+        'max_speed': round(csv_number(row, 'Max Speed') or track.get('max_speed', 0.0), 3),
+        'has_heartrate': bool(average_heartrate),
+        'start_latlng': track.get('start_latlng', []),
+        'end_latlng': track.get('end_latlng', []),
+        'map': {'summary_polyline': track.get('polyline', '')},
+        'commute': row.get('Commute', '').lower() in ('true', '1', '1.0'),
+        'manual': not track,
+        'external_id': os.path.basename(track['file']) if track else None,
+    }
+    if average_heartrate:
+        activity['average_heartrate'] = round(average_heartrate, 1)
+        activity['max_heartrate'] = max_heartrate or average_heartrate
+    if row.get('Activity Description'):
+        activity['description'] = row['Activity Description']
+    if csv_number(row, 'Relative Effort'):
+        activity['suffer_score'] = csv_number(row, 'Relative Effort')
+    activity['derived'] = derive_activity_fields(activity)
+    return activity
+
+
+def load_existing_activities(file_path=ACTIVITIES_FILE):
+    """Stored activities, or [] if there are none yet."""
+    if not os.path.exists(stored_path(file_path)):
+        return []
+    return load_json(file_path)
+
+
+def import_export(export_path, workers=None, save=True):
+    """
+    Import an export into the activity store.
+
+    workers defaults to IMPORT_WORKERS or the CPU count. Returns (imported, skipped as
+    already stored, files that failed to parse as (name, error) pairs).
+    """
+    existing = load_existing_activities()
+    stored_ids = {str(activity['id']) for activity in existing if activity.get('id')}
+
+    csv_name, track_names = list_export(export_path)
+    rows, metric_distance = read_activities_csv(read_export_file(export_path, csv_name)) if csv_name else ([], False)
+
+    # Files of rows already stored are never parsed, so re-importing an export is cheap
+    skipped = 0
+    new_rows = []
+    for row in rows:
+        if row.get('Activity ID') in stored_ids:
+            skipped += 1
+        else:
+            new_rows.append(row)
+    known_files = {row.get('Filename') for row in rows if row.get('Filename')}
+    stored_files = known_files - {row.get('Filename') for row in new_rows}
+    jobs = [(export_path, name) for name in track_names if name not in stored_files]
+
+    workers = workers or int(os.getenv('IMPORT_WORKERS', '0')) or os.cpu_count() or 1
+    if len(jobs) >= MIN_PARALLEL_FILES and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(parse_track_file, jobs, chunksize=8))
+    else:
+        results = [parse_track_file(job) for job in jobs]
+
+    failed = [(result['file'], result['error']) for result in results if 'error' in result]
+    tracks = {result['file']: result for result in results if 'error' not in result}
+
+    candidates = [build_activity(row, tracks.get(row.get('Filename')), metric_distance) for row in new_rows]
+    candidates += [build_activity(None, track, metric_distance) for name, track in tracks.items() if name not in known_files]
+
+    # Same activity under another id (synced from the API, or a file without a CSV row)
+    epochs = sorted(get_derived_fields(activity).get('epoch', 0) for activity in existing)
+    imported = []
+    for activity in sorted((activity for activity in candidates if activity), key=lambda activity: activity['derived']['epoch']):
+        epoch = activity['derived']['epoch']
+        i = bisect_left(epochs, epoch - DUPLICATE_WINDOW)
+        if str(activity['id']) in stored_ids or (i < len(epochs) and epochs[i] <= epoch + DUPLICATE_WINDOW):
+            skipped += 1
+            continue
+        imported.append(activity)
+        stored_ids.add(str(activity['id']))
+        epochs.insert(bisect_left(epochs, epoch), epoch)
+
+    if imported and save:
+        # Imported here so parsing and dry runs work without the API client's dependencies
+        from sync_strava_data import write_activity_store
+        write_activity_store(imported + existing)
+    return len(imported), skipped, failed
+
+
+def main():
+    """Import the export given on the command line."""
+    if len(sys.argv) != 2 or not os.path.exists(sys.argv[1]):
+        print(f"Usage: {__doc__.strip().splitlines()[-1].strip()}")
+        sys.exit(1)
+
+    imported, skipped, failed = import_export(sys.argv[1])
+    for name, error in failed[:10]:
+        print(f"Warning: Failed to parse {name}: {error}")
+    if len(failed) > 10:
+        print(f"Warning: ... and {len(failed) - 10} more files")
+    print(f"Imported {imported} activities ({skipped} already stored, {len(failed)} unreadable files)")
+    if imported:
+        print("Run calculate_stats.py and generate_visualizations.py to rebuild the outputs")
+
+
+if __name__ == "__main__":
+    main()
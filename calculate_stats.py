@@ -4,16 +4,19 @@ Calculate running statistics and generate JSON data for the dashboard.
 This script processes activities.json and generates pre-calculated stats for each year.
 """
 
-import json
 import os
+import numpy as np
 from datetime import datetime, timezone, timedelta
 from collections import defaultdict
-from timezone_config import parse_local_datetime, get_timezone_info
+from daily_aggregates import RUN_SPORT_TYPES
+from activity_model import load_activity_models
+from activity_columns import load_activity_columns, read_activity_columns
+from serialization import dump_json
+from pipeline import run_stages
 
 def load_activities():
-    """Load activities from JSON file."""
-    with open('data/activities.json', 'r') as f:
-        return json.load(f)
+    """Load activities from JSON file as compact Activity models."""
+    return load_activity_models('data/activities.json')
 
 def format_pace(seconds_per_km):
     """Format pace as MM'SS" per km."""
@@ -38,127 +41,148 @@ def format_time(total_seconds):
     else:
         return f"{minutes}:{seconds:02d}"
 
-def format_date(date_string):
-    """Format date as MM/DD."""
-    try:
-        dt = parse_local_datetime(date_string)
-        return dt.strftime("%m/%d")
-    except:
+def format_date(local_date):
+    """Format a derived YYYY-MM-DD local date as MM/DD."""
+    if not local_date or len(local_date) < 10:
         return "N/A"
+    return f"{local_date[5:7]}/{local_date[8:10]}"
 
-def extract_city_from_activity(activity):
-    """Extract city information from activity data."""
-    # First try explicit location fields
-    if activity.get('location_city'):
-        return activity['location_city']
-    
-    # Try to extract from timezone
-    timezone = activity.get('timezone', '')
-    if timezone:
-        # Format: "(GMT+08:00) Asia/Shanghai" -> "Shanghai"
-        if 'Asia/' in timezone:
-            city = timezone.split('Asia/')[-1].strip(')')
-            return city
-        elif 'Europe/' in timezone:
-            city = timezone.split('Europe/')[-1].strip(')')
-            return city
-        elif 'America/' in timezone:
-            city = timezone.split('America/')[-1].strip(')')
-            # Handle cases like "America/New_York" -> "New York"
-            city = city.replace('_', ' ')
-            return city
-        elif 'Australia/' in timezone:
-            city = timezone.split('Australia/')[-1].strip(')')
-            return city
-    
-    # Try location_country as fallback
-    if activity.get('location_country'):
-        return activity['location_country']
-    
-    # Final fallback
-    return "Unknown"
+def sport_group(sport):
+    """Group key for a sport type: 'Run' for every running sport type, otherwise the sport type."""
+    return 'Run' if sport in RUN_SPORT_TYPES else sport
 
-def calculate_yearly_stats():
-    """Calculate statistics for each year."""
-    activities = load_activities()
-    yearly_stats = defaultdict(lambda: {
+def new_group_stats():
+    """Running totals for one (year, sport) group."""
+    return {
         'total_activities': 0,
         'total_distance': 0,  # in km
         'total_time': 0,
-        'heart_rates': [],
-        'activities_list': []
-    })
-    
-    # Group activities by year
-    for activity in activities:
-        if not activity.get('start_date_local'):
-            continue
-            
-        try:
-            date = parse_local_datetime(activity['start_date_local'])
-            year = date.year
-            
-            # Only include runs with valid distance and time
-            if activity.get('distance', 0) > 1000 and activity.get('moving_time', 0) > 180:
-                yearly_stats[year]['total_activities'] += 1
-                yearly_stats[year]['total_distance'] += activity['distance'] / 1000  # convert to km
-                yearly_stats[year]['total_time'] += activity['moving_time']
-                yearly_stats[year]['activities_list'].append(activity)
-                
-                if activity.get('average_heartrate'):
-                    yearly_stats[year]['heart_rates'].append(activity['average_heartrate'])
-        except:
-            continue
-    
-    # Calculate derived stats for each year
-    final_stats = {}
+        'heart_rate_sum': 0,
+        'heart_rate_count': 0,
+        'longest_activity': None,
+        'best_pace_activity': None
+    }
+
+def activity_summary(columns, position):
+    """Fields of one cached activity row shown for the longest and fastest activities."""
+    pace = float(columns['pace'][position])
+    return {
+        'distance': float(columns['distance'][position]),
+        'moving_time': int(columns['moving_time'][position]),
+        'pace': None if np.isnan(pace) else pace,
+        'local_date': columns.text('local_date', position) or None,
+        'city': columns.text('city', position)
+    }
+
+def finalize_group_stats(stats):
+    """Turn a group's running totals into the display stats."""
+    longest_activity = stats['longest_activity']
+    best_pace_activity = stats['best_pace_activity'] or longest_activity
     
-    for year, stats in yearly_stats.items():
-        if stats['total_activities'] == 0:
-            continue
-            
-        activities_list = stats['activities_list']
-        
-        # Calculate averages
-        avg_pace = stats['total_time'] / stats['total_distance'] if stats['total_distance'] > 0 else 0
-        avg_heart_rate = sum(stats['heart_rates']) / len(stats['heart_rates']) if stats['heart_rates'] else 0
-        
-        # Find longest distance activity
-        longest_activity = max(activities_list, key=lambda x: x.get('distance', 0))
-        longest_pace = longest_activity['moving_time'] / (longest_activity['distance'] / 1000)
-        
-        # Find best pace activity (minimum pace among activities > 1km)
-        valid_activities = [a for a in activities_list if a.get('distance', 0) > 1000]
-        if valid_activities:
-            best_pace_activity = min(valid_activities, 
-                                   key=lambda x: x['moving_time'] / (x['distance'] / 1000))
-            best_pace = best_pace_activity['moving_time'] / (best_pace_activity['distance'] / 1000)
-        else:
-            best_pace_activity = longest_activity
-            best_pace = longest_pace
-        
-        final_stats[str(year)] = {
-            # Yearly stats
-            'total_activities': stats['total_activities'],
-            'total_distance': round(stats['total_distance'], 1),
-            'avg_pace': format_pace(avg_pace),
-            'best_pace': format_pace(best_pace),
-            'avg_heart_rate': int(avg_heart_rate) if avg_heart_rate > 0 else 'N/A',
-            
+    # Calculate averages
+    avg_pace = stats['total_time'] / stats['total_distance'] if stats['total_distance'] > 0 else 0
+    avg_heart_rate = stats['heart_rate_sum'] / stats['heart_rate_count'] if stats['heart_rate_count'] else 0
+    
+    final = {
+        # Yearly stats
+        'total_activities': stats['total_activities'],
+        'total_distance': round(stats['total_distance'], 1),
+        'avg_pace': format_pace(avg_pace),
+        'best_pace': format_pace(best_pace_activity['pace'] or 0) if best_pace_activity else 'N/A',
+        'avg_heart_rate': int(avg_heart_rate) if avg_heart_rate > 0 else 'N/A'
+    }
+    
+    if longest_activity:
+        final.update({
             # Longest distance details
             'longest_distance': f"{longest_activity['distance'] / 1000:.1f} km",
-            'longest_date': format_date(longest_activity.get('start_date_local', '')),
-            'longest_duration': format_time(longest_activity.get('moving_time', 0)),
-            'longest_pace': format_pace(longest_pace),
-            'longest_city': extract_city_from_activity(longest_activity),
+            'longest_date': format_date(longest_activity['local_date']),
+            'longest_duration': format_time(longest_activity['moving_time']),
+            'longest_pace': format_pace(longest_activity['pace'] or 0),
+            'longest_city': longest_activity['city'],
             
             # Best pace details
-            'fastest_pace': format_pace(best_pace),
-            'fastest_date': format_date(best_pace_activity.get('start_date_local', '')),
+            'fastest_pace': format_pace(best_pace_activity['pace'] or 0),
+            'fastest_date': format_date(best_pace_activity['local_date']),
             'fastest_distance': f"{best_pace_activity['distance'] / 1000:.1f} km",
-            'fastest_duration': format_time(best_pace_activity.get('moving_time', 0)),
-            'fastest_city': extract_city_from_activity(best_pace_activity)
-        }
+            'fastest_duration': format_time(best_pace_activity['moving_time']),
+            'fastest_city': best_pace_activity['city']
+        })
+    
+    return final
+
+def calculate_sport_stats(columns):
+    """
+    Calculate statistics for every (year, sport) group from the cached activity columns.
+    
+    Returns:
+        Dict of year -> sport group -> display stats
+    """
+    year = np.asarray(columns['year'])
+    distance = np.asarray(columns['distance'])
+    moving_time = np.asarray(columns['moving_time'])
+    heart_rate = np.asarray(columns['average_heartrate'])
+    pace = np.asarray(columns['pace'])
+    
+    group_names = sorted({sport_group(sport) for sport in columns.tables['sport_type']})
+    group_of_sport = np.array([group_names.index(sport_group(sport)) for sport in columns.tables['sport_type']], dtype=np.int32)
+    group = group_of_sport[np.asarray(columns['sport_type'])] if len(columns) else np.zeros(0, dtype=np.int32)
+    is_run = group == (group_names.index('Run') if 'Run' in group_names else -1)
+    
+    # Skip undated activities and aborted recordings; runs must also cover more than 1 km
+    eligible = (year != 0) & (moving_time > 180) & ~(is_run & (distance <= 1000))
+    positions = np.flatnonzero(eligible)
+    if not positions.size:
+        return {}
+    
+    # Groups in order of first appearance, as the per-activity loop produced them;
+    # bincount sums in row order, so totals match that loop exactly
+    keys, first, inverse = np.unique(year[positions].astype(np.int64) * len(group_names) + group[positions],
+                                     return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    counts = np.bincount(inverse, minlength=len(keys))
+    total_distance = np.bincount(inverse, weights=distance[positions] / 1000, minlength=len(keys))
+    total_time = np.bincount(inverse, weights=moving_time[positions], minlength=len(keys))
+    has_hr = heart_rate[positions] > 0
+    hr_sum = np.bincount(inverse[has_hr], weights=heart_rate[positions][has_hr], minlength=len(keys))
+    hr_count = np.bincount(inverse[has_hr], minlength=len(keys))
+    
+    long_enough = distance[positions] > 1000
+    has_pace = long_enough & ~np.isnan(pace[positions]) & (np.nan_to_num(pace[positions]) != 0)
+    
+    sport_stats = defaultdict(dict)
+    for key_index in np.argsort(first, kind='stable'):
+        members = positions[inverse == key_index]
+        stats = new_group_stats()
+        stats.update({
+            'total_activities': int(counts[key_index]),
+            'total_distance': float(total_distance[key_index]),
+            'total_time': float(total_time[key_index]),
+            'heart_rate_sum': float(hr_sum[key_index]),
+            'heart_rate_count': int(hr_count[key_index])
+        })
+        
+        # Longest and best pace among activities > 1km (the first one wins ties)
+        candidates = members[long_enough[inverse == key_index]]
+        if candidates.size:
+            stats['longest_activity'] = activity_summary(columns, candidates[np.argmax(distance[candidates])])
+        candidates = members[has_pace[inverse == key_index]]
+        if candidates.size:
+            stats['best_pace_activity'] = activity_summary(columns, candidates[np.argmin(pace[candidates])])
+        
+        group_year, group_index = divmod(int(keys[key_index]), len(group_names))
+        sport_stats[str(group_year)][group_names[group_index]] = finalize_group_stats(stats)
+    return dict(sport_stats)
+
+def calculate_yearly_stats(columns=None):
+    """Calculate running statistics for each year, with a per-sport breakdown."""
+    if columns is None:
+        columns = load_activity_columns()
+    
+    final_stats = {}
+    for year, sports in calculate_sport_stats(columns).items():
+        run_stats = sports.get('Run') or finalize_group_stats(new_group_stats())
+        final_stats[year] = dict(run_stats, sports=sports)
     
     return final_stats
 
@@ -166,18 +190,30 @@ def main():
     """Generate stats JSON file."""
     print("Calculating running statistics...")
     
-    stats = calculate_yearly_stats()
+    # Totals come from the memory-mapped column cache; the JSON is only parsed here to
+    # rebuild a stale cache, otherwise first by the index stages below
+    activities = None
+    columns = read_activity_columns()
+    if columns is None:
+        activities = load_activities()
+        columns = load_activity_columns(activities=activities)
+    stats = calculate_yearly_stats(columns)
     
     # Create generated directory if it doesn't exist
     os.makedirs('generated', exist_ok=True)
     
     # Save stats to JSON file
-    with open('generated/stats.json', 'w') as f:
-        json.dump(stats, f, indent=2)
+    dump_json('generated/stats.json', stats)
     
     print(f"Generated statistics for years: {', '.join(stats.keys())}")
     print("Stats saved to generated/stats.json")
     
+    if activities is None:
+        activities = load_activities()
+    
+    # Personal records, analytics, search and map indexes (see pipeline.STAGES)
+    run_stages(activities)
+    
     # Print sample data
     for year, year_stats in stats.items():
         print(f"\n{year} Summary:")
@@ -185,7 +221,8 @@ def main():
         print(f"  Distance: {year_stats['total_distance']} km")
         print(f"  Avg Pace: {year_stats['avg_pace']}")
         print(f"  Best Pace: {year_stats['best_pace']}")
-        print(f"  Longest: {year_stats['longest_distance']}")
+        # Years without a run over 1 km (e.g. imported gym-only years) have no longest run
+        print(f"  Longest: {year_stats.get('longest_distance', 'N/A')}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Cold storage for heavy activity detail.
+Moves segment efforts, best efforts, laps, splits and photos out of data/activities.json
+into compressed files under data/cold/, named by the hash of their content so unchanged
+detail is never rewritten. The hot record keeps a {"ref", "fields"} reference under "cold".
+Once enough records exist, a dictionary trained on them compresses every small record much
+better than gzip on its own.
+"""
+
+import functools
+import gzip
+import hashlib
+import os
+from serialization import dumps, loads, load_json, save_store
+from storage_codec import compress_with_dictionary, decompress, dictionary_id, train_dictionary
+
+COLD_DIR = 'data/cold'
+
+# Subdirectory of the cold directory holding the trained dictionaries, named by dictionary id
+DICTIONARY_DIR = 'dictionaries'
+
+# Records needed before a dictionary is trained
+MIN_DICTIONARY_SAMPLES = 50
+
+# Gzip files (no dictionary yet) and dictionary-compressed zlib files
+COLD_SUFFIXES = ('.json.zlib', '.json.gz')
+
+# Detail-only subtrees moved out of the hot file
+COLD_FIELDS = ('segment_efforts', 'best_efforts', 'laps', 'splits_metric', 'splits_standard', 'photos')
+
+
+def cold_path(ref, cold_dir=COLD_DIR, suffix='.json.gz'):
+    """File of a cold reference, fanned out by the first two hex digits."""
+    return os.path.join(cold_dir, ref[:2], f'{ref}{suffix}')
+
+
+def find_cold(ref, cold_dir=COLD_DIR):
+    """Existing file of a cold reference, or None."""
+    for suffix in COLD_SUFFIXES:
+        file_path = cold_path(ref, cold_dir, suffix)
+        if os.path.exists(file_path):
+            return file_path
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def load_dictionary(dict_id, cold_dir=COLD_DIR):
+    """Read a trained dictionary by id."""
+    with open(os.path.join(cold_dir, DICTIONARY_DIR, f'{dict_id}.bin'), 'rb') as f:
+        return f.read()
+
+
+def current_dictionary(cold_dir=COLD_DIR):
+    """The dictionary new records are compressed with, or None if none is trained yet."""
+    directory = os.path.join(cold_dir, DICTIONARY_DIR)
+    names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+    return load_dictionary(names[-1][:-len('.bin')], cold_dir) if names else None
+
+
+def read_cold_file(file_path, cold_dir=COLD_DIR):
+    """Decompressed JSON bytes of a cold file."""
+    with open(file_path, 'rb') as f:
+        return decompress(f.read(), lambda dict_id: load_dictionary(dict_id, cold_dir))
+
+
+def load_cold(ref, cold_dir=COLD_DIR):
+    """Read the detail fields stored under a reference."""
+    file_path = find_cold(ref, cold_dir)
+    if file_path is None:
+        raise FileNotFoundError(cold_path(ref, cold_dir))
+    return loads(read_cold_file(file_path, cold_dir))
+
+
+def write_cold_file(file_path, content, dictionary=None):
+    """Write a cold file atomically, with the dictionary if given, otherwise gzip."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    temp_path = f'{file_path}.tmp'
+    with open(temp_path, 'wb') as f:
+        if dictionary:
+            f.write(compress_with_dictionary(content, dictionary))
+        else:
+            # mtime=0 keeps the bytes stable for identical content
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    os.replace(temp_path, file_path)
+
+
+def store_cold(fields, cold_dir=COLD_DIR):
+    """Write detail fields content-addressed and return the reference (skips existing files)."""
+    content = dumps(fields, sort_keys=True)
+    ref = hashlib.sha256(content).hexdigest()[:32]
+    if find_cold(ref, cold_dir) is None:
+        dictionary = current_dictionary(cold_dir)
+        write_cold_file(cold_path(ref, cold_dir, COLD_SUFFIXES[0] if dictionary else '.json.gz'), content, dictionary)
+    return ref
+
+
+def cold_files(cold_dir=COLD_DIR):
+    """(ref, path) of every cold file."""
+    if not os.path.isdir(cold_dir):
+        return
+    for root, directories, files in os.walk(cold_dir):
+        if DICTIONARY_DIR in directories:
+            directories.remove(DICTIONARY_DIR)
+        for name in sorted(files):
+            for suffix in COLD_SUFFIXES:
+                if name.endswith(suffix):
+                    yield name[:-len(suffix)], os.path.join(root, name)
+
+
+def ensure_dictionary(cold_dir=COLD_DIR):
+    """
+    Train a dictionary once enough gzip records exist and recompress them with it.
+
+    Returns the number of records recompressed (0 if a dictionary already exists or there are
+    too few records).
+    """
+    if current_dictionary(cold_dir) is not None:
+        return 0
+    gzip_files = [(ref, file_path) for ref, file_path in cold_files(cold_dir) if file_path.endswith('.json.gz')]
+    if len(gzip_files) < MIN_DICTIONARY_SAMPLES:
+        return 0
+
+    samples = [read_cold_file(file_path, cold_dir) for _, file_path in gzip_files]
+    dictionary = train_dictionary(samples)
+    directory = os.path.join(cold_dir, DICTIONARY_DIR)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f'{dictionary_id(dictionary)}.bin'), 'wb') as f:
+        f.write(dictionary)
+
+    for (ref, file_path), content in zip(gzip_files, samples):
+        write_cold_file(cold_path(ref, cold_dir, COLD_SUFFIXES[0]), content, dictionary)
+        os.remove(file_path)
+    return len(gzip_files)
+
+
+def split_activity(activity, cold_dir=COLD_DIR):
+    """
+    Return the hot record for an activity, moving inline detail fields to cold storage.
+
+    Detail fields already behind a reference are kept unless the activity carries newer
+    inline values for them.
+    """
+    inline = {field: activity[field] for field in COLD_FIELDS if field in activity}
+    if not inline:
+        return activity
+
+    hot = {key: value for key, value in activity.items() if key not in inline}
+    reference = activity.get('cold')
+    fields = dict(load_cold(reference['ref'], cold_dir), **inline) if reference else inline
+    hot['cold'] = {'ref': store_cold(fields, cold_dir), 'fields': sorted(fields)}
+    return hot
+
+
+def hydrate_activity(activity, cold_dir=COLD_DIR):
+    """Return the full record with cold detail fields merged back in."""
+    reference = activity.get('cold')
+    if not reference:
+        return activity
+    full = {key: value for key, value in activity.items() if key != 'cold'}
+    for field, value in load_cold(reference['ref'], cold_dir).items():
+        full.setdefault(field, value)
+    return full
+
+
+def prune_cold(activities, cold_dir=COLD_DIR, keep=()):
+    """
+    Delete cold files no longer referenced by any activity. Returns the number removed.
+
+    keep lists further references to preserve (e.g. those of older snapshots).
+    """
+    referenced = {activity['cold']['ref'] for activity in activities if activity.get('cold')}
+    referenced.update(keep)
+    removed = 0
+    for ref, file_path in list(cold_files(cold_dir)):
+        if ref not in referenced:
+            os.remove(file_path)
+            removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    # One-off migration of an activities.json that still has inline detail
+    activities_file = 'data/activities.json'
+    hot = [split_activity(activity) for activity in load_json(activities_file)]
+    save_store(activities_file, hot, pretty=True)
+    prune_cold(hot)
+    ensure_dictionary()
+    print(f"Moved detail of {sum(1 for activity in hot if activity.get('cold'))} activities to {COLD_DIR}/")
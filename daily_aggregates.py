@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Persisted daily-aggregate table.
+Buckets every activity into year -> local date -> sport type totals, so visualizations and
+stats read at most 366 rows per year instead of re-scanning every activity.
+"""
+
+import math
+import os
+import uuid
+from collections import defaultdict
+from timezone_config import get_derived_fields
+from storage_codec import stored_path
+from serialization import load_json, save_store
+
+AGGREGATES_FILE = 'data/daily_aggregates.json'
+
+# Bump when the bucket layout changes so stale tables are rebuilt from scratch
+AGGREGATES_VERSION = 4
+
+# Number of change-log entries kept for consumers that update incrementally
+CHANGE_LOG_SIZE = 200
+
+RUN_SPORT_TYPES = {'Run', 'TrailRun', 'VirtualRun'}
+
+# Heart-rate bounds for the TRIMP estimate used when Strava has no suffer_score
+RESTING_HEART_RATE = 60
+MAX_HEART_RATE = 190
+
+
+def new_daily_aggregates():
+    """Create an empty aggregate table."""
+    return {
+        'version': AGGREGATES_VERSION,
+        'years': {},
+        # activity id -> [local_date, sport_type, distance_m, moving_time, avg_hr, pace, load]
+        'contributions': {},
+        # Incremented on every change; 'changes' lists [revision, changed dates]
+        'id': uuid.uuid4().hex,
+        'revision': 0,
+        'changes': []
+    }
+
+
+def load_daily_aggregates(file_path=AGGREGATES_FILE):
+    """Load the aggregate table, or return an empty one if missing or outdated."""
+    if not os.path.exists(stored_path(file_path)):
+        return new_daily_aggregates()
+
+    try:
+        table = load_json(file_path)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to load {file_path}, rebuilding: {e}")
+        return new_daily_aggregates()
+
+    if table.get('version') != AGGREGATES_VERSION:
+        return new_daily_aggregates()
+    return table
+
+
+def save_daily_aggregates(table, file_path=AGGREGATES_FILE):
+    """Save the aggregate table."""
+    save_store(file_path, table)
+
+
+def activity_training_load(activity):
+    """
+    Estimate an activity's training load.
+    
+    Uses Strava's suffer_score (Relative Effort) when present, otherwise Banister's TRIMP
+    from moving time and average heart rate, assuming moderate effort without heart rate.
+    """
+    if activity.get('suffer_score') is not None:
+        return float(activity['suffer_score'])
+    
+    minutes = (activity.get('moving_time') or 0) / 60
+    avg_hr = activity.get('average_heartrate')
+    if avg_hr:
+        hr_reserve = (avg_hr - RESTING_HEART_RATE) / (MAX_HEART_RATE - RESTING_HEART_RATE)
+        hr_reserve = min(max(hr_reserve, 0.0), 1.0)
+    else:
+        hr_reserve = 0.5
+    return round(minutes * hr_reserve * 0.64 * math.exp(1.92 * hr_reserve), 1)
+
+
+def activity_contribution(activity):
+    """Get the compact row an activity contributes to the table, or None if it has no date."""
+    derived = get_derived_fields(activity)
+    if not derived.get('local_date'):
+        return None
+
+    return [
+        derived['local_date'],
+        activity.get('sport_type') or activity.get('type') or 'Unknown',
+        activity.get('distance') or 0,
+        activity.get('moving_time') or 0,
+        activity.get('average_heartrate'),
+        derived.get('pace'),
+        activity_training_load(activity)
+    ]
+
+
+def build_bucket(rows):
+    """Aggregate the contribution rows of one (date, sport type) bucket."""
+    bucket = {'count': 0, 'distance': 0.0, 'moving_time': 0, 'hr_sum': 0.0, 'hr_count': 0,
+              'best_pace': None, 'load': 0.0}
+    for _, _, distance, moving_time, avg_hr, pace, load in rows:
+        bucket['count'] += 1
+        bucket['load'] += load
+        bucket['distance'] += distance / 1000  # km
+        bucket['moving_time'] += moving_time
+        if avg_hr:
+            bucket['hr_sum'] += avg_hr
+            bucket['hr_count'] += 1
+        # Fastest pace for runs > 1km, with the same sanity check as the yearly stats
+        if pace and distance > 1000 and pace > 180:
+            if bucket['best_pace'] is None or pace < bucket['best_pace']:
+                bucket['best_pace'] = pace
+    return bucket
+
+
+def update_daily_aggregates(table, activities):
+    """
+    Bring the table in line with the given activity list.
+
+    Only buckets whose contributing activities were added, changed or deleted are rebuilt.
+    Returns the set of local dates that changed.
+    """
+    contributions = table['contributions']
+    touched = set()
+    seen_ids = set()
+
+    for activity in activities:
+        activity_id = activity.get('id')
+        if not activity_id:
+            continue
+        key = str(activity_id)
+        seen_ids.add(key)
+
+        row = activity_contribution(activity)
+        old_row = contributions.get(key)
+        if row == old_row:
+            continue
+
+        if old_row:
+            touched.add((old_row[0], old_row[1]))
+        if row:
+            contributions[key] = row
+            touched.add((row[0], row[1]))
+        else:
+            contributions.pop(key, None)
+
+    # Activities no longer present were deleted
+    for key in [key for key in contributions if key not in seen_ids]:
+        row = contributions.pop(key)
+        touched.add((row[0], row[1]))
+
+    if not touched:
+        return set()
+
+    # Rebuild only the touched buckets from their remaining contributions, summed in activity
+    # id order: float sums depend on the order, and the contributions dict's order depends on
+    # the update history
+    rows_by_bucket = defaultdict(list)
+    for _, row in sorted(contributions.items()):
+        if (row[0], row[1]) in touched:
+            rows_by_bucket[(row[0], row[1])].append(row)
+
+    years = table['years']
+    for local_date, sport in sorted(touched):
+        year_days = years.setdefault(local_date[:4], {})
+        day = year_days.setdefault(local_date, {})
+        rows = rows_by_bucket.get((local_date, sport))
+        if rows:
+            day[sport] = build_bucket(rows)
+        else:
+            day.pop(sport, None)
+            if not day:
+                del year_days[local_date]
+                if not year_days:
+                    del years[local_date[:4]]
+
+    # Keep years, dates and sports in sorted order so the table (and every sum read from
+    # it) is the same however it was built up
+    for year in {local_date[:4] for local_date, _ in touched} & set(years):
+        years[year] = {local_date: dict(sorted(day.items())) for local_date, day in sorted(years[year].items())}
+    table['years'] = dict(sorted(years.items()))
+
+    changed_dates = {local_date for local_date, _ in touched}
+    table['revision'] += 1
+    table['changes'].append([table['revision'], sorted(changed_dates)])
+    del table['changes'][:-CHANGE_LOG_SIZE]
+    return changed_dates
+
+
+def get_change_cursor(table):
+    """Get a cursor marking the table's current state, to pass to get_changed_dates_since later."""
+    return [table['id'], table['revision']]
+
+
+def get_changed_dates_since(table, cursor):
+    """
+    Get the dates changed since the given cursor was taken.
+    
+    Returns None when the cursor belongs to another (rebuilt) table or the change log no
+    longer reaches back that far, in which case the caller should recompute from scratch.
+    """
+    if not cursor or cursor[0] != table['id']:
+        return None
+    revision = cursor[1]
+    if revision == table['revision']:
+        return set()
+    changes = table['changes']
+    if revision > table['revision'] or not changes or changes[0][0] > revision + 1:
+        return None
+    return {local_date for entry_revision, dates in changes if entry_revision > revision for local_date in dates}
+
+
+def refresh_daily_aggregates(activities, file_path=AGGREGATES_FILE):
+    """Load the persisted table, apply any changes from the activity list and save it."""
+    table = load_daily_aggregates(file_path)
+    if update_daily_aggregates(table, activities):
+        save_daily_aggregates(table, file_path)
+    return table
+
+
+def get_years(table):
+    """Get the years present in the table."""
+    return sorted(int(year) for year in table['years'])
+
+
+def merge_buckets(day, sport_types=None):
+    """Merge one day's sport buckets into a single totals dict, or None if nothing matches."""
+    buckets = [bucket for sport, bucket in day.items() if sport_types is None or sport in sport_types]
+    if not buckets:
+        return None
+    paces = [bucket['best_pace'] for bucket in buckets if bucket['best_pace']]
+    return {
+        'distance': sum(bucket['distance'] for bucket in buckets),
+        'count': sum(bucket['count'] for bucket in buckets),
+        'moving_time': sum(bucket['moving_time'] for bucket in buckets),
+        'hr_sum': sum(bucket['hr_sum'] for bucket in buckets),
+        'hr_count': sum(bucket['hr_count'] for bucket in buckets),
+        'best_pace': min(paces) if paces else None,
+        'load': sum(bucket['load'] for bucket in buckets)
+    }
+
+
+def get_day_totals(table, local_date, sport_types=None):
+    """Get the merged totals for a single YYYY-MM-DD date, or None if there were no activities."""
+    day = table['years'].get(local_date[:4], {}).get(local_date)
+    return merge_buckets(day, sport_types) if day else None
+
+
+def get_daily_totals(table, year=None, sport_types=None):
+    """
+    Merge sport buckets into per-day totals.
+
+    Args:
+        year: Only read that year's rows. None reads every year.
+        sport_types: Only include these sport types. None includes all of them.
+
+    Returns:
+        Dict of local date -> {'distance' (km), 'count', 'moving_time', 'hr_sum', 'hr_count', 'best_pace', 'load'}
+    """
+    years = [str(year)] if year is not None else list(table['years'])
+    daily = {}
+    for year_key in years:
+        for local_date, day in table['years'].get(year_key, {}).items():
+            totals = merge_buckets(day, sport_types)
+            if totals:
+                daily[local_date] = totals
+    return daily
+
+
+def get_daily_totals_by_sport(table, year=None):
+    """
+    Build combined and per-sport daily totals in a single pass over the table.
+
+    Returns:
+        (combined, by_sport) where combined maps local date -> totals across all sports and
+        by_sport maps sport type -> local date -> totals for that sport.
+    """
+    years = [str(year)] if year is not None else list(table['years'])
+    combined = {}
+    by_sport = defaultdict(dict)
+    for year_key in years:
+        for local_date, day in table['years'].get(year_key, {}).items():
+            combined[local_date] = merge_buckets(day)
+            for sport, bucket in day.items():
+                by_sport[sport][local_date] = merge_buckets({sport: bucket})
+    return combined, dict(by_sport)
+
+
+def sport_slug(sport_type):
+    """File-name form of a sport type, e.g. 'WeightTraining' -> 'weighttraining'."""
+    return ''.join(ch for ch in sport_type.lower() if ch.isalnum())
+
+
+if __name__ == "__main__":
+    from generate_visualizations import load_activities
+    table = new_daily_aggregates()
+    update_daily_aggregates(table, load_activities())
+    save_daily_aggregates(table)
+    print(f"Rebuilt {AGGREGATES_FILE} for years: {get_years(table)}")
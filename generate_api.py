@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Static JSON API generation.
+Implements the data_interface.md endpoints as precomputed, paginated shards under
+generated/api/ so GitHub Pages can serve them as cacheable static files.
+"""
+
+import os
+from daily_aggregates import get_daily_totals_by_sport, sport_slug
+from polyline import summary_polyline
+from timezone_config import get_derived_fields
+from serialization import dumps
+
+API_DIR = 'generated/api'
+PAGE_SIZE = 50
+
+# Fields kept in API activity records; heavy detail (laps, splits, efforts, photos) is left out
+API_ACTIVITY_FIELDS = [
+    'id', 'name', 'type', 'sport_type', 'start_date', 'start_date_local', 'timezone', 'utc_offset',
+    'distance', 'moving_time', 'elapsed_time', 'total_elevation_gain', 'average_speed', 'max_speed',
+    'average_heartrate', 'max_heartrate', 'suffer_score', 'start_latlng', 'end_latlng',
+    'location_city', 'location_country', 'device_name', 'gear_id', 'derived'
+]
+
+
+def to_api_activity(activity):
+    """Slim an activity down to the fields served by the API."""
+    record = {field: activity[field] for field in API_ACTIVITY_FIELDS if field in activity}
+    record['derived'] = get_derived_fields(activity)
+    polyline = summary_polyline(activity)
+    if polyline:
+        record['map'] = {'summary_polyline': polyline}
+    return record
+
+
+def write_if_changed(file_path, data, written):
+    """Write a JSON shard only if its content changed, so unchanged shards keep their cache."""
+    content = dumps(data)
+    written.add(os.path.normpath(file_path))
+
+    if os.path.exists(file_path):
+        with open(file_path, 'rb') as f:
+            if f.read() == content:
+                return False
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'wb') as f:
+        f.write(content)
+    return True
+
+
+def write_pages(records, directory, written, page_size=PAGE_SIZE):
+    """Split records into page-N.json shards under directory. Returns the page count."""
+    pages = max((len(records) + page_size - 1) // page_size, 1)
+    for page in range(1, pages + 1):
+        write_if_changed(os.path.join(directory, f'page-{page}.json'), {
+            'page': page,
+            'pages': pages,
+            'total': len(records),
+            'offset': (page - 1) * page_size,
+            'limit': page_size,
+            'activities': records[(page - 1) * page_size:page * page_size]
+        }, written)
+    return pages
+
+
+def build_stats(aggregates, year=None):
+    """Stats for one year (or all years) with a per-sport breakdown."""
+    from generate_visualizations import calculate_yearly_stats
+
+    combined, by_sport = get_daily_totals_by_sport(aggregates, year)
+    stats = calculate_yearly_stats(combined)
+    stats['sports'] = {sport: calculate_yearly_stats(daily) for sport, daily in by_sport.items()}
+    return stats
+
+
+def generate_api(activities, aggregates, api_dir=API_DIR, page_size=PAGE_SIZE):
+    """
+    Write the static API shards and the index manifest.
+
+    Layout:
+        index.json                               manifest of every shard
+        activities/page-N.json                   all activities, newest first
+        activities/year/{year}/page-N.json       activities of one year
+        activities/type/{sport}/page-N.json      activities of one sport type
+        stats/all.json, stats/{year}.json        stats with per-sport breakdown
+    """
+    records = sorted(
+        (to_api_activity(activity) for activity in activities if activity.get('id')),
+        key=lambda record: record['derived'].get('epoch', 0),
+        reverse=True
+    )
+
+    # Group once for the year and type shards
+    by_year = {}
+    by_type = {}
+    for record in records:
+        by_year.setdefault(str(record['derived'].get('year')), []).append(record)
+        sport = record.get('sport_type') or record.get('type') or 'Unknown'
+        by_type.setdefault(sport_slug(sport), []).append(record)
+
+    written = set()
+    manifest = {
+        'page_size': page_size,
+        'total': len(records),
+        'activities': {'path': 'activities/page-{page}.json', 'pages': write_pages(records, os.path.join(api_dir, 'activities'), written, page_size)},
+        'years': {},
+        'types': {},
+        'stats': {'all': 'stats/all.json'}
+    }
+
+    for year, year_records in sorted(by_year.items()):
+        pages = write_pages(year_records, os.path.join(api_dir, 'activities', 'year', year), written, page_size)
+        manifest['years'][year] = {'path': f'activities/year/{year}/page-{{page}}.json', 'total': len(year_records), 'pages': pages}
+
+    for sport, type_records in sorted(by_type.items()):
+        pages = write_pages(type_records, os.path.join(api_dir, 'activities', 'type', sport), written, page_size)
+        manifest['types'][sport] = {'path': f'activities/type/{sport}/page-{{page}}.json', 'total': len(type_records), 'pages': pages}
+
+    write_if_changed(os.path.join(api_dir, 'stats', 'all.json'), build_stats(aggregates), written)
+    for year in aggregates['years']:
+        write_if_changed(os.path.join(api_dir, 'stats', f'{year}.json'), build_stats(aggregates, year), written)
+        manifest['stats'][year] = f'stats/{year}.json'
+
+    write_if_changed(os.path.join(api_dir, 'index.json'), manifest, written)
+
+    # Remove shards that are no longer produced (e.g. fewer pages than before)
+    for root, _, files in os.walk(api_dir):
+        for name in files:
+            file_path = os.path.normpath(os.path.join(root, name))
+            if name.endswith('.json') and file_path not in written:
+                os.remove(file_path)
+
+    return manifest
+
+
+if __name__ == "__main__":
+    from daily_aggregates import refresh_daily_aggregates
+    from generate_visualizations import load_activities
+    activities = load_activities()
+    manifest = generate_api(activities, refresh_daily_aggregates(activities))
+    print(f"Static API with {manifest['total']} activities saved to {API_DIR}/")
@@ -4,49 +4,46 @@ Script to pre-generate clock and heatmap visualizations from Strava data.
 This script processes activities.json and generates SVG visualizations.
 """
 
-import json
 import os
 import sys
 from datetime import datetime, timedelta, timezone
 import math
 import calendar
-from timezone_config import parse_local_datetime, get_timezone_info
+from daily_aggregates import refresh_daily_aggregates, get_daily_totals_by_sport, get_years, sport_slug
+from training_load import generate_training_load
+from year_comparison import generate_year_comparison
+from generate_api import generate_api
+from storage_codec import publish_precompressed
+from svg_writer import SvgWriter, fmt, numbers, short_color
+from activity_model import load_activity_models
+from serialization import dump_json
 
 def load_activities(file_path='data/activities.json'):
-    """Load activities from JSON file."""
+    """Load activities from JSON file as compact Activity models."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_activity_models(file_path)
     except FileNotFoundError:
         print(f"Error: {file_path} not found")
         return []
-    except json.JSONDecodeError:
-        print(f"Error: Invalid JSON in {file_path}")
+    except ValueError as e:
+        print(f"Error: Invalid activity data in {file_path}: {e}")
         return []
 
-def generate_clock_visualization(activities, year=None, size=120):
-    """Generate circular clock visualization matching strava_circular.svg format showing activity distribution by day of year."""
+def generate_clock_visualization(daily, year=None, size=120, compact=False, minify=False):
+    """
+    Generate circular clock visualization matching strava_circular.svg format showing activity distribution by day of year.
+    
+    compact and minify select the SvgWriter output variants (the clock has no tooltips to drop).
+    """
     if year is None:
         year = datetime.now().year
     
-    # Create daily activity data structure
-    from collections import defaultdict
-    import calendar
-    
-    daily_data = defaultdict(float)
-    
-    # Filter activities by year and aggregate by date
-    for activity in activities:
-        try:
-            # Use start_date_local with proper timezone handling
-            start_time = parse_local_datetime(activity['start_date_local'])
-            
-            if start_time.year == year:
-                date_str = start_time.strftime('%Y-%m-%d')
-                distance_km = activity['distance'] / 1000
-                daily_data[date_str] += distance_km
-        except (ValueError, KeyError):
-            continue
+    # Daily distances for the year from the aggregated daily totals
+    daily_data = {
+        date_str: day['distance']
+        for date_str, day in daily.items()
+        if date_str.startswith(str(year))
+    }
     
     # Calculate total distance
     total_distance = sum(daily_data.values())
@@ -56,12 +53,8 @@ def generate_clock_visualization(activities, year=None, size=120):
     days_in_year = 366 if is_leap_year else 365
     
     # Generate SVG with configurable size
-    svg_parts = [
-        '<?xml version="1.0" encoding="utf-8" ?>',
-        f'<svg baseProfile="full" height="{size}mm" version="1.1" viewBox="0,0,{size},{size}" width="{size}mm" xmlns="http://www.w3.org/2000/svg" xmlns:ev="http://www.w3.org/2001/xml-events" xmlns:xlink="http://www.w3.org/1999/xlink">',
-        '<defs />',
-        f'<rect fill="#222222" height="{size}" width="{size}" x="0" y="0" />'
-    ]
+    svg = SvgWriter(f'{size}mm', f'{size}mm', f'0 0 {size} {size}', compact)
+    svg.add(svg.element('rect', [('width', size), ('height', size), ('class', svg.fill_class('#222222'))]))
     
     # Center coordinates and radii (scaled to size)
     center_x, center_y = size/2.0, size/2.0
@@ -72,23 +65,26 @@ def generate_clock_visualization(activities, year=None, size=120):
     # Calculate degrees per day
     df = 360.0 / days_in_year
     
-    # Remove animations for cleaner display
-    no_animate = ''
+    # Shared text and month-marker styles
+    svg.rule('text', 'fill:#fff;font-family:Arial')
+    svg.rule('line', 'stroke:#fff;stroke-width:.3')
     
     # Center text - Year (larger font size)
-    year_style = f"dominant-baseline: central; font-size:{min_size * 6.0 / 80.0}px; font-family:Arial;"
-    svg_parts.append(f'<text alignment-baseline="middle" fill="#FFFFFF" style="{year_style}" text-anchor="middle" x="{center_x}" y="{center_y}">{year}</text>')
+    year_class = svg.css_class(f'font-size:{fmt(min_size * 6.0 / 80.0, 2)}px;dominant-baseline:central;text-anchor:middle', 'y')
+    svg.add(svg.element('text', [('class', year_class), ('x', center_x), ('y', center_y)], str(year)))
     
     # Top left - Distance (repositioned to top left, avoid circle overlap)
-    distance_style = f"dominant-baseline: central; font-size:{min_size * 4.0 / 80.0}px; font-family:Arial;"
-    svg_parts.append(f'<text alignment-baseline="middle" fill="#FFFFFF" style="{distance_style}" text-anchor="start" x="5" y="8">{total_distance:.0f} km</text>')
+    distance_class = svg.css_class(f'font-size:{fmt(min_size * 4.0 / 80.0, 2)}px;dominant-baseline:central', 'd')
+    svg.add(svg.element('text', [('class', distance_class), ('x', 5), ('y', 8)], f'{total_distance:.0f} km'))
+    
+    month_class = svg.css_class(f'font-size:{fmt(min_size * 3.75 / 80.0, 2)}px;text-anchor:middle', 'm')
     
     # Generate daily segments following GitHubPoster logic
     day = 0
     date = datetime(year, 1, 1).date()
     
     # Find max distance for normalization
-    max_distance = max(daily_data.values()) if daily_data.values() else 1
+    max_distance = max(daily_data.values(), default=0) or 1
     
     while date.year == year:
         text_date = date.strftime('%Y-%m-%d')
@@ -106,24 +102,25 @@ def generate_clock_visualization(activities, year=None, size=120):
             r3 = outer_radius + 2
             
             # Month marker line
-            line_x1 = center_x + r1 * sin_a1
-            line_y1 = center_y - r1 * cos_a1  
-            line_x2 = center_x + r2 * sin_a1
-            line_y2 = center_y - r2 * cos_a1
-            svg_parts.append(f'<line stroke="#FFFFFF" stroke-width="0.3" x1="{line_x1:.1f}" x2="{line_x2:.1f}" y1="{line_y1:.1f}" y2="{line_y2:.1f}"{no_animate}></line>')
+            svg.add(svg.element('line', [
+                ('x1', center_x + r1 * sin_a1), ('y1', center_y - r1 * cos_a1),
+                ('x2', center_x + r2 * sin_a1), ('y2', center_y - r2 * cos_a1)
+            ]))
             
-            # Curved path for month name
+            # Curved path for month name (only referenced, so it lives in <defs>)
             path_x = center_x + r3 * sin_a1
             path_y = center_y - r3 * cos_a1
             arc_dx = r3 * (sin_a3 - sin_a1)
             arc_dy = r3 * (cos_a1 - cos_a3)
             path_id = f"month{date.month}"
-            svg_parts.append(f'<path d="M {path_x:.1f} {path_y:.1f} a{r3},{r3} 0 0,1 {arc_dx:.1f}, {arc_dy:.1f}" fill="none" id="{path_id}" stroke="none"{no_animate}></path>')
+            svg.define(svg.element('path', [
+                ('id', path_id), ('d', f'M{numbers(path_x, path_y)}a{numbers(r3, r3)} 0 0 1 {numbers(arc_dx, arc_dy)}')
+            ]))
             
             # Month name on curved path
-            month_style = f"font-size:{min_size * 3.75 / 80.0}px; font-family:Arial;"
             text_offset = 0.5 * r3 * (a3 - a1)
-            svg_parts.append(f'<text fill="#FFFFFF" style="{month_style}" text-anchor="middle"><textPath startOffset="{text_offset:.1f}" xlink:href="#{path_id}">{date.strftime("%B")}</textPath></text>')
+            text_path = svg.element('textPath', [('href', f'#{path_id}'), ('startOffset', text_offset)], date.strftime("%B"))
+            svg.add(svg.element('text', [('class', month_class)], text_path))
         
         # Draw activity segment if there's data for this date
         if text_date in daily_data:
@@ -144,19 +141,17 @@ def generate_clock_visualization(activities, year=None, size=120):
             start_x = center_x + r1 * sin_a1
             start_y = center_y - r1 * cos_a1
             
-            path_data = f"M {start_x:.1f} {start_y:.1f}"
-            path_data += f" l {(r2 - r1) * sin_a1:.1f} {(r1 - r2) * cos_a1:.1f}"
-            path_data += f" a{r2},{r2} 0 0,0 {r2 * (sin_a2 - sin_a1):.1f},{r2 * (cos_a1 - cos_a2):.1f}"
-            path_data += f" l {(r1 - r2) * sin_a2:.1f} {(r2 - r1) * cos_a2:.1f}"
+            path_data = f"M{numbers(start_x, start_y)}"
+            path_data += f"l{numbers((r2 - r1) * sin_a1, (r1 - r2) * cos_a1)}"
+            path_data += f"a{numbers(r2, r2)} 0 0 0 {numbers(r2 * (sin_a2 - sin_a1), r2 * (cos_a1 - cos_a2))}"
+            path_data += f"l{numbers((r1 - r2) * sin_a2, (r2 - r1) * cos_a2)}"
             
-            svg_parts.append(f'<path d="{path_data}" fill="{color}" stroke="none"></path>')
+            svg.add(svg.element('path', [('d', path_data), ('class', svg.fill_class(color))]))
         
         day += 1
         date += timedelta(days=1)
     
-    svg_parts.append('</svg>')
-    
-    return '\n'.join(svg_parts)
+    return svg.render(minify)
 
 def get_circular_hour_color(intensity):
     """Get color for circular hour visualization based on intensity, using strava_circular.svg colors."""
@@ -173,8 +168,8 @@ def get_circular_hour_color(intensity):
     else:
         return '#ffda00'  # Gold (maximum intensity)
 
-def generate_heatmap_visualization(activities, year=None):
-    """Generate Nike-style heatmap visualization."""
+def generate_heatmap_visualization(daily, year=None, compact=False, minify=False):
+    """Generate Nike-style heatmap visualization (compact drops the per-day tooltips)."""
     # Initialize data structure
     if year:
         start_date = datetime(year, 1, 1)
@@ -193,52 +188,32 @@ def generate_heatmap_visualization(activities, year=None):
         date_data[date_str] = {'distance': 0, 'count': 0}
         current_date += timedelta(days=1)
     
-    # Filter activities by year if specified
-    filtered_activities = activities
-    if year:
-        temp_filtered = []
-        for activity in activities:
-            try:
-                start_time = parse_local_datetime(activity['start_date_local'])
-                
-                if start_time.year == year:
-                    temp_filtered.append(activity)
-            except (ValueError, KeyError):
-                continue
-        filtered_activities = temp_filtered
-    
-    # Aggregate activity data
-    for activity in filtered_activities:
-        try:
-            activity_date = parse_local_datetime(activity["start_date_local"])
-            date_str = activity_date.strftime('%Y-%m-%d')
-            if date_str in date_data:
-                date_data[date_str]['distance'] += activity['distance'] / 1000  # Convert to km
-                date_data[date_str]['count'] += 1
-        except (ValueError, KeyError):
-            continue
+    # Fill in the aggregated daily totals
+    for date_str, day in daily.items():
+        if date_str in date_data:
+            date_data[date_str]['distance'] = day['distance']
+            date_data[date_str]['count'] = day['count']
     
     # Generate SVG with larger size and internal labels
-    svg_parts = [
-        '<?xml version="1.0" encoding="UTF-8"?>',
-        '<svg width="1200" height="280" viewBox="0 0 1200 280" xmlns="http://www.w3.org/2000/svg">',
-        '  <style>',
-        '    .heatmap-cell { rx: 3; }',
-        '    .year-label { fill: #c9d1d9; font-size: 28px; font-family: Arial, sans-serif; font-weight: bold; }',
-        '    .month-label { fill: #8b949e; font-size: 14px; font-family: Arial, sans-serif; text-anchor: middle; }',
-        '  </style>'
-    ]
+    svg = SvgWriter(1200, 280, '0 0 1200 280', compact)
+    svg.rule('text', 'font-family:Arial,sans-serif')
+    svg.css_class('fill:#c9d1d9;font-size:28px;font-weight:bold', 'year-label')
+    svg.css_class('fill:#8b949e;font-size:14px;text-anchor:middle', 'month-label')
     
     cell_size = 18
     gap = 3
     start_x = 25
     start_y = 80  # Leave space for year and month labels
     
+    # One cell shape placed with <use>; cells without a color class are empty days
+    svg.rule('use', f'fill:{short_color(get_heatmap_color(0))}')
+    svg.define(svg.element('rect', [('id', 'cell'), ('width', cell_size), ('height', cell_size), ('rx', 3)]))
+    
     # Get current year for display
     display_year = year if year else datetime.now().year
     
     # Add year label
-    svg_parts.append(f'  <text x="{start_x}" y="40" class="year-label">{display_year} Activity Heatmap</text>')
+    svg.add(svg.element('text', [('x', start_x), ('y', 40), ('class', 'year-label')], f'{display_year} Activity Heatmap'))
     
     # Add month labels
     month_labels = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
@@ -246,7 +221,7 @@ def generate_heatmap_visualization(activities, year=None):
     
     for i, month_label in enumerate(month_labels):
         x = start_x + i * (cell_size + gap) * 4.5  # Approximate width per month
-        svg_parts.append(f'  <text x="{x}" y="75" class="month-label">{month_label}</text>')
+        svg.add(svg.element('text', [('x', x), ('y', 75), ('class', 'month-label')], month_label))
     
     # Group days by week
     weeks = []
@@ -275,18 +250,19 @@ def generate_heatmap_visualization(activities, year=None):
             y = start_y + day_index * (cell_size + gap)
             
             distance = day['data']['distance']
-            color = get_heatmap_color(distance)
+            color_class = svg.fill_class(get_heatmap_color(distance)) if distance else None
             
-            svg_parts.append(f'  <rect x="{x}" y="{y}" width="{cell_size}" height="{cell_size}" fill="{color}" class="heatmap-cell">')
-            svg_parts.append(f'    <title>{day["date"]}: {day["data"]["distance"]:.1f}km ({day["data"]["count"]} activities)</title>')
-            svg_parts.append('  </rect>')
-    
-    svg_parts.append('</svg>')
+            svg.add(svg.use('cell', x, y, color_class,
+                            title=f'{day["date"]}: {day["data"]["distance"]:.1f}km ({day["data"]["count"]} activities)'))
     
-    return '\n'.join(svg_parts)
+    return svg.render(minify)
 
-def generate_nike_style_heatmap(activities, year=None):
-    """Generate Nike-style heatmap with same height as clock for summary page display."""
+def generate_nike_style_heatmap(daily, year=None, compact=False, minify=False):
+    """
+    Generate Nike-style heatmap with same height as clock for summary page display.
+    
+    compact drops the per-day tooltips (not shown when the SVG is embedded with <img>).
+    """
     if year is None:
         year = datetime.now().year
     
@@ -301,24 +277,11 @@ def generate_nike_style_heatmap(activities, year=None):
         date_data[date_str] = {'distance': 0, 'count': 0}
         current_date += timedelta(days=1)
     
-    # Filter activities by year if specified
-    filtered_activities = activities
-    if year:
-        filtered_activities = [
-            activity for activity in activities
-            if parse_local_datetime(activity["start_date_local"]).year == year
-        ]
-    
-    # Aggregate activity data
-    for activity in filtered_activities:
-        try:
-            activity_date = parse_local_datetime(activity["start_date_local"])
-            date_str = activity_date.strftime('%Y-%m-%d')
-            if date_str in date_data:
-                date_data[date_str]['distance'] += activity['distance'] / 1000  # Convert to km
-                date_data[date_str]['count'] += 1
-        except (ValueError, KeyError):
-            continue
+    # Fill in the aggregated daily totals
+    for date_str, day in daily.items():
+        if date_str in date_data:
+            date_data[date_str]['distance'] = day['distance']
+            date_data[date_str]['count'] = day['count']
     
     # Calculate total distance
     total_distance = sum(day['distance'] for day in date_data.values())
@@ -359,19 +322,16 @@ def generate_nike_style_heatmap(activities, year=None):
     grid_width = weeks_per_year * cell_size + (weeks_per_year - 1) * gap
     
     # Generate SVG with calculated optimal dimensions (no units for pixel-based display)
-    svg_parts = [
-        '<?xml version="1.0" encoding="utf-8" ?>',
-        f'<svg baseProfile="full" height="{svg_height}" version="1.1" viewBox="0,0,{svg_width},{svg_height}" width="{svg_width}" xmlns="http://www.w3.org/2000/svg">',
-        '<defs />',
-        f'<rect fill="#222222" height="{svg_height}" width="{svg_width}" x="0" y="0" />'
-    ]
+    svg = SvgWriter(fmt(svg_width), svg_height, f'0 0 {fmt(svg_width)} {svg_height}', compact)
+    svg.add(svg.element('rect', [('width', svg_width), ('height', svg_height), ('class', svg.fill_class('#222222'))]))
+    svg.rule('text', 'font-family:Arial')
     
     # Layout positioning based on design
     # 1. Distance label at top
     distance_font_size = 11
     distance_y = 12
-    distance_style = f"font-size:{distance_font_size}px; font-family:Arial; font-weight:bold;"
-    svg_parts.append(f'<text fill="#FFFFFF" style="{distance_style}" text-anchor="start" x="{side_margin}" y="{distance_y}">{total_distance:.0f} km</text>')
+    distance_class = svg.css_class(f'fill:#fff;font-size:{distance_font_size}px;font-weight:bold', 'd')
+    svg.add(svg.element('text', [('class', distance_class), ('x', side_margin), ('y', distance_y)], f'{total_distance:.0f} km'))
     
     # 2. Grid positioning
     grid_start_x = side_margin
@@ -411,36 +371,34 @@ def generate_nike_style_heatmap(activities, year=None):
     # 3. Add month labels
     month_font_size = 9
     month_y = distance_label_height + month_label_height - 2
-    month_style = f"font-size:{month_font_size}px; font-family:Arial;"
+    month_class = svg.css_class(f'fill:#8b949e;font-size:{month_font_size}px', 'm')
     for week_index, month_name in month_starts:
         if week_index < len(weeks):
             x = grid_start_x + week_index * (cell_size + gap)
-            svg_parts.append(f'<text fill="#8b949e" style="{month_style}" text-anchor="start" x="{x:.1f}" y="{month_y}">{month_name}</text>')
+            svg.add(svg.element('text', [('class', month_class), ('x', x), ('y', month_y)], month_name))
+    
+    # 4. Draw heatmap cells in the grid area: one rounded cell placed with <use>, with proportional
+    # corners; cells without a color class are empty days
+    corner_radius = max(1, cell_size * 0.1)
+    svg.rule('use', f'fill:{short_color(get_nike_heatmap_color(0))}')
+    svg.define(svg.element('rect', [('id', 'cell'), ('width', cell_size), ('height', cell_size), ('rx', corner_radius)]))
     
-    # 4. Draw heatmap cells in the grid area
     for week_index, week in enumerate(weeks):
         for day_index, day in enumerate(week):
             x = grid_start_x + week_index * (cell_size + gap)
             y = grid_start_y + day_index * (cell_size + gap)
             
             distance = day['data']['distance']
-            color = get_nike_heatmap_color(distance)
-            
-            # Use proportional rounded corners
-            corner_radius = max(1, cell_size * 0.1)
-            svg_parts.append(f'<rect x="{x:.1f}" y="{y:.1f}" width="{cell_size:.1f}" height="{cell_size:.1f}" fill="{color}" rx="{corner_radius:.1f}">')
+            color_class = svg.fill_class(get_nike_heatmap_color(distance)) if distance else None
             
             # Add tooltip
             if distance > 0:
-                svg_parts.append(f'<title>{day["date"]}: {distance:.2f} km ({day["data"]["count"]} activities)</title>')
+                title = f'{day["date"]}: {distance:.2f} km ({day["data"]["count"]} activities)'
             else:
-                svg_parts.append(f'<title>{day["date"]}</title>')
-            
-            svg_parts.append('</rect>')
-    
-    svg_parts.append('</svg>')
+                title = day['date']
+            svg.add(svg.use('cell', x, y, color_class, title))
     
-    return '\n'.join(svg_parts)
+    return svg.render(minify)
 
 def get_heatmap_color(distance):
     """Get Nike-style color for heatmap based on distance (matching GitHubPoster Nike colors)."""
@@ -465,17 +423,10 @@ def get_nike_heatmap_color(distance):
     """Get Nike-style color for heatmap based on distance (same as get_heatmap_color)."""
     return get_heatmap_color(distance)
 
-def calculate_yearly_stats(activities, year=None):
-    """Calculate yearly statistics."""
-    # Filter activities by year if specified
-    filtered_activities = activities
-    if year:
-        filtered_activities = [
-            activity for activity in activities
-            if parse_local_datetime(activity["start_date_local"]).year == year
-        ]
+def calculate_yearly_stats(daily):
+    """Calculate yearly statistics from the daily totals of one year (or all years)."""
     
-    if not filtered_activities:
+    if not daily:
         return {
             'total_activities': 0,
             'total_distance': 0,
@@ -486,31 +437,23 @@ def calculate_yearly_stats(activities, year=None):
             'streak': 0
         }
     
-    total_activities = len(filtered_activities)
-    total_distance = sum(activity['distance'] for activity in filtered_activities) / 1000  # km
-    total_time = sum(activity['moving_time'] for activity in filtered_activities)  # seconds
+    total_activities = sum(day['count'] for day in daily.values())
+    total_distance = sum(day['distance'] for day in daily.values())  # km
+    total_time = sum(day['moving_time'] for day in daily.values())  # seconds
     
     # Calculate average pace (seconds per km)
     avg_pace = total_time / total_distance if total_distance > 0 else 0
     
-    # Calculate best pace (fastest pace for runs > 1km)
-    best_pace = float('inf')
-    for activity in filtered_activities:
-        if activity.get('moving_time') and activity.get('distance') and activity['distance'] > 1000:
-            pace = activity['moving_time'] / (activity['distance'] / 1000)
-            if pace < best_pace and pace > 180:  # Sanity check: pace should be > 3 minutes per km
-                best_pace = pace
-    best_pace = best_pace if best_pace != float('inf') else 0
+    # Best pace (fastest pace for runs > 1km), already filtered per day
+    paces = [day['best_pace'] for day in daily.values() if day['best_pace']]
+    best_pace = min(paces) if paces else 0
     
     # Calculate average heart rate
-    heart_rate_activities = [activity for activity in filtered_activities if activity.get('average_heartrate')]
-    avg_heart_rate = (
-        sum(activity['average_heartrate'] for activity in heart_rate_activities) / len(heart_rate_activities)
-        if heart_rate_activities else 0
-    )
+    hr_count = sum(day['hr_count'] for day in daily.values())
+    avg_heart_rate = sum(day['hr_sum'] for day in daily.values()) / hr_count if hr_count else 0
     
     # Calculate streak
-    streak = calculate_streak(filtered_activities)
+    streak = calculate_streak(daily.keys())
     
     return {
         'total_activities': total_activities,
@@ -522,18 +465,13 @@ def calculate_yearly_stats(activities, year=None):
         'streak': streak
     }
 
-def calculate_streak(activities):
-    """Calculate current activity streak."""
-    if not activities:
-        return 0
-    
-    # Get unique activity dates
+def calculate_streak(local_dates):
+    """Calculate current activity streak from the YYYY-MM-DD dates that have activities."""
     activity_dates = set()
-    for activity in activities:
+    for local_date in local_dates:
         try:
-            activity_date = parse_local_datetime(activity["start_date_local"])
-            activity_dates.add(activity_date.date())
-        except (ValueError, KeyError):
+            activity_dates.add(datetime.strptime(local_date, '%Y-%m-%d').date())
+        except ValueError:
             continue
     
     if not activity_dates:
@@ -582,6 +520,27 @@ This file provides a template for integrating with external data sources.
 - **Parameters**:
   - `year` (optional): Filter by year
 
+## Static API (GitHub Pages)
+
+`generate_visualizations.py` precomputes these endpoints as static shards under
+`generated/api/` (pages of 50 activities, newest first):
+
+- `generated/api/index.json`: manifest with page counts for every shard
+- `generated/api/activities/page-{n}.json`: all activities
+- `generated/api/activities/year/{year}/page-{n}.json`: activities of one year
+- `generated/api/activities/type/{sport}/page-{n}.json`: activities of one sport type (e.g. `run`, `walk`)
+- `generated/api/stats/all.json`, `generated/api/stats/{year}.json`: statistics with a per-sport breakdown
+
+`offset`/`limit` map onto pages as `page = offset / 50 + 1`.
+
+## Local API Server
+
+`python api_server.py` serves the endpoints above from memory on `API_SERVER_HOST:API_SERVER_PORT`
+(default `127.0.0.1:8788`) and reloads `data/activities.json` when it changes.
+`/api/activities` also accepts `type` (sport, e.g. `run`), `after`/`before` (`YYYY-MM-DD`) and
+`min_distance`/`max_distance` (meters). Responses carry an `ETag` (send `If-None-Match` to get `304`)
+and are gzip-compressed when the client accepts it.
+
 ### Update Activity Data
 - **Endpoint**: `/api/activities/sync`
 - **Method**: POST
@@ -608,6 +567,49 @@ Activities should follow this JSON structure:
 }
 ```
 
+The file is committed compressed as `data/activities.json.gz`, like the other `data/*.json`
+stores (`STORAGE_CODEC`: `gzip` by default, `zstd` with the `zstandard` package, or `none`). Every
+loader reads whichever copy exists. The dashboard decompresses the `.gz` file in the browser, so
+a deployed site needs `gzip` or `none`.
+
+Detail-only fields (`segment_efforts`, `best_efforts`, `laps`, `splits_metric`, `splits_standard`,
+`photos`) are not stored inline. They live in compressed files under `data/cold/`, named by a hash
+of their content, and the activity keeps a reference:
+```json
+"cold": {"ref": "3f2a...", "fields": ["best_efforts", "laps", "segment_efforts", "splits_metric"]}
+```
+
+The sync also writes `data/activity_columns/`, a local (uncommitted) cache of the numeric and
+date fields as NumPy `.npy` columns that the stats scripts memory-map. It is rebuilt whenever
+`data/activities.json` changes, so it never needs to be cleared by hand.
+
+Every JSON and SVG file under `generated/` gets precompressed `.gz` (and, with the `brotli`
+package, `.br`) siblings, for hosts that serve precompressed files as is. Each chart SVG also has
+a `.min.svg` variant without tooltips or whitespace for `<img>` embedding, as on the summary page.
+
+`generated/thumbnails/` holds a small SVG of each route, named by a hash of its polyline, plus an
+`index.json` mapping activity ids to file names. The activity list and details panel show these
+images instead of a live map. Only new routes are rendered, in parallel (`THUMBNAIL_WORKERS`
+processes, the CPU count by default).
+
+`generated/heatmap/{z}/{x}/{y}.png` is an XYZ tile pyramid (zooms 0-14) of route density: each
+pixel is colored by how many activities passed through it, and `index.json` gives the zoom range
+and bounds. The map's 🔥 button overlays it, so years of routes show without loading any
+polylines. `data/heatmap_tiles.json` records the tiles each route crosses, so a sync only redraws
+tiles under new, changed or deleted routes (`HEATMAP_WORKERS` processes, the CPU count by default).
+
+Each sync that changes the activities records a version in `data/snapshots/`. The oldest kept
+version is a full base and every later one a delta of added records, removed ids and field
+patches. `SNAPSHOT_COUNT` (default 10) sets how many versions are kept. `python snapshots.py`
+lists them, and `python snapshots.py restore <id>` writes one back to `data/activities.json`.
+
+History can also be backfilled from a Strava account export: `python bulk_import.py export.zip`
+(or the unpacked folder) reads `activities.csv` and the GPX, TCX and FIT files (FIT needs the
+`fitparse` package), parses them in parallel (`IMPORT_WORKERS` processes, the CPU count by
+default) and adds the activities in the same format as the sync, with an encoded route. Files
+without a CSV row get a negative id (minus their start time). Activities already stored, by id
+or by a start time within two minutes, are skipped, so an export can be imported more than once.
+
 ## Environment Variables
 
 Required environment variables:
@@ -619,6 +621,62 @@ Required environment variables:
     with open('data_interface.md', 'w', encoding='utf-8') as f:
         f.write(interface_template)
 
+def write_visualizations(daily, year, label):
+    """
+    Write the clock and both heatmaps for one year's daily totals under the given file label.
+    
+    Each chart gets a readable {name}_{label}.svg with tooltips and a compact, minified
+    {name}_{label}.min.svg for <img> embedding (the summary page), where tooltips never show.
+    """
+    charts = {
+        'clock': lambda compact: generate_clock_visualization(daily, year, size=120, compact=compact, minify=compact),
+        'heatmap': lambda compact: generate_heatmap_visualization(daily, year, compact=compact, minify=compact),
+        'nike_heatmap': lambda compact: generate_nike_style_heatmap(daily, year, compact=compact, minify=compact)
+    }
+    for name, render in charts.items():
+        with open(f'generated/{name}_{label}.svg', 'w', encoding='utf-8') as f:
+            f.write(render(False))
+        with open(f'generated/{name}_{label}.min.svg', 'w', encoding='utf-8') as f:
+            f.write(render(True))
+
+def write_stats(daily, label):
+    """Write the stats file for the given label, e.g. '2025', '2025_run' or 'all'."""
+    stats = calculate_yearly_stats(daily)
+    dump_json(f'generated/stats_{label}.json', stats)
+
+def generate_year_outputs(aggregates, year):
+    """Generate the clock, heatmaps and stats files for a single year, overall and per sport."""
+    # One pass over the year's rows gives both the combined and per-sport daily totals
+    combined, by_sport = get_daily_totals_by_sport(aggregates, year)
+    
+    write_visualizations(combined, year, year)
+    write_stats(combined, year)
+    
+    for sport, daily in by_sport.items():
+        label = f'{year}_{sport_slug(sport)}'
+        # Distance-based charts only make sense for sports that cover distance
+        if any(day['distance'] > 0 for day in daily.values()):
+            write_visualizations(daily, year, label)
+        write_stats(daily, label)
+
+def generate_current_year_outputs(aggregates):
+    """Generate the *_all visualizations, which show the current year."""
+    current_year = datetime.now().year
+    current, _ = get_daily_totals_by_sport(aggregates, current_year)
+    write_visualizations(current, current_year, 'all')
+
+def generate_all_time_stats(aggregates):
+    """Generate the all-time stats_all.json and stats_all_{sport}.json files."""
+    combined, by_sport = get_daily_totals_by_sport(aggregates)
+    write_stats(combined, 'all')
+    for sport, daily in by_sport.items():
+        write_stats(daily, f'all_{sport_slug(sport)}')
+
+def generate_overall_outputs(aggregates):
+    """Generate the *_all visualizations (current year) and all-time stats files."""
+    generate_current_year_outputs(aggregates)
+    generate_all_time_stats(aggregates)
+
 def main():
     """Main function to generate all visualizations."""
     print("Loading activities data...")
@@ -630,17 +688,11 @@ def main():
     
     print(f"Loaded {len(activities)} activities")
     
-    # Get current year and available years
-    current_year = datetime.now().year
-    years = set()
-    for activity in activities:
-        try:
-            activity_date = parse_local_datetime(activity["start_date_local"])
-            years.add(activity_date.year)
-        except (ValueError, KeyError):
-            continue
+    # Bring the persisted daily-aggregate table up to date (only changed days are rebuilt)
+    aggregates = refresh_daily_aggregates(activities)
+    years = get_years(aggregates)
     
-    print(f"Found activities for years: {sorted(years)}")
+    print(f"Found activities for years: {years}")
     
     # Create output directory
     os.makedirs('generated', exist_ok=True)
@@ -648,54 +700,38 @@ def main():
     # Generate visualizations for each year and overall
     for year in sorted(years):
         print(f"Generating visualizations for {year}...")
-        
-        # Generate clock visualization with default size
-        clock_svg = generate_clock_visualization(activities, year, size=120)
-        with open(f'generated/clock_{year}.svg', 'w', encoding='utf-8') as f:
-            f.write(clock_svg)
-        
-        # Generate heatmap visualization
-        heatmap_svg = generate_heatmap_visualization(activities, year)
-        with open(f'generated/heatmap_{year}.svg', 'w', encoding='utf-8') as f:
-            f.write(heatmap_svg)
-        
-        # Generate Nike-style heatmap visualization
-        nike_heatmap_svg = generate_nike_style_heatmap(activities, year)
-        with open(f'generated/nike_heatmap_{year}.svg', 'w', encoding='utf-8') as f:
-            f.write(nike_heatmap_svg)
-        
-        # Generate stats
-        stats = calculate_yearly_stats(activities, year)
-        with open(f'generated/stats_{year}.json', 'w', encoding='utf-8') as f:
-            json.dump(stats, f, indent=2)
+        generate_year_outputs(aggregates, year)
     
     # Generate overall visualizations
     print("Generating overall visualizations...")
-    clock_svg = generate_clock_visualization(activities, size=120)
-    with open('generated/clock_all.svg', 'w', encoding='utf-8') as f:
-        f.write(clock_svg)
+    generate_overall_outputs(aggregates)
+    
+    # Update rolling mileage and fitness curves from the earliest changed day
+    generate_training_load(aggregates)
     
-    heatmap_svg = generate_heatmap_visualization(activities)
-    with open('generated/heatmap_all.svg', 'w', encoding='utf-8') as f:
-        f.write(heatmap_svg)
+    # Precompute year-over-year cumulative curves for the comparison view
+    generate_year_comparison(aggregates)
     
-    nike_heatmap_svg = generate_nike_style_heatmap(activities)
-    with open('generated/nike_heatmap_all.svg', 'w', encoding='utf-8') as f:
-        f.write(nike_heatmap_svg)
+    # Write the static, paginated API shards
+    generate_api(activities, aggregates)
     
-    stats = calculate_yearly_stats(activities)
-    with open('generated/stats_all.json', 'w', encoding='utf-8') as f:
-        json.dump(stats, f, indent=2)
+    # Precompressed .gz/.br siblings for hosts that serve them as is
+    publish_precompressed()
     
     # Create data interface documentation
     create_data_interface()
     
     print("Visualization generation complete!")
     print("Generated files:")
-    print("- Clock visualizations: generated/clock_*.svg")
+    print("- Clock visualizations: generated/clock_*.svg (compact variants: *.min.svg)")
     print("- Heatmap visualizations: generated/heatmap_*.svg")
     print("- Nike-style heatmap visualizations: generated/nike_heatmap_*.svg")
+    print("- Per-sport variants: generated/*_{year}_{sport}.svg, generated/stats_{year}_{sport}.json")
     print("- Statistics: generated/stats_*.json")
+    print("- Training load series: generated/training_load.json")
+    print("- Year-over-year comparison: generated/year_comparison.json")
+    print("- Static API: generated/api/index.json")
+    print("- Precompressed copies: generated/**/*.json.gz, generated/**/*.svg.gz")
     print("- Data interface documentation: data_interface.md")
 
 if __name__ == "__main__":
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+GPS density heatmap tiles.
+Rasterizes every route into Web Mercator pixel grids and writes a static XYZ pyramid of
+transparent PNG tiles, where each pixel's color grows with the number of activities that
+passed through it. The store remembers which tiles each route touched, so a sync only
+redraws the tiles under new, changed or deleted routes, spread across CPU cores.
+"""
+
+import os
+import shutil
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from polyline import get_activity_points, summary_polyline, route_hash
+from spatial_index import MAX_LATITUDE
+from storage_codec import stored_path
+from serialization import load_json, dump_json, save_store
+
+STORE_FILE = 'data/heatmap_tiles.json'
+OUTPUT_DIR = 'generated/heatmap'
+INDEX_FILE = 'index.json'
+
+# Bump when rasterization or colors change so every tile is redrawn
+HEATMAP_VERSION = 1
+
+MIN_ZOOM = 0
+# A zoom-14 pixel is about 8 m at Shanghai's latitude; the map overzooms beyond it
+MAX_ZOOM = 14
+TILE_SIZE = 256
+
+# Activities through a pixel at which its color stops getting brighter. Fixed rather than the
+# busiest pixel's count, so a new route never changes the colors of tiles it does not touch.
+SATURATION = 32
+
+# Color ramp from one activity to SATURATION (RGBA stops on a log scale)
+RAMP_STOPS = [0.0, 0.35, 0.7, 1.0]
+RAMP_COLORS = [
+    (255, 120, 0, 110),
+    (255, 183, 0, 190),
+    (255, 215, 0, 235),
+    (255, 255, 255, 255),
+]
+
+# Tiles of one zoom level rendered per worker job
+TILES_PER_JOB = 64
+
+# Below this many tiles to redraw, rendering in-process beats starting worker processes
+MIN_PARALLEL_TILES = 128
+
+
+def mercator(points):
+    """(lat, lng) points as an (n, 2) array of Web Mercator x, y in [0, 1] (y grows south)."""
+    coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    lat = np.radians(np.clip(coords[:, 0], -MAX_LATITUDE, MAX_LATITUDE))
+    x = (coords[:, 1] + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0
+    return np.clip(np.column_stack([x, y]), 0.0, 1.0 - 1e-12)
+
+
+def rasterize(coords, zoom):
+    """
+    Distinct global pixels (x, y arrays) a route crosses at a zoom level.
+
+    Each segment is sampled once per pixel of its longer axis, all segments at once.
+    """
+    pixels = coords * (TILE_SIZE << zoom)
+    if len(pixels) > 1:
+        deltas = np.diff(pixels, axis=0)
+        steps = np.maximum(np.ceil(np.abs(deltas).max(axis=1)).astype(np.int64), 1)
+        segment = np.repeat(np.arange(len(steps)), steps)
+        offset = np.arange(segment.size) - np.repeat(np.cumsum(steps) - steps, steps)
+        samples = pixels[:-1][segment] + deltas[segment] * (offset / steps[segment])[:, None]
+        pixels = np.vstack([samples, pixels[-1:]])
+
+    cells = np.floor(pixels).astype(np.int64)
+    # One count per route per pixel, however often the route loops through it
+    keys = np.unique(cells[:, 0] * (TILE_SIZE << zoom) + cells[:, 1])
+    return keys // (TILE_SIZE << zoom), keys % (TILE_SIZE << zoom)
+
+
+def route_tiles(coords, zoom=MAX_ZOOM):
+    """Tiles ("x/y") a route crosses at a zoom level."""
+    xs, ys = rasterize(coords, zoom)
+    tiles = np.unique((xs // TILE_SIZE) * (1 << zoom) + ys // TILE_SIZE)
+    return [f'{tile >> zoom}/{tile & ((1 << zoom) - 1)}' for tile in tiles.tolist()]
+
+
+def colorize(counts):
+    """RGBA image of a count grid; empty pixels are transparent."""
+    level = np.minimum(np.log1p(counts) / np.log1p(SATURATION), 1.0)
+    image = np.zeros(counts.shape + (4,), dtype=np.uint8)
+    for channel in range(4):
+        ramp = np.interp(level, RAMP_STOPS, [color[channel] for color in RAMP_COLORS])
+        image[..., channel] = np.where(counts > 0, np.round(ramp), 0)
+    return image
+
+
+def encode_png(image):
+    """PNG bytes of an RGBA image (no filtering, so identical pixels give identical files)."""
+    height, width, _ = image.shape
+    rows = np.hstack([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width * 4)])
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows.tobytes(), 9))
+            + chunk(b'IEND', b''))
+
+
+def tile_path(output_dir, zoom, x, y):
+    """File of a tile in the XYZ layout."""
+    return os.path.join(output_dir, str(zoom), str(x), f'{y}.png')
+
+
+def render_tiles(job):
+    """
+    Redraw a group of tiles of one zoom level (runs in a worker process).
+
+    Tiles no route crosses any more are deleted. Returns (tiles written, tiles deleted).
+    """
+    zoom, tiles, routes, output_dir = job
+    grids = {tile: np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint32) for tile in tiles}
+    for coords in routes:
+        xs, ys = rasterize(coords, zoom)
+        tile_keys = (xs // TILE_SIZE) * (1 << zoom) + ys // TILE_SIZE
+        for key in np.unique(tile_keys).tolist():
+            grid = grids.get((key >> zoom, key & ((1 << zoom) - 1)))
+            if grid is not None:
+                inside = tile_keys == key
+                # Pixels are distinct within a route, so plain fancy-index adds are exact
+                grid[ys[inside] % TILE_SIZE, xs[inside] % TILE_SIZE] += 1
+
+    written = deleted = 0
+    for (x, y), grid in grids.items():
+        file_path = tile_path(output_dir, zoom, x, y)
+        if not grid.any():
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                deleted += 1
+            continue
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_path = f'{file_path}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(encode_png(colorize(grid)))
+        os.replace(temp_path, file_path)
+        written += 1
+    return written, deleted
+
+
+def new_heatmap_store():
+    """Create an empty heatmap store."""
+    return {
+        'version': HEATMAP_VERSION,
+        'max_zoom': MAX_ZOOM,
+        # activity id -> {'hash': polyline hash, 'tiles': ["x/y" at max_zoom]}
+        'routes': {}
+    }
+
+
+def load_heatmap_store(file_path=STORE_FILE):
+    """Load the heatmap store, or return an empty one if missing or outdated."""
+    if not os.path.exists(stored_path(file_path)):
+        return new_heatmap_store()
+
+    try:
+        store = load_json(file_path)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to load {file_path}, rebuilding: {e}")
+        return new_heatmap_store()
+
+    if store.get('version') != HEATMAP_VERSION or store.get('max_zoom') != MAX_ZOOM:
+        return new_heatmap_store()
+    return store
+
+
+def parse_tile(tile):
+    """(x, y) of an "x/y" tile."""
+    x, y = tile.split('/')
+    return int(x), int(y)
+
+
+def tile_bounds(tiles, zoom=MAX_ZOOM):
+    """[west, south, east, north] covered by "x/y" tiles, or None."""
+    if not tiles:
+        return None
+    xs, ys = zip(*(parse_tile(tile) for tile in tiles))
+    n = 1 << zoom
+    west, east = min(xs) / n * 360.0 - 180.0, (max(xs) + 1) / n * 360.0 - 180.0
+    north = float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * min(ys) / n)))))
+    south = float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (max(ys) + 1) / n)))))
+    return [round(west, 6), round(south, 6), round(east, 6), round(north, 6)]
+
+
+def plan_jobs(store, changed_tiles, coords_of, output_dir):
+    """Worker jobs redrawing every tile above the changed max-zoom tiles, at every zoom level."""
+    jobs = []
+    for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+        shift = MAX_ZOOM - zoom
+        # Routes crossing each tile of this zoom level, from the store's max-zoom tiles
+        routes_in = {}
+        for activity_id, route in store['routes'].items():
+            for tile in {(x >> shift, y >> shift) for x, y in map(parse_tile, route['tiles'])}:
+                routes_in.setdefault(tile, []).append(activity_id)
+
+        touched = sorted({(x >> shift, y >> shift) for x, y in changed_tiles})
+        for start in range(0, len(touched), TILES_PER_JOB):
+            tiles = touched[start:start + TILES_PER_JOB]
+            activity_ids = sorted({activity_id for tile in tiles for activity_id in routes_in.get(tile, [])})
+            jobs.append((zoom, tiles, [coords_of(activity_id) for activity_id in activity_ids], output_dir))
+    return jobs
+
+
+def generate_heatmap_tiles(activities, file_path=STORE_FILE, output_dir=OUTPUT_DIR, workers=None):
+    """
+    Redraw the tiles under new, changed and deleted routes and write the tile index.
+
+    workers defaults to HEATMAP_WORKERS or the CPU count. Returns (routes, tiles redrawn).
+    """
+    store = load_heatmap_store(file_path)
+    if not store['routes'] and os.path.isdir(output_dir):
+        # New or outdated store: start from an empty pyramid
+        shutil.rmtree(output_dir)
+
+    polylines = {}
+    for activity in activities:
+        encoded = summary_polyline(activity)
+        if activity.get('id') and encoded:
+            polylines[str(activity['id'])] = activity
+
+    coords_cache = {}
+
+    def coords_of(activity_id):
+        if activity_id not in coords_cache:
+            coords_cache[activity_id] = mercator(get_activity_points(polylines[activity_id]))
+        return coords_cache[activity_id]
+
+    routes = store['routes']
+    changed_tiles = set()
+    for activity_id in list(routes):
+        activity = polylines.get(activity_id)
+        if activity is None or routes[activity_id]['hash'] != route_hash(summary_polyline(activity)):
+            changed_tiles.update(parse_tile(tile) for tile in routes.pop(activity_id)['tiles'])
+
+    for activity_id, activity in polylines.items():
+        if activity_id in routes:
+            continue
+        # Truncated polylines decode to nothing and stay out of the heatmap until fixed
+        coords = coords_of(activity_id)
+        tiles = route_tiles(coords) if len(coords) else []
+        routes[activity_id] = {'hash': route_hash(summary_polyline(activity)), 'tiles': tiles}
+        changed_tiles.update(parse_tile(tile) for tile in tiles)
+
+    jobs = plan_jobs(store, changed_tiles, coords_of, output_dir)
+    workers = workers or int(os.getenv('HEATMAP_WORKERS', '0')) or os.cpu_count() or 1
+    tile_count = sum(len(job[1]) for job in jobs)
+    if tile_count >= MIN_PARALLEL_TILES and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(render_tiles, jobs))
+    else:
+        results = [render_tiles(job) for job in jobs]
+
+    save_store(file_path, store)
+
+    all_tiles = {tile for route in routes.values() for tile in route['tiles']}
+    os.makedirs(output_dir, exist_ok=True)
+    dump_json(os.path.join(output_dir, INDEX_FILE), {
+        'version': HEATMAP_VERSION,
+        'min_zoom': MIN_ZOOM,
+        'max_zoom': MAX_ZOOM,
+        'tile_size': TILE_SIZE,
+        'bounds': tile_bounds(all_tiles),
+        'routes': sum(1 for route in routes.values() if route['tiles'])
+    })
+    return len(routes), sum(written + deleted for written, deleted in results)
+
+
+if __name__ == "__main__":
+    from calculate_stats import load_activities
+    route_count, tile_count = generate_heatmap_tiles(load_activities())
+    print(f"Heatmap of {route_count} routes ({tile_count} tiles redrawn), saved to {OUTPUT_DIR}/")
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Personal-records engine.
+Extracts the fastest 1k, 5k, 10k, half and full marathon efforts from each run, keeps them in
+a persisted index that only processes new activities, and writes per-year and all-time
+leaderboards for the dashboard.
+"""
+
+import bisect
+import os
+from daily_aggregates import RUN_SPORT_TYPES
+from timezone_config import get_derived_fields
+from storage_codec import stored_path
+from serialization import load_json, dump_json, save_store
+
+INDEX_FILE = 'data/personal_records.json'
+OUTPUT_FILE = 'generated/personal_records.json'
+
+# Bump when effort extraction changes so every activity is reprocessed
+INDEX_VERSION = 1
+
+LEADERBOARD_SIZE = 10
+
+# Record key -> (distance in meters, Strava best_efforts name)
+RECORD_DISTANCES = {
+    '1k': (1000, '1K'),
+    '5k': (5000, '5K'),
+    '10k': (10000, '10K'),
+    'half': (21097.5, 'Half-Marathon'),
+    'marathon': (42195, 'Marathon')
+}
+
+
+def new_records_index():
+    """Create an empty records index."""
+    return {
+        'version': INDEX_VERSION,
+        # activity id -> 1 if efforts were extracted from detail data, 0 if it had none yet
+        'processed': {},
+        # record key -> [[seconds, activity id, local date, name, source], ...] sorted by time
+        'efforts': {key: [] for key in RECORD_DISTANCES}
+    }
+
+
+def load_records_index(file_path=INDEX_FILE):
+    """Load the records index, or return an empty one if missing or outdated."""
+    if not os.path.exists(stored_path(file_path)):
+        return new_records_index()
+
+    try:
+        index = load_json(file_path)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to load {file_path}, rebuilding: {e}")
+        return new_records_index()
+
+    if index.get('version') != INDEX_VERSION:
+        return new_records_index()
+    return index
+
+
+def save_records_index(index, file_path=INDEX_FILE):
+    """Save the records index."""
+    save_store(file_path, index)
+
+
+def best_window_time(segments, target_distance):
+    """
+    Find the fastest time over target_distance from consecutive (distance, seconds) segments.
+
+    Uses a two-pointer sliding window, so it is O(n) in the number of segments. Each window
+    is the shortest run of whole segments covering the target, with its time scaled down
+    to exactly the target distance.
+    """
+    best = None
+    window_distance = 0.0
+    window_time = 0.0
+    start = 0
+
+    for distance, seconds in segments:
+        window_distance += distance
+        window_time += seconds
+
+        # Shrink from the left while the window still covers the target
+        while start < len(segments) and window_distance - segments[start][0] >= target_distance:
+            window_distance -= segments[start][0]
+            window_time -= segments[start][1]
+            start += 1
+
+        if window_distance >= target_distance:
+            scaled = window_time * target_distance / window_distance
+            if best is None or scaled < best:
+                best = scaled
+
+    return best
+
+
+def extract_efforts(activity):
+    """
+    Get the best time for each record distance in one activity.
+
+    Returns a dict of record key -> (seconds, source), using Strava's best_efforts where
+    present and a sliding window over splits_metric otherwise.
+    """
+    efforts = {}
+    best_efforts = {effort.get('name'): effort for effort in activity.get('best_efforts') or []}
+    splits = [
+        (split['distance'], split.get('elapsed_time') or split.get('moving_time') or 0)
+        for split in activity.get('splits_metric') or []
+        if split.get('distance')
+    ]
+
+    for key, (target_distance, effort_name) in RECORD_DISTANCES.items():
+        if (activity.get('distance') or 0) < target_distance:
+            continue
+
+        effort = best_efforts.get(effort_name)
+        if effort and effort.get('elapsed_time'):
+            efforts[key] = (effort['elapsed_time'], 'best_efforts')
+            continue
+
+        seconds = best_window_time(splits, target_distance)
+        if seconds:
+            efforts[key] = (round(seconds), 'splits')
+
+    return efforts
+
+
+def update_records_index(index, activities):
+    """
+    Add efforts from activities not yet in the index and drop those of deleted activities.
+
+    Activities processed before their detail data arrived are retried. Returns the number of
+    activities processed or dropped.
+    """
+    processed = index['processed']
+    current_ids = set()
+    count = 0
+
+    for activity in activities:
+        activity_id = activity.get('id')
+        if not activity_id or (activity.get('sport_type') or activity.get('type')) not in RUN_SPORT_TYPES:
+            continue
+        key = str(activity_id)
+        current_ids.add(key)
+
+        # Checked before the detail fields, which live in cold storage
+        if processed.get(key) == 1:
+            continue
+        has_details = bool(activity.get('best_efforts') or activity.get('splits_metric'))
+        if key in processed and not has_details:
+            continue
+
+        local_date = get_derived_fields(activity).get('local_date', '')
+        for record_key, (seconds, source) in extract_efforts(activity).items():
+            bisect.insort(index['efforts'][record_key], [seconds, activity_id, local_date, activity.get('name', ''), source])
+        processed[key] = 1 if has_details else 0
+        count += 1
+
+    # Forget activities that are no longer stored
+    removed = {key for key in processed if key not in current_ids}
+    if removed:
+        for key in removed:
+            del processed[key]
+        for record_key, efforts in index['efforts'].items():
+            index['efforts'][record_key] = [effort for effort in efforts if str(effort[1]) not in removed]
+        count += len(removed)
+
+    return count
+
+
+def format_effort(effort, target_distance):
+    """Format an index entry for the leaderboard output."""
+    from calculate_stats import format_pace, format_time
+
+    seconds, activity_id, local_date, name, source = effort
+    return {
+        'id': activity_id,
+        'date': local_date,
+        'name': name,
+        'time': format_time(seconds),
+        'seconds': seconds,
+        'pace': format_pace(seconds / (target_distance / 1000)),
+        'source': source
+    }
+
+
+def build_leaderboards(index, size=LEADERBOARD_SIZE):
+    """Build all-time and per-year leaderboards for every record distance."""
+    leaderboards = {'all': {}}
+    for record_key, efforts in index['efforts'].items():
+        target_distance = RECORD_DISTANCES[record_key][0]
+        leaderboards['all'][record_key] = [format_effort(effort, target_distance) for effort in efforts[:size]]
+
+        # Efforts are sorted by time, so each year's list fills in order
+        for effort in efforts:
+            year_boards = leaderboards.setdefault(effort[2][:4], {})
+            year_board = year_boards.setdefault(record_key, [])
+            if len(year_board) < size:
+                year_board.append(format_effort(effort, target_distance))
+
+    return leaderboards
+
+
+def generate_personal_records(activities, index_file=INDEX_FILE, output_file=OUTPUT_FILE):
+    """Update the persisted index with new activities and write the leaderboards."""
+    index = load_records_index(index_file)
+    count = update_records_index(index, activities)
+    if count:
+        save_records_index(index, index_file)
+
+    dump_json(output_file, build_leaderboards(index))
+    return count
+
+
+if __name__ == "__main__":
+    from calculate_stats import load_activities
+    count = generate_personal_records(load_activities())
+    print(f"Processed {count} new activities, leaderboards saved to {OUTPUT_FILE}")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Index and output stages run by calculate_stats.py after the yearly stats.
+Each stage takes the activity models and returns its count (or a tuple of counts), which
+is formatted into the stage's progress message.
+"""
+
+from personal_records import generate_personal_records
+from split_analytics import generate_split_analytics
+from segment_index import generate_segment_index
+from search_index import generate_search_index
+from spatial_index import generate_spatial_index
+from route_clusters import generate_route_clusters
+from route_thumbnails import generate_route_thumbnails
+from heatmap_tiles import generate_heatmap_tiles
+
+STAGES = [
+    # Update the personal-records index with new activities and write leaderboards
+    (generate_personal_records,
+     "Personal records updated from {} activities, saved to generated/personal_records.json"),
+    # Split-level pace, zone and grade-adjusted pace analytics
+    (generate_split_analytics,
+     "Analyzed {} splits, saved to generated/split_analytics.json"),
+    # Segment-effort leaderboards
+    (generate_segment_index,
+     "Updated {} segments, saved to generated/segments/"),
+    # Inverted index for the activity search box
+    (generate_search_index,
+     "Indexed {} search terms, saved to generated/search_index.json"),
+    # Route bounding-box grid for viewport queries on the map
+    (generate_spatial_index,
+     "Indexed {} routes, saved to generated/spatial_index.json"),
+    # Repeated-route clusters so the map draws each loop once
+    (generate_route_clusters,
+     "Grouped routes into {} clusters, saved to generated/route_clusters.json"),
+    # Static route images for the activity list and details panel
+    (generate_route_thumbnails,
+     "{} route thumbnails ({} new), saved to generated/thumbnails/"),
+    # Density heatmap tiles of every route, redrawn only where routes changed
+    (generate_heatmap_tiles,
+     "Heatmap of {} routes ({} tiles redrawn), saved to generated/heatmap/"),
+]
+
+def run_stages(activities):
+    """Run every stage over the activities and print its progress message."""
+    for stage, message in STAGES:
+        result = stage(activities)
+        counts = result if isinstance(result, tuple) else (result,)
+        print(message.format(*counts))
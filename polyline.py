@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Encoded polyline helpers.
+Decodes Strava's map.summary_polyline (Google encoded polyline format) for the Python
+pipeline, mirroring decodePolyline in script.js, and encodes routes of imported files.
+"""
+
+import hashlib
+
+
+def decode_polyline(encoded, precision=5):
+    """Decode an encoded polyline into a list of (lat, lng) tuples."""
+    coordinates = []
+    factor = 10 ** precision
+    index = 0
+    lat = 0
+    lng = 0
+    length = len(encoded or '')
+
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            result = 0
+            shift = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+
+        lat += deltas[0]
+        lng += deltas[1]
+        coordinates.append((lat / factor, lng / factor))
+
+    return coordinates
+
+
+def encode_polyline(points, precision=5):
+    """Encode (lat, lng) points as a polyline (the inverse of decode_polyline)."""
+    factor = 10 ** precision
+    chunks = []
+    last_lat = 0
+    last_lng = 0
+
+    for lat, lng in points:
+        lat = round(lat * factor)
+        lng = round(lng * factor)
+        for delta in (lat - last_lat, lng - last_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        last_lat = lat
+        last_lng = lng
+
+    return ''.join(chunks)
+
+
+def summary_polyline(activity):
+    """Encoded route of an activity (raw dict or Activity model), or None."""
+    if hasattr(activity, 'summary_polyline'):
+        # Activity models keep it in a slot; going through get('map') would decode the cold part
+        return activity.summary_polyline
+    return (activity.get('map') or {}).get('summary_polyline')
+
+
+def route_hash(encoded):
+    """Short hash of a polyline, to notice edited routes."""
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+def get_activity_points(activity):
+    """Decoded route points of an activity, or [] if it has no polyline."""
+    encoded = summary_polyline(activity)
+    if not encoded:
+        return []
+    try:
+        return decode_polyline(encoded)
+    except IndexError:
+        # Truncated polyline
+        return []
+
+
+def bounding_box(points):
+    """[west, south, east, north] of (lat, lng) points, or None if empty."""
+    if not points:
+        return None
+    lats = [lat for lat, _ in points]
+    lngs = [lng for _, lng in points]
+    return [min(lngs), min(lats), max(lngs), max(lats)]
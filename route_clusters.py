@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Repeated-route detection.
+Groups near-identical routes into clusters so the overview map can draw each loop once.
+Routes are resampled to a fixed number of points, matched to candidate clusters by a
+coarse length/centroid signature and verified with the discrete Fréchet distance. New
+activities are matched against the persisted clusters instead of reclustering everything.
+"""
+
+import math
+import os
+from polyline import get_activity_points, summary_polyline, route_hash
+from storage_codec import stored_path
+from serialization import load_json, dump_json, save_store
+
+CLUSTERS_FILE = 'data/route_clusters.json'
+OUTPUT_FILE = 'generated/route_clusters.json'
+
+# Bump when normalization or matching changes so every route is reclustered
+CLUSTERS_VERSION = 2
+
+# Points per normalized route
+RESAMPLE_POINTS = 32
+
+# Two routes match when their Fréchet distance is below this (meters)
+MATCH_DISTANCE = 150
+
+# Signature grid: routes within 10% length and ~1 km centroid land in neighbouring keys
+LENGTH_TOLERANCE = 0.1
+CENTROID_CELL = 0.01
+
+# Routes shorter than this (treadmill stubs, GPS glitches) are not clustered
+MIN_ROUTE_LENGTH = 200
+
+METERS_PER_DEGREE = 111320
+
+
+def local_distance(a, b, lng_scale):
+    """Distance in meters between two (lat, lng) points, equirectangular approximation."""
+    dy = (a[0] - b[0]) * METERS_PER_DEGREE
+    dx = (a[1] - b[1]) * METERS_PER_DEGREE * lng_scale
+    return math.hypot(dx, dy)
+
+
+def resample_route(points, count=RESAMPLE_POINTS):
+    """
+    Resample a route to count points evenly spaced along its length.
+
+    Returns (points, length in meters), or (None, 0) for routes too short to compare.
+    """
+    if len(points) < 2:
+        return None, 0
+
+    lng_scale = math.cos(math.radians(points[0][0]))
+    cumulative = [0.0]
+    for previous, current in zip(points, points[1:]):
+        cumulative.append(cumulative[-1] + local_distance(previous, current, lng_scale))
+    length = cumulative[-1]
+    if length < MIN_ROUTE_LENGTH:
+        return None, 0
+
+    resampled = []
+    segment = 0
+    for i in range(count):
+        target = length * i / (count - 1)
+        while segment < len(points) - 2 and cumulative[segment + 1] < target:
+            segment += 1
+        span = cumulative[segment + 1] - cumulative[segment]
+        t = (target - cumulative[segment]) / span if span else 0.0
+        a, b = points[segment], points[segment + 1]
+        resampled.append([
+            round(a[0] + (b[0] - a[0]) * t, 5),
+            round(a[1] + (b[1] - a[1]) * t, 5)
+        ])
+    return resampled, length
+
+
+def frechet_distance(a, b):
+    """Discrete Fréchet distance in meters between two resampled routes."""
+    lng_scale = math.cos(math.radians(a[0][0]))
+    previous = []
+    for i, point_a in enumerate(a):
+        current = []
+        for j, point_b in enumerate(b):
+            d = local_distance(point_a, point_b, lng_scale)
+            if i == 0 and j == 0:
+                current.append(d)
+            elif i == 0:
+                current.append(max(current[j - 1], d))
+            elif j == 0:
+                current.append(max(previous[0], d))
+            else:
+                current.append(max(min(previous[j], previous[j - 1], current[j - 1]), d))
+        previous = current
+    return previous[-1]
+
+
+def route_signature(points, length):
+    """Coarse (length bucket, centroid cell) key used to find candidate clusters."""
+    lat = sum(point[0] for point in points) / len(points)
+    lng = sum(point[1] for point in points) / len(points)
+    return (
+        int(math.log(length) / math.log(1 + LENGTH_TOLERANCE)),
+        int(math.floor(lat / CENTROID_CELL)),
+        int(math.floor(lng / CENTROID_CELL))
+    )
+
+
+def new_route_clusters():
+    """Create an empty cluster store."""
+    return {
+        'version': CLUSTERS_VERSION,
+        # activity id -> cluster id, or 0 for activities with no usable route
+        'processed': {},
+        # activity id -> route_hash of the polyline it was clustered with
+        'hashes': {},
+        # cluster id -> {'representative', 'points', 'length', 'signature', 'members'}
+        'clusters': {},
+        'next_id': 1
+    }
+
+
+def load_route_clusters(file_path=CLUSTERS_FILE):
+    """Load the cluster store, or return an empty one if missing or outdated."""
+    if not os.path.exists(stored_path(file_path)):
+        return new_route_clusters()
+
+    try:
+        store = load_json(file_path)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to load {file_path}, rebuilding: {e}")
+        return new_route_clusters()
+
+    if store.get('version') != CLUSTERS_VERSION:
+        return new_route_clusters()
+    return store
+
+
+def save_route_clusters(store, file_path=CLUSTERS_FILE):
+    """Save the cluster store."""
+    save_store(file_path, store)
+
+
+def build_signature_table(clusters):
+    """Signature -> cluster ids, rebuilt from the store on every update."""
+    table = {}
+    for cluster_id, cluster in clusters.items():
+        table.setdefault(tuple(cluster['signature']), []).append(cluster_id)
+    return table
+
+
+def find_cluster(table, clusters, points, signature):
+    """Id of the closest matching cluster among the neighbouring signatures, or None."""
+    length_bucket, lat_cell, lng_cell = signature
+    best_id = None
+    best_distance = None
+    for db in (-1, 0, 1):
+        for dlat in (-1, 0, 1):
+            for dlng in (-1, 0, 1):
+                for cluster_id in table.get((length_bucket + db, lat_cell + dlat, lng_cell + dlng), []):
+                    representative = clusters[cluster_id]['points']
+                    distance = min(frechet_distance(points, representative), frechet_distance(points, representative[::-1]))
+                    if distance <= MATCH_DISTANCE and (best_distance is None or distance < best_distance):
+                        best_id = cluster_id
+                        best_distance = distance
+    return best_id
+
+
+def remove_member(store, by_id, key):
+    """Take a processed activity out of its cluster, promoting a new representative if needed."""
+    clusters = store['clusters']
+    processed = store['processed']
+    cluster_id = str(processed.pop(key))
+    store['hashes'].pop(key, None)
+    cluster = clusters.get(cluster_id)
+    if not cluster:
+        return
+    cluster['members'] = [member for member in cluster['members'] if str(member) != key]
+    if not cluster['members']:
+        del clusters[cluster_id]
+    elif str(cluster['representative']) == key:
+        # Promote the first remaining member with a usable route; its own geometry and
+        # signature become the reference
+        for member in cluster['members']:
+            representative = by_id.get(str(member))
+            if representative is None:
+                continue
+            points, length = resample_route(get_activity_points(representative))
+            if points is not None:
+                cluster.update(representative=representative['id'], points=points, length=round(length),
+                               signature=list(route_signature(points, length)))
+                break
+        else:
+            # No member has a usable route left
+            for member in cluster['members']:
+                if str(member) in processed:
+                    processed[str(member)] = 0
+            del clusters[cluster_id]
+
+
+def update_route_clusters(store, activities):
+    """
+    Assign new and edited routes to clusters and drop deleted activities.
+
+    Returns the number of activities processed.
+    """
+    processed = store['processed']
+    hashes = store['hashes']
+    clusters = store['clusters']
+    by_id = {str(activity['id']): activity for activity in activities if activity.get('id')}
+    count = 0
+
+    # Forget activities that are no longer stored, and those whose route was edited since
+    # they were clustered (they are matched again below)
+    for key in list(processed):
+        activity = by_id.get(key)
+        if activity is None or hashes.get(key) != route_hash(summary_polyline(activity) or ''):
+            remove_member(store, by_id, key)
+            count += 1
+
+    table = build_signature_table(clusters)
+    for key, activity in by_id.items():
+        # Activities without a polyline yet are picked up once one arrives
+        encoded = summary_polyline(activity)
+        if key in processed or not encoded:
+            continue
+
+        count += 1
+        hashes[key] = route_hash(encoded)
+        points, length = resample_route(get_activity_points(activity))
+        if points is None:
+            processed[key] = 0
+            continue
+
+        signature = route_signature(points, length)
+        cluster_id = find_cluster(table, clusters, points, signature)
+        if cluster_id is None:
+            cluster_id = str(store['next_id'])
+            store['next_id'] += 1
+            clusters[cluster_id] = {
+                'representative': activity['id'],
+                'points': points,
+                'length': round(length),
+                'signature': list(signature),
+                'members': []
+            }
+            table.setdefault(signature, []).append(cluster_id)
+
+        clusters[cluster_id]['members'].append(activity['id'])
+        processed[key] = int(cluster_id)
+
+    return count
+
+
+def build_cluster_output(store, activities):
+    """Clusters with a representative polyline, most repeated first."""
+    by_id = {activity['id']: activity for activity in activities if activity.get('id')}
+    output = []
+    for cluster_id, cluster in store['clusters'].items():
+        representative = by_id.get(cluster['representative'], {})
+        output.append({
+            'id': int(cluster_id),
+            'count': len(cluster['members']),
+            'distance': round(cluster['length'] / 1000, 2),
+            'sport_type': representative.get('sport_type') or representative.get('type'),
+            'representative': cluster['representative'],
+            'polyline': summary_polyline(representative),
+            'members': cluster['members']
+        })
+    output.sort(key=lambda cluster: (-cluster['count'], cluster['id']))
+    return {'clusters': output}
+
+
+def generate_route_clusters(activities, clusters_file=CLUSTERS_FILE, output_file=OUTPUT_FILE):
+    """Update the persisted clusters with new routes and write the cluster list."""
+    store = load_route_clusters(clusters_file)
+    count = update_route_clusters(store, activities)
+    if count:
+        save_route_clusters(store, clusters_file)
+
+    dump_json(output_file, build_cluster_output(store, activities))
+    return len(store['clusters'])
+
+
+if __name__ == "__main__":
+    from calculate_stats import load_activities
+    cluster_count = generate_route_clusters(load_activities())
+    print(f"Grouped routes into {cluster_count} clusters, saved to {OUTPUT_FILE}")
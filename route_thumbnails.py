@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Static route thumbnails.
+Decodes each activity's summary polyline, projects it to Web Mercator and renders a small SVG
+of the route, so the activity list and details panel show plain images instead of creating a
+Mapbox map per activity. Thumbnails are named by a hash of the polyline, so a route is only
+rendered once, and new ones are rendered in parallel across CPU cores.
+"""
+
+import hashlib
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from polyline import decode_polyline, summary_polyline
+from svg_writer import SvgWriter, numbers
+from serialization import dump_json
+
+OUTPUT_DIR = 'generated/thumbnails'
+INDEX_FILE = 'index.json'
+
+# Part of every thumbnail hash: bump when the drawing changes so all thumbnails are redrawn
+THUMBNAIL_VERSION = 1
+
+WIDTH = 320
+HEIGHT = 240
+PADDING = 20
+
+# Consecutive points closer than this (in thumbnail pixels) are dropped
+MIN_SEGMENT = 0.75
+
+# Below this many new thumbnails, rendering in-process beats starting worker processes
+MIN_PARALLEL_JOBS = 32
+
+
+def thumbnail_key(encoded):
+    """File name stem of a polyline's thumbnail."""
+    return hashlib.sha1(f'{THUMBNAIL_VERSION}:{encoded}'.encode('utf-8')).hexdigest()[:16]
+
+
+def project(lat, lng):
+    """Web Mercator position of a point (x grows east, y grows south), in radians."""
+    lat = min(max(lat, -85.05112878), 85.05112878)
+    return math.radians(lng), -math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+
+def fit_points(points, width=WIDTH, height=HEIGHT, padding=PADDING):
+    """Project (lat, lng) points and scale them to fill the thumbnail, centered."""
+    projected = [project(lat, lng) for lat, lng in points]
+    xs = [x for x, _ in projected]
+    ys = [y for _, y in projected]
+    span_x = max(xs) - min(xs)
+    span_y = max(ys) - min(ys)
+    scale = min((width - 2 * padding) / span_x if span_x else math.inf,
+                (height - 2 * padding) / span_y if span_y else math.inf)
+    if scale == math.inf:
+        scale = 0
+    offset_x = (width - span_x * scale) / 2 - min(xs) * scale
+    offset_y = (height - span_y * scale) / 2 - min(ys) * scale
+    return [(x * scale + offset_x, y * scale + offset_y) for x, y in projected]
+
+
+def route_path(pixels):
+    """Path data through the points, as relative moves, skipping sub-pixel steps."""
+    start_x, start_y = pixels[0]
+    last_x, last_y = start_x, start_y
+    steps = []
+    for x, y in pixels[1:]:
+        if abs(x - last_x) < MIN_SEGMENT and abs(y - last_y) < MIN_SEGMENT:
+            continue
+        # Steps are rounded, so follow the rounded position to keep the path from drifting
+        dx = round(x - last_x, 1)
+        dy = round(y - last_y, 1)
+        steps += [dx, dy]
+        last_x += dx
+        last_y += dy
+    return f'M{numbers(start_x, start_y)}l{numbers(*(steps or [0, 0]))}'
+
+
+def render_thumbnail(encoded):
+    """SVG text of a route thumbnail, or None if the polyline has fewer than two points."""
+    try:
+        points = decode_polyline(encoded)
+    except IndexError:
+        return None
+    if len(points) < 2:
+        return None
+
+    svg = SvgWriter(WIDTH, HEIGHT, f'0 0 {WIDTH} {HEIGHT}', compact=True)
+    svg.rule('use', 'fill:none;stroke-linecap:round;stroke-linejoin:round')
+    svg.add(svg.element('rect', [('width', WIDTH), ('height', HEIGHT), ('class', svg.fill_class('#21262d'))]))
+    svg.define(svg.element('path', [('id', 'r'), ('d', route_path(fit_points(points)))]))
+
+    # Same three strokes as the details-panel route layers: dark casing, route, highlight
+    for stroke in ('stroke:#1a1a1a;stroke-width:6;stroke-opacity:.8', 'stroke:#ffb700;stroke-width:4',
+                   'stroke:#ffd700;stroke-width:2;stroke-opacity:.9'):
+        svg.add(svg.use('r', None, None, svg.css_class(stroke)))
+    return svg.render(minify=True)
+
+
+def write_thumbnail(job):
+    """Render one thumbnail to its file (runs in a worker process). Returns the key, or None."""
+    key, encoded, output_dir = job
+    content = render_thumbnail(encoded)
+    if content is None:
+        return None
+    file_path = os.path.join(output_dir, f'{key}.svg')
+    temp_path = f'{file_path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(temp_path, file_path)
+    return key
+
+
+def generate_route_thumbnails(activities, output_dir=OUTPUT_DIR, workers=None):
+    """
+    Render thumbnails for routes not drawn yet, drop unused ones and write the id -> key index.
+
+    workers defaults to THUMBNAIL_WORKERS or the CPU count. Returns (thumbnails, newly rendered).
+    """
+    polylines = {}
+    for activity in activities:
+        encoded = summary_polyline(activity)
+        if activity.get('id') and encoded:
+            polylines[str(activity['id'])] = encoded
+
+    os.makedirs(output_dir, exist_ok=True)
+    existing = {name[:-len('.svg')] for name in os.listdir(output_dir) if name.endswith('.svg')}
+    keys = {activity_id: thumbnail_key(encoded) for activity_id, encoded in polylines.items()}
+
+    jobs = {}
+    for activity_id, key in keys.items():
+        if key not in existing and key not in jobs:
+            jobs[key] = (key, polylines[activity_id], output_dir)
+
+    workers = workers or int(os.getenv('THUMBNAIL_WORKERS', '0')) or os.cpu_count() or 1
+    if len(jobs) >= MIN_PARALLEL_JOBS and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rendered = list(pool.map(write_thumbnail, jobs.values(), chunksize=16))
+    else:
+        rendered = [write_thumbnail(job) for job in jobs.values()]
+
+    # Routes that could not be drawn get no entry; the page falls back to the live map
+    drawn = existing | {key for key in rendered if key}
+    index = {activity_id: key for activity_id, key in keys.items() if key in drawn}
+
+    for key in existing - set(index.values()):
+        os.remove(os.path.join(output_dir, f'{key}.svg'))
+
+    dump_json(os.path.join(output_dir, INDEX_FILE), index)
+    return len(index), sum(1 for key in rendered if key)
+
+
+if __name__ == "__main__":
+    from calculate_stats import load_activities
+    thumbnail_count, rendered_count = generate_route_thumbnails(load_activities())
+    print(f"{thumbnail_count} route thumbnails ({rendered_count} new), saved to {OUTPUT_DIR}/")
@@ -1,6 +1,16 @@
 // Global variables
 let activitiesData = [];
 let statsData = {};
+let yearComparisonData = null;
+let searchIndex = null;
+let searchQuery = '';
+let spatialIndex = null;
+let drawnRouteIds = new Set();
+let showingAllRoutes = false;
+let routeClusterOf = new Map();
+let drawnClusterIds = new Set();
+let routeThumbnails = {};
+let heatmapIndex = null;
 let map;
 let thumbnailMap;
 let currentYear = new Date().getFullYear();
@@ -43,6 +53,12 @@ function parseLocalDateTime(dateString) {
 document.addEventListener('DOMContentLoaded', async function() {
     await loadActivitiesData();
     await loadStatsData();
+    await loadYearComparisonData();
+    await loadSearchIndex();
+    await loadSpatialIndex();
+    await loadRouteClusters();
+    await loadRouteThumbnails();
+    await loadHeatmapIndex();
     generateNavigationLinks();
     
     // Get initial year from year selector
@@ -83,15 +99,33 @@ function generateNavigationLinks() {
     });
 }
 
-// Load activities data
+// Load activities data (stored gzip-compressed, with the plain file as a fallback)
 async function loadActivitiesData() {
     try {
-        const response = await fetch('./data/activities.json');
-        activitiesData = await response.json();
-        console.log('Loaded activities:', activitiesData.length);
+        activitiesData = await fetchCompressedJson('./data/activities.json.gz');
     } catch (error) {
-        console.error('Error loading activities data:', error);
+        try {
+            const response = await fetch('./data/activities.json');
+            activitiesData = await response.json();
+        } catch (fallbackError) {
+            console.error('Error loading activities data:', error, fallbackError);
+            return;
+        }
+    }
+    console.log('Loaded activities:', activitiesData.length);
+}
+
+// Fetch and parse a .gz JSON file in the browser
+async function fetchCompressedJson(url) {
+    if (typeof DecompressionStream === 'undefined') {
+        throw new Error('DecompressionStream is not supported');
+    }
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status} for ${url}`);
     }
+    const stream = response.body.pipeThrough(new DecompressionStream('gzip'));
+    return new Response(stream).json();
 }
 
 // Load pre-calculated stats data
@@ -106,6 +140,18 @@ async function loadStatsData() {
     }
 }
 
+// Load pre-computed year-over-year comparison data
+async function loadYearComparisonData() {
+    try {
+        const response = await fetch('./generated/year_comparison.json');
+        yearComparisonData = await response.json();
+        console.log('Loaded year comparison for years:', yearComparisonData.years);
+    } catch (error) {
+        console.error('Error loading year comparison data:', error);
+        yearComparisonData = null;
+    }
+}
+
 // Initialize Mapbox map
 function initializeMap() {
     // Get Mapbox token from config
@@ -129,12 +175,179 @@ function initializeMap() {
     });
     
     map.on('load', function() {
+        addHeatmapLayer();
         displayAllRoutes();
     });
+    
+    // Draw routes that come into view as the user pans or zooms
+    map.on('moveend', function() {
+        if (showingAllRoutes && spatialIndex) {
+            drawRoutesInBounds(map.getBounds());
+        }
+    });
+}
+
+// Load the route bounding-box grid used for viewport queries
+async function loadSpatialIndex() {
+    try {
+        const response = await fetch('./generated/spatial_index.json');
+        const index = await response.json();
+        if (index.version !== 1) return;
+        spatialIndex = index;
+        console.log('Loaded spatial index with', index.ids.length, 'routes');
+    } catch (error) {
+        console.error('Error loading spatial index:', error);
+    }
+}
+
+// Load the description of the prerendered density heatmap tiles
+async function loadHeatmapIndex() {
+    try {
+        const response = await fetch('./generated/heatmap/index.json');
+        const index = await response.json();
+        if (index.version !== 1 || !index.bounds) return;
+        heatmapIndex = index;
+        console.log('Loaded heatmap of', index.routes, 'routes');
+    } catch (error) {
+        console.error('Error loading heatmap index:', error);
+    }
+}
+
+// Add the density heatmap as a hidden raster layer (toggled with the heatmap button)
+function addHeatmapLayer() {
+    if (!heatmapIndex) return;
+    // Tile URLs must be absolute; new URL() would escape the {z}/{x}/{y} placeholders
+    const baseUrl = window.location.href.split(/[?#]/)[0].replace(/[^/]*$/, '');
+    map.addSource('heatmap-tiles', {
+        type: 'raster',
+        tiles: [baseUrl + 'generated/heatmap/{z}/{x}/{y}.png'],
+        tileSize: heatmapIndex.tile_size,
+        minzoom: heatmapIndex.min_zoom,
+        maxzoom: heatmapIndex.max_zoom,
+        bounds: heatmapIndex.bounds
+    });
+    map.addLayer({
+        id: 'heatmap-layer',
+        type: 'raster',
+        source: 'heatmap-tiles',
+        layout: { visibility: 'none' },
+        paint: { 'raster-opacity': 0.9 }
+    });
+}
+
+// Show or hide the density heatmap
+function toggleHeatmap() {
+    if (!map || !map.getLayer('heatmap-layer')) return;
+    const visible = map.getLayoutProperty('heatmap-layer', 'visibility') === 'visible';
+    map.setLayoutProperty('heatmap-layer', 'visibility', visible ? 'none' : 'visible');
+    document.getElementById('heatmap-btn').classList.toggle('active', !visible);
+}
+
+// Load repeated-route clusters (activity id -> cluster id)
+async function loadRouteClusters() {
+    try {
+        const response = await fetch('./generated/route_clusters.json');
+        const data = await response.json();
+        data.clusters.forEach(cluster => {
+            cluster.members.forEach(id => routeClusterOf.set(id, cluster.id));
+        });
+        console.log('Loaded', data.clusters.length, 'route clusters');
+    } catch (error) {
+        console.error('Error loading route clusters:', error);
+    }
+}
+
+// Load the index of prerendered route thumbnails (activity id -> file stem)
+async function loadRouteThumbnails() {
+    try {
+        const response = await fetch('./generated/thumbnails/index.json');
+        routeThumbnails = await response.json();
+        console.log('Loaded', Object.keys(routeThumbnails).length, 'route thumbnails');
+    } catch (error) {
+        console.error('Error loading route thumbnails:', error);
+    }
+}
+
+// URL of an activity's route thumbnail, or null if none was rendered
+function routeThumbnailUrl(activity) {
+    const key = routeThumbnails[activity.id];
+    return key ? `./generated/thumbnails/${key}.svg` : null;
+}
+
+// Count how often each cluster occurs among the given activities
+function countRouteClusters(activities) {
+    const counts = new Map();
+    activities.forEach(activity => {
+        const clusterId = routeClusterOf.get(activity.id);
+        if (clusterId !== undefined) {
+            counts.set(clusterId, (counts.get(clusterId) || 0) + 1);
+        }
+    });
+    return counts;
+}
+
+// Line width grows with how often a route was repeated
+function routeLineWidth(activity, clusterCounts) {
+    const count = clusterCounts.get(routeClusterOf.get(activity.id)) || 1;
+    return 2 + Math.min(Math.log2(count), 3);
+}
+
+// True if another activity on the same route is already drawn; otherwise claims the route
+function isRepeatedRoute(activity) {
+    const clusterId = routeClusterOf.get(activity.id);
+    if (clusterId === undefined) return false;
+    if (drawnClusterIds.has(clusterId)) return true;
+    drawnClusterIds.add(clusterId);
+    return false;
+}
+
+// Web Mercator tile column/row at the index grid zoom
+function spatialTileX(lng, zoom) {
+    const n = Math.pow(2, zoom);
+    return Math.min(Math.max(Math.floor((lng + 180) / 360 * n), 0), n - 1);
+}
+
+function spatialTileY(lat, zoom) {
+    const n = Math.pow(2, zoom);
+    const rad = Math.min(Math.max(lat, -85.05112878), 85.05112878) * Math.PI / 180;
+    const y = (1 - Math.log(Math.tan(rad) + 1 / Math.cos(rad)) / Math.PI) / 2 * n;
+    return Math.min(Math.max(Math.floor(y), 0), n - 1);
+}
+
+// Ids of indexed routes whose bounding box intersects [west, south, east, north]
+function queryRouteIds(west, south, east, north) {
+    const zoom = spatialIndex.zoom;
+    const x0 = spatialTileX(west, zoom), x1 = spatialTileX(east, zoom);
+    const y0 = spatialTileY(north, zoom), y1 = spatialTileY(south, zoom);
+    const candidates = new Set(spatialIndex.large);
+    
+    if ((x1 - x0 + 1) * (y1 - y0 + 1) > 1024) {
+        // Zoomed far out: checking every box is cheaper than walking the cells
+        spatialIndex.ids.forEach((id, doc) => candidates.add(doc));
+    } else {
+        for (let x = x0; x <= x1; x++) {
+            for (let y = y0; y <= y1; y++) {
+                (spatialIndex.cells[`${x}/${y}`] || []).forEach(doc => candidates.add(doc));
+            }
+        }
+    }
+    
+    const ids = new Set();
+    candidates.forEach(doc => {
+        const [w, s, e, n] = spatialIndex.bboxes[doc];
+        if (w <= east && e >= west && s <= north && n >= south) {
+            ids.add(spatialIndex.ids[doc]);
+        }
+    });
+    return ids;
 }
 
 // Calculate map center from activities
 function calculateMapCenter() {
+    if (spatialIndex && spatialIndex.center) {
+        return spatialIndex.center;
+    }
+    
     const validActivities = activitiesData.filter(activity => 
         activity.start_latlng && activity.start_latlng.length === 2
     );
@@ -169,74 +382,69 @@ function displayAllRoutes() {
     
     // Clear existing routes first
     clearMapRoutes();
-    
-    const bounds = new mapboxgl.LngLatBounds();
-    let hasCoordinates = false;
-    
-    filteredActivities.forEach((activity, index) => {
-        if (activity.map && activity.map.summary_polyline) {
-            const polyline = activity.map.summary_polyline;
-            const coordinates = decodePolyline(polyline);
-            
-            if (coordinates.length > 0) {
-                const sourceId = `route-${index}`;
-                const layerId = `route-layer-${index}`;
-                
-                map.addSource(sourceId, {
-                    type: 'geojson',
-                    data: {
-                        type: 'Feature',
-                        properties: {
-                            activity: activity
-                        },
-                        geometry: {
-                            type: 'LineString',
-                            coordinates: coordinates
-                        }
-                    }
-                });
-                
-                map.addLayer({
-                    id: layerId,
-                    type: 'line',
-                    source: sourceId,
-                    layout: {
-                        'line-join': 'round',
-                        'line-cap': 'round'
-                    },
-                    paint: {
-                        'line-color': getActivityColor(activity),
-                        'line-width': 2,
-                        'line-opacity': 0.7
-                    }
-                });
-                
+    drawnRouteIds = new Set();
+    drawnClusterIds = new Set();
+    showingAllRoutes = true;
+    
+    let boundsToUse;
+    let hasCoordinatesToUse;
+    
+    if (spatialIndex) {
+        // Bounds come from the precomputed boxes, so no polyline is decoded just to fit the map
+        boundsToUse = new mapboxgl.LngLatBounds();
+        if (spatialIndex.recent_bounds) {
+            const [w, s, e, n] = spatialIndex.recent_bounds;
+            boundsToUse.extend([[w, s], [e, n]]);
+        } else {
+            const visibleIds = new Set(filteredActivities.map(activity => activity.id));
+            spatialIndex.ids.forEach((id, doc) => {
+                if (visibleIds.has(id)) {
+                    const [w, s, e, n] = spatialIndex.bboxes[doc];
+                    boundsToUse.extend([[w, s], [e, n]]);
+                }
+            });
+        }
+        hasCoordinatesToUse = !boundsToUse.isEmpty();
+        
+        // Draw what will be on screen after the fit; moveend adds the rest while panning
+        if (hasCoordinatesToUse) {
+            drawRoutesInBounds(boundsToUse);
+        }
+    } else {
+        const bounds = new mapboxgl.LngLatBounds();
+        let hasCoordinates = false;
+        const clusterCounts = countRouteClusters(filteredActivities);
+        
+        filteredActivities.forEach(activity => {
+            if (isRepeatedRoute(activity)) return;
+            const coordinates = addRouteLayer(activity, routeLineWidth(activity, clusterCounts));
+            if (coordinates) {
                 // Extend bounds to include this route
                 coordinates.forEach(coord => bounds.extend(coord));
                 hasCoordinates = true;
             }
-        }
-    });
-    
-    // Use recent activities to calculate better bounds for map fitting
-    const recentActivities = getRecentActivitiesForBounds();
-    const recentBounds = new mapboxgl.LngLatBounds();
-    let hasRecentCoordinates = false;
-    
-    // Calculate bounds based on recent activities for better zoom
-    recentActivities.forEach(activity => {
-        if (activity.map && activity.map.summary_polyline) {
-            const coordinates = decodePolyline(activity.map.summary_polyline);
-            if (coordinates.length > 0) {
-                coordinates.forEach(coord => recentBounds.extend(coord));
-                hasRecentCoordinates = true;
+        });
+        
+        // Use recent activities to calculate better bounds for map fitting
+        const recentActivities = getRecentActivitiesForBounds();
+        const recentBounds = new mapboxgl.LngLatBounds();
+        let hasRecentCoordinates = false;
+        
+        // Calculate bounds based on recent activities for better zoom
+        recentActivities.forEach(activity => {
+            if (activity.map && activity.map.summary_polyline) {
+                const coordinates = decodePolyline(activity.map.summary_polyline);
+                if (coordinates.length > 0) {
+                    coordinates.forEach(coord => recentBounds.extend(coord));
+                    hasRecentCoordinates = true;
+                }
             }
-        }
-    });
-    
-    // Use recent bounds if available, otherwise use all activities bounds
-    const boundsToUse = hasRecentCoordinates ? recentBounds : bounds;
-    const hasCoordinatesToUse = hasRecentCoordinates || hasCoordinates;
+        });
+        
+        // Use recent bounds if available, otherwise use all activities bounds
+        boundsToUse = hasRecentCoordinates ? recentBounds : bounds;
+        hasCoordinatesToUse = hasRecentCoordinates || hasCoordinates;
+    }
     
     // Fit map to show all routes with better zoom logic
     if (hasCoordinatesToUse) {
@@ -274,6 +482,65 @@ function displayAllRoutes() {
     }
 }
 
+// Draw the filtered routes intersecting the given bounds that are not on the map yet
+function drawRoutesInBounds(bounds) {
+    const sw = bounds.getSouthWest();
+    const ne = bounds.getNorthEast();
+    const visibleIds = queryRouteIds(sw.lng, sw.lat, ne.lng, ne.lat);
+    const filteredActivities = getFilteredActivities();
+    const clusterCounts = countRouteClusters(filteredActivities);
+    
+    // Repeated routes are drawn once, with a wider line
+    filteredActivities.forEach(activity => {
+        if (visibleIds.has(activity.id) && !drawnRouteIds.has(activity.id) && !isRepeatedRoute(activity)) {
+            addRouteLayer(activity, routeLineWidth(activity, clusterCounts));
+        }
+    });
+}
+
+// Add one activity's route to the map. Returns its coordinates, or null if it has no route
+function addRouteLayer(activity, lineWidth = 2) {
+    if (!activity.map || !activity.map.summary_polyline) return null;
+    
+    const coordinates = decodePolyline(activity.map.summary_polyline);
+    if (coordinates.length === 0) return null;
+    
+    const sourceId = `route-${activity.id}`;
+    const layerId = `route-layer-${activity.id}`;
+    
+    map.addSource(sourceId, {
+        type: 'geojson',
+        data: {
+            type: 'Feature',
+            properties: {
+                activity: activity
+            },
+            geometry: {
+                type: 'LineString',
+                coordinates: coordinates
+            }
+        }
+    });
+    
+    map.addLayer({
+        id: layerId,
+        type: 'line',
+        source: sourceId,
+        layout: {
+            'line-join': 'round',
+            'line-cap': 'round'
+        },
+        paint: {
+            'line-color': getActivityColor(activity),
+            'line-width': lineWidth,
+            'line-opacity': 0.7
+        }
+    });
+    
+    drawnRouteIds.add(activity.id);
+    return coordinates;
+}
+
 // Get activity color based on type or other criteria
 function getActivityColor(activity) {
     const colors = {
@@ -294,6 +561,7 @@ function displaySingleRoute(activity) {
     if (map && activity.map && activity.map.summary_polyline) {
         // Clear existing routes
         clearMapRoutes();
+        showingAllRoutes = false;
         
         const polyline = activity.map.summary_polyline;
         const coordinates = decodePolyline(polyline);
@@ -477,6 +745,13 @@ function createThumbnailMap(activity) {
         return;
     }
     
+    // A prerendered thumbnail needs no map instance (or token); the live map is the fallback
+    const thumbnailUrl = routeThumbnailUrl(activity);
+    if (thumbnailUrl) {
+        container.innerHTML = `<img class="activity-thumbnail-image" src="${thumbnailUrl}" alt="Route of ${activity.name}">`;
+        return;
+    }
+    
     const mapboxToken = CONFIG.MAPBOX_ACCESS_TOKEN;
     if (!mapboxToken || mapboxToken === 'your_mapbox_token_here') {
         container.innerHTML = '<div style="display: flex; align-items: center; justify-content: center; height: 100%; background: #21262d; color: #8b949e; border-radius: 8px;">Mapbox token required</div>';
@@ -720,8 +995,11 @@ function createActivityElement(activity) {
     // Format full date and time
     const formattedDateTime = formatFullDateTime(date);
     
+    const thumbnailUrl = routeThumbnailUrl(activity);
+    const thumbnail = thumbnailUrl ? `<img class="activity-route-thumb" src="${thumbnailUrl}" alt="" loading="lazy">` : '';
+    
     div.innerHTML = `
-        <div class="activity-name">${activity.name}</div>
+        <div class="activity-name">${thumbnail}${activity.name}</div>
         <div class="activity-km">${distance}</div>
         <div class="activity-pace">${pace}</div>
         <div class="activity-bpm">${heartRate}</div>
@@ -772,18 +1050,104 @@ function formatDuration(seconds) {
     return `${minutes}m`;
 }
 
-// Get filtered activities based on current year
+// Get filtered activities based on current year and search box
 function getFilteredActivities() {
-    if (currentYear === 'all') {
+    const matchingIds = searchActivityIds(searchQuery);
+    
+    if (currentYear === 'all' && !matchingIds) {
         return activitiesData;
     }
     
     return activitiesData.filter(activity => {
+        if (matchingIds && !matchingIds.has(activity.id)) return false;
+        if (currentYear === 'all') return true;
         const activityYear = parseLocalDateTime(activity.start_date_local).getFullYear();
         return activityYear === parseInt(currentYear);
     });
 }
 
+// Load the prebuilt inverted index used by the search box
+async function loadSearchIndex() {
+    try {
+        const response = await fetch('./generated/search_index.json');
+        const index = await response.json();
+        if (index.version !== 1) return;
+        searchIndex = index;
+        searchIndex.decoded = new Map();
+        console.log('Loaded search index with', index.terms.length, 'terms');
+    } catch (error) {
+        console.error('Error loading search index:', error);
+    }
+}
+
+// Split a query like the index does; CJK runs become bigrams (or a single character)
+function tokenizeSearchQuery(query) {
+    const cjk = /[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+|[^\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+/g;
+    const tokens = new Set();
+    const words = query.normalize('NFKC').toLowerCase().match(/[\p{L}\p{N}]+/gu) || [];
+    words.forEach(word => {
+        (word.match(cjk) || []).forEach(run => {
+            const isCjk = /^[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]/.test(run);
+            if (isCjk && run.length > 1) {
+                for (let i = 0; i < run.length - 1; i++) tokens.add(run.slice(i, i + 2));
+            } else {
+                tokens.add(run);
+            }
+        });
+    });
+    return [...tokens];
+}
+
+// Decode a base64 delta/varint posting list into doc numbers (cached per term)
+function decodePostings(position) {
+    if (searchIndex.decoded.has(position)) return searchIndex.decoded.get(position);
+    
+    const bytes = atob(searchIndex.postings[position]);
+    const docs = [];
+    let previous = 0, value = 0, shift = 0;
+    for (let i = 0; i < bytes.length; i++) {
+        const byte = bytes.charCodeAt(i);
+        value |= (byte & 0x7f) << shift;
+        if (byte & 0x80) {
+            shift += 7;
+            continue;
+        }
+        previous += value;
+        docs.push(previous);
+        value = 0;
+        shift = 0;
+    }
+    searchIndex.decoded.set(position, docs);
+    return docs;
+}
+
+// Activity ids matching every query token as a prefix, or null when not searching
+function searchActivityIds(query) {
+    if (!searchIndex || !query.trim()) return null;
+    
+    const tokens = tokenizeSearchQuery(query);
+    if (tokens.length === 0) return null;
+    
+    const terms = searchIndex.terms;
+    let matches = null;
+    for (const token of tokens) {
+        // Binary search for the first term >= token; all terms with the prefix follow it
+        let lo = 0, hi = terms.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >> 1;
+            if (terms[mid] < token) lo = mid + 1; else hi = mid;
+        }
+        const docs = new Set();
+        for (let position = lo; position < terms.length && terms[position].startsWith(token); position++) {
+            decodePostings(position).forEach(doc => docs.add(doc));
+        }
+        matches = matches ? new Set([...matches].filter(doc => docs.has(doc))) : docs;
+        if (matches.size === 0) break;
+    }
+    
+    return new Set([...matches].map(doc => searchIndex.ids[doc]));
+}
+
 // Update yearly stats
 function updateYearlyStats() {
     // Get stats for current year from pre-calculated data
@@ -967,6 +1331,13 @@ function setupEventListeners() {
         }, 100);
     });
     
+    // Search box filters the list through the prebuilt index
+    const searchInput = document.getElementById('activity-search');
+    searchInput.addEventListener('input', function() {
+        searchQuery = this.value;
+        renderActivitiesList(true);
+    });
+    
     // Load more button
     const loadMoreBtn = document.getElementById('load-more-btn');
     loadMoreBtn.addEventListener('click', loadMoreActivities);
@@ -978,6 +1349,10 @@ function setupEventListeners() {
         resetMapToAllRoutes();
     });
     
+    // Heatmap button
+    const heatmapBtn = document.getElementById('heatmap-btn');
+    heatmapBtn.addEventListener('click', toggleHeatmap);
+    
     // Close button for activity details
     const closeBtn = document.getElementById('close-details');
     closeBtn.addEventListener('click', hideActivityDetails);
@@ -1074,20 +1449,31 @@ function updateLeftSidebarForTwoYears(currentYear, previousYear) {
 
 // Create year stats section
 function createYearStatsSection(year, isCurrentYear) {
-    const yearActivities = activitiesData.filter(activity => {
-        const activityYear = parseLocalDateTime(activity.start_date_local).getFullYear();
-        return activityYear === year;
-    });
-    
-    const totalActivities = yearActivities.length;
-    const totalDistance = yearActivities.reduce((sum, activity) => sum + activity.distance, 0) / 1000;
-    const totalTime = yearActivities.reduce((sum, activity) => sum + activity.moving_time, 0);
-    const avgPace = totalTime / (totalDistance || 1);
-    const avgHeartRate = yearActivities
-        .filter(activity => activity.average_heartrate)
-        .reduce((sum, activity, _, arr) => sum + activity.average_heartrate / arr.length, 0);
-    const bestPace = calculateBestPace(yearActivities);
-    const streak = calculateStreak(yearActivities);
+    let totalActivities, totalDistance, avgPace, avgHeartRate, bestPace;
+    const precomputed = yearComparisonData && yearComparisonData.totals[year];
+    
+    if (precomputed) {
+        // Use totals pre-computed by year_comparison.py
+        totalActivities = precomputed.total_activities;
+        totalDistance = precomputed.total_distance;
+        avgPace = precomputed.avg_pace;
+        avgHeartRate = precomputed.avg_heart_rate;
+        bestPace = precomputed.best_pace;
+    } else {
+        const yearActivities = activitiesData.filter(activity => {
+            const activityYear = parseLocalDateTime(activity.start_date_local).getFullYear();
+            return activityYear === year;
+        });
+        
+        totalActivities = yearActivities.length;
+        totalDistance = yearActivities.reduce((sum, activity) => sum + activity.distance, 0) / 1000;
+        const totalTime = yearActivities.reduce((sum, activity) => sum + activity.moving_time, 0);
+        avgPace = totalTime / (totalDistance || 1);
+        avgHeartRate = yearActivities
+            .filter(activity => activity.average_heartrate)
+            .reduce((sum, activity, _, arr) => sum + activity.average_heartrate / arr.length, 0);
+        bestPace = calculateBestPace(yearActivities);
+    }
     
     const section = document.createElement('div');
     section.className = 'yearly-stats';
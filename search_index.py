@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Activity search index.
+Builds a compact inverted index over activity names, cities, devices, gear and sport types
+so the dashboard can run prefix searches without scanning every activity object.
+"""
+
+import base64
+import re
+import unicodedata
+from activity_model import extract_city_from_activity
+from timezone_config import get_derived_fields
+from serialization import dump_json
+
+OUTPUT_FILE = 'generated/search_index.json'
+
+# Bump when tokenization or the file layout changes (script.js checks it)
+INDEX_VERSION = 1
+
+# Kana, CJK ideographs and Hangul have no spaces between words, so they are indexed as
+# single characters plus overlapping bigrams instead of whitespace-separated words
+CJK_CHARS = '぀-ヿ㐀-䶿一-鿿豈-﫿가-힯'
+WORD_PATTERN = re.compile(r'[^\W_]+')
+RUN_PATTERN = re.compile(f'[{CJK_CHARS}]+|[^{CJK_CHARS}]+')
+CJK_PATTERN = re.compile(f'[{CJK_CHARS}]')
+CAMEL_PATTERN = re.compile(r'[A-Z][a-z]+|[A-Z]+(?![a-z])|[a-z]+|\d+')
+
+
+def tokenize(text):
+    """
+    Split text into search terms.
+
+    Latin words and numbers become lowercase words; CJK runs such as "午间行走" become
+    their characters plus bigrams (午, 间, 行, 走, 午间, 间行, 行走).
+    """
+    terms = set()
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    for word in WORD_PATTERN.findall(text):
+        for run in RUN_PATTERN.findall(word):
+            if CJK_PATTERN.match(run):
+                terms.update(run)
+                terms.update(run[i:i + 2] for i in range(len(run) - 1))
+            else:
+                terms.add(run)
+    return terms
+
+
+def activity_terms(activity):
+    """All search terms of one activity."""
+    terms = tokenize(activity.get('name'))
+    terms |= tokenize(extract_city_from_activity(activity))
+    terms |= tokenize(activity.get('device_name'))
+
+    if activity.get('gear_id'):
+        terms.add(activity['gear_id'].lower())
+
+    # "TrailRun" is found by "trailrun", "trail" and "run"
+    sport = activity.get('sport_type') or activity.get('type') or ''
+    if sport:
+        terms.add(sport.lower())
+        terms.update(part.lower() for part in CAMEL_PATTERN.findall(sport))
+
+    return terms
+
+
+def encode_postings(doc_numbers):
+    """Delta-encode sorted doc numbers as unsigned LEB128 varints in base64."""
+    data = bytearray()
+    previous = 0
+    for number in doc_numbers:
+        delta = number - previous
+        previous = number
+        while delta >= 0x80:
+            data.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        data.append(delta)
+    return base64.b64encode(bytes(data)).decode('ascii')
+
+
+def decode_postings(encoded):
+    """Inverse of encode_postings."""
+    doc_numbers = []
+    previous = 0
+    value = 0
+    shift = 0
+    for byte in base64.b64decode(encoded):
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += value
+        doc_numbers.append(previous)
+        value = 0
+        shift = 0
+    return doc_numbers
+
+
+def build_search_index(activities):
+    """
+    Build the index document.
+
+    Layout:
+        ids       activity id of each doc number, newest activity first
+        terms     sorted vocabulary, so a prefix is a contiguous range found by binary search
+        postings  encoded doc numbers for the term at the same position
+    """
+    documents = sorted(
+        (activity for activity in activities if activity.get('id')),
+        key=lambda activity: get_derived_fields(activity).get('epoch', 0),
+        reverse=True
+    )
+
+    postings = {}
+    for doc_number, activity in enumerate(documents):
+        for term in activity_terms(activity):
+            postings.setdefault(term, []).append(doc_number)
+
+    terms = sorted(postings)
+    return {
+        'version': INDEX_VERSION,
+        'ids': [activity['id'] for activity in documents],
+        'terms': terms,
+        'postings': [encode_postings(postings[term]) for term in terms]
+    }
+
+
+def search(index, query):
+    """Reference prefix search: activity ids matching every query token, newest first."""
+    import bisect
+
+    tokens = set()
+    text = unicodedata.normalize('NFKC', query or '').lower()
+    for word in WORD_PATTERN.findall(text):
+        for run in RUN_PATTERN.findall(word):
+            if CJK_PATTERN.match(run) and len(run) > 1:
+                tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+            else:
+                tokens.add(run)
+    if not tokens:
+        return []
+
+    terms = index['terms']
+    matches = None
+    for token in tokens:
+        docs = set()
+        position = bisect.bisect_left(terms, token)
+        while position < len(terms) and terms[position].startswith(token):
+            docs.update(decode_postings(index['postings'][position]))
+            position += 1
+        matches = docs if matches is None else matches & docs
+        if not matches:
+            return []
+
+    return [index['ids'][doc_number] for doc_number in sorted(matches)]
+
+
+def generate_search_index(activities, output_file=OUTPUT_FILE):
+    """Write the search index. Returns the number of terms."""
+    index = build_search_index(activities)
+    dump_json(output_file, index)
+    return len(index['terms'])
+
+
+if __name__ == "__main__":
+    from calculate_stats import load_activities
+    term_count = generate_search_index(load_activities())
+    print(f"Indexed {term_count} search terms, saved to {OUTPUT_FILE}")
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Segment-effort leaderboard index.
+Maps each Strava segment to the athlete's efforts sorted by elapsed time, updated only from
+new detailed activities, and writes per-segment JSON for the dashboard.
+"""
+
+import bisect
+import os
+from datetime import datetime
+from timezone_config import get_derived_fields
+from storage_codec import stored_path
+from serialization import load_json, dump_json, save_store
+
+INDEX_FILE = 'data/segment_index.json'
+OUTPUT_DIR = 'generated/segments'
+
+# Bump when the index layout changes so every activity is reprocessed
+INDEX_VERSION = 1
+
+
+def new_segment_index():
+    """Create an empty segment index."""
+    return {
+        'version': INDEX_VERSION,
+        # Detailed activities already indexed
+        'processed': [],
+        # segment id -> {'name', 'distance', 'average_grade', 'city', 'efforts': [[elapsed, effort id, activity id, local date], ...]}
+        'segments': {}
+    }
+
+
+def load_segment_index(file_path=INDEX_FILE):
+    """Load the segment index, or return an empty one if missing or outdated."""
+    if not os.path.exists(stored_path(file_path)):
+        return new_segment_index()
+
+    try:
+        index = load_json(file_path)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to load {file_path}, rebuilding: {e}")
+        return new_segment_index()
+
+    if index.get('version') != INDEX_VERSION:
+        return new_segment_index()
+    return index
+
+
+def save_segment_index(index, file_path=INDEX_FILE):
+    """Save the segment index."""
+    save_store(file_path, index)
+
+
+def update_segment_index(index, activities):
+    """
+    Index the segment efforts of detailed activities not seen before and drop efforts of
+    deleted activities. Returns the set of segment ids that changed.
+    """
+    processed = set(index['processed'])
+    segments = index['segments']
+    current_ids = set()
+    touched = set()
+
+    for activity in activities:
+        activity_id = activity.get('id')
+        if not activity_id:
+            continue
+        current_ids.add(activity_id)
+
+        # Summary records have no segment_efforts key; wait for the detailed version
+        if activity_id in processed or 'segment_efforts' not in activity:
+            continue
+        processed.add(activity_id)
+
+        local_date = get_derived_fields(activity).get('local_date', '')
+        for effort in activity['segment_efforts'] or []:
+            segment = effort.get('segment') or {}
+            if not segment.get('id') or not effort.get('elapsed_time'):
+                continue
+            segment_id = str(segment['id'])
+            entry = segments.setdefault(segment_id, {
+                'name': segment.get('name') or effort.get('name', ''),
+                'distance': segment.get('distance'),
+                'average_grade': segment.get('average_grade'),
+                'city': segment.get('city'),
+                'efforts': []
+            })
+            bisect.insort(entry['efforts'], [effort['elapsed_time'], effort.get('id') or 0, activity_id, local_date])
+            touched.add(segment_id)
+
+    # Drop efforts from activities that are no longer stored
+    removed = processed - current_ids
+    if removed:
+        processed -= removed
+        for segment_id in list(segments):
+            efforts = segments[segment_id]['efforts']
+            kept = [effort for effort in efforts if effort[2] not in removed]
+            if len(kept) != len(efforts):
+                touched.add(segment_id)
+                if kept:
+                    segments[segment_id]['efforts'] = kept
+                else:
+                    del segments[segment_id]
+
+    index['processed'] = sorted(processed)
+    return touched
+
+
+def get_effort_rank(index, segment_id, elapsed_time):
+    """Get the 1-based rank an elapsed time would have on a segment, in O(log n)."""
+    segment = index['segments'].get(str(segment_id))
+    if not segment:
+        return 1
+    return bisect.bisect_left(segment['efforts'], [elapsed_time]) + 1
+
+
+def calculate_trend(efforts):
+    """
+    Least-squares slope of elapsed time against date, in seconds per 30 days.
+
+    Negative means the segment is getting faster.
+    """
+    points = [
+        (datetime.strptime(effort[3], '%Y-%m-%d').toordinal(), effort[0])
+        for effort in efforts if effort[3]
+    ]
+    if len(points) < 2:
+        return None
+
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        return None
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+    return round(slope * 30, 1)
+
+
+def build_segment_summary(segment_id, segment):
+    """Summary row for the segment list."""
+    best = segment['efforts'][0]
+    return {
+        'id': int(segment_id),
+        'name': segment['name'],
+        'distance': segment['distance'],
+        'city': segment['city'],
+        'count': len(segment['efforts']),
+        'pr_time': best[0],
+        'pr_date': best[3],
+        'trend': calculate_trend(segment['efforts'])
+    }
+
+
+def write_segment_outputs(index, touched, output_dir=OUTPUT_DIR):
+    """Write per-segment files for changed segments plus the segment list."""
+    os.makedirs(output_dir, exist_ok=True)
+    summaries = []
+
+    for segment_id, segment in index['segments'].items():
+        summary = build_segment_summary(segment_id, segment)
+        summaries.append(summary)
+
+        segment_file = os.path.join(output_dir, f'{segment_id}.json')
+        if segment_id in touched or not os.path.exists(segment_file):
+            document = dict(summary, average_grade=segment['average_grade'], efforts=[
+                {'elapsed_time': elapsed, 'effort_id': effort_id, 'activity_id': activity_id, 'date': local_date}
+                for elapsed, effort_id, activity_id, local_date in segment['efforts']
+            ])
+            dump_json(segment_file, document)
+
+    # Remove files of segments that no longer have efforts
+    for segment_id in touched - set(index['segments']):
+        segment_file = os.path.join(output_dir, f'{segment_id}.json')
+        if os.path.exists(segment_file):
+            os.remove(segment_file)
+
+    summaries.sort(key=lambda summary: summary['count'], reverse=True)
+    dump_json(os.path.join(output_dir, 'index.json'), summaries)
+
+
+def generate_segment_index(activities, index_file=INDEX_FILE, output_dir=OUTPUT_DIR):
+    """Update the persisted segment index and write the per-segment JSON."""
+    index = load_segment_index(index_file)
+    processed = set(index['processed'])
+    touched = update_segment_index(index, activities)
+    # Activities without efforts change only the processed set, which must be saved too
+    if touched or set(index['processed']) != processed:
+        save_segment_index(index, index_file)
+    write_segment_outputs(index, touched, output_dir)
+    return len(touched)
+
+
+if __name__ == "__main__":
+    from calculate_stats import load_activities
+    changed = generate_segment_index(load_activities())
+    print(f"Updated {changed} segments, saved to {OUTPUT_DIR}/")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+JSON serialization layer.
+Routes the pipeline's JSON reads and writes through orjson or msgspec when one is installed
+and falls back to the standard library otherwise. Machine-only files are written compact;
+committed stores go through the storage codec, and records can be checked against a simple
+field/type schema while loading.
+"""
+
+import json
+import os
+from storage_codec import read_stored, write_stored
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def pick_backend():
+    """Fastest available backend, or the one named by JSON_BACKEND (orjson, msgspec, json)."""
+    requested = os.getenv('JSON_BACKEND', '').lower()
+    available = {'orjson': orjson is not None, 'msgspec': msgspec is not None, 'json': True}
+    if requested:
+        if not available.get(requested):
+            raise ValueError(f"JSON_BACKEND={requested} is not installed")
+        return requested
+    return 'orjson' if orjson else 'msgspec' if msgspec else 'json'
+
+
+BACKEND = pick_backend()
+
+
+class SchemaError(ValueError):
+    """A decoded record does not match its schema."""
+
+
+def loads(data):
+    """Parse JSON from bytes or str."""
+    if BACKEND == 'orjson':
+        return orjson.loads(data)
+    if BACKEND == 'msgspec':
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+def dumps(obj, pretty=False, sort_keys=False):
+    """
+    Serialize to UTF-8 JSON bytes with non-ASCII text kept as is.
+
+    Compact by default; pretty output uses a two-space indent for files people read or diff.
+    """
+    if BACKEND == 'orjson':
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+
+    if BACKEND == 'msgspec':
+        content = msgspec.json.encode(obj, order='sorted' if sort_keys else None)
+        return msgspec.json.format(content, indent=2) if pretty else content
+
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False, sort_keys=sort_keys).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, sort_keys=sort_keys).encode('utf-8')
+
+
+def validate_records(records, schema, required=()):
+    """
+    Check a list of dict records against a schema.
+
+    schema maps field name -> type or tuple of types; fields may be absent or None.
+    required lists fields every record must have. Raises SchemaError on the first mismatch.
+    """
+    if not isinstance(records, list):
+        raise SchemaError(f"expected a list of records, got {type(records).__name__}")
+
+    for position, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise SchemaError(f"record {position}: expected an object, got {type(record).__name__}")
+        for field in required:
+            if record.get(field) is None:
+                raise SchemaError(f"record {position}: missing {field}")
+        for field, types in schema.items():
+            value = record.get(field)
+            if value is None:
+                continue
+            allowed = types if isinstance(types, tuple) else (types,)
+            # bool is an int subclass, but True is not a valid distance
+            if not isinstance(value, allowed) or (isinstance(value, bool) and bool not in allowed):
+                raise SchemaError(f"record {position} ({record.get('id')}): {field} has type {type(value).__name__}")
+    return records
+
+
+def load_json(file_path, schema=None, required=()):
+    """
+    Read a JSON file, optionally validating a list of records against a schema.
+
+    A compressed sibling (file_path + .gz/.zst) is read in place of a missing plain file.
+    """
+    data = loads(read_stored(file_path))
+    if schema is not None:
+        validate_records(data, schema, required)
+    return data
+
+
+def dump_json(file_path, obj, pretty=False):
+    """Write a JSON file (compact unless pretty), creating its directory if needed."""
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(file_path, 'wb') as f:
+        f.write(dumps(obj, pretty=pretty))
+
+
+def save_store(file_path, obj, pretty=False):
+    """Write a committed JSON store compressed with the storage codec. Returns the path written."""
+    return write_stored(file_path, dumps(obj, pretty=pretty))
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Rolling snapshots of the activity store.
+Keeps the last SNAPSHOT_COUNT versions of data/activities.json as one full base plus a chain of
+compact deltas (added records, removed ids, per-field patches), so any recent version can be
+restored without storing full copies. When the chain grows past the limit, the oldest delta
+is folded into the base in a background thread.
+
+Usage:
+    python snapshots.py                 # list versions
+    python snapshots.py restore <id>    # write version <id> back to data/activities.json
+"""
+
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from serialization import load_json, dump_json, save_store
+from storage_codec import stored_path
+
+SNAPSHOT_DIR = 'data/snapshots'
+MANIFEST_FILE = 'manifest.json'
+ACTIVITIES_FILE = 'data/activities.json'
+
+# Full copy kept before snapshots existed; becomes the first base, then is removed
+LEGACY_BACKUP_FILE = 'data/activities.json.backup'
+
+# Bump when the manifest or delta layout changes
+SNAPSHOT_VERSION = 1
+
+# Serializes manifest updates between the sync and a background rebase
+_lock = threading.Lock()
+
+
+def snapshot_count():
+    """Number of versions to keep (SNAPSHOT_COUNT, 10 by default)."""
+    return max(int(os.getenv('SNAPSHOT_COUNT', '10')), 1)
+
+
+def new_manifest():
+    """Create an empty manifest."""
+    return {'version': SNAPSHOT_VERSION, 'base': None, 'deltas': [], 'next_id': 1}
+
+
+def load_manifest(snapshot_dir=SNAPSHOT_DIR):
+    """Load the manifest, or an empty one if missing or outdated."""
+    file_path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    if not os.path.exists(file_path):
+        return new_manifest()
+    try:
+        manifest = load_json(file_path)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to load {file_path}, starting new snapshots: {e}")
+        return new_manifest()
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        return new_manifest()
+    return manifest
+
+
+def save_manifest(manifest, snapshot_dir=SNAPSHOT_DIR):
+    """Save the manifest (kept readable: it is the list of versions)."""
+    dump_json(os.path.join(snapshot_dir, MANIFEST_FILE), manifest, pretty=True)
+
+
+def version_path(kind, version_id, snapshot_dir=SNAPSHOT_DIR):
+    """Uncompressed path of a base or delta file (stored with the storage codec)."""
+    return os.path.join(snapshot_dir, f'{kind}-{version_id}.json')
+
+
+def remove_version_file(kind, version_id, snapshot_dir=SNAPSHOT_DIR):
+    """Delete a base or delta file in whatever codec it was written."""
+    file_path = stored_path(version_path(kind, version_id, snapshot_dir))
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def sort_activities(activities):
+    """Newest first, the order the sync saves activities in."""
+    activities.sort(key=lambda x: x.get('start_date', ''), reverse=True)
+    return activities
+
+
+def compute_delta(old_activities, new_activities):
+    """
+    Delta turning one activity list into another.
+
+    added: full new records; removed: ids; patched: id -> {"set": changed fields, "unset": removed fields}
+    """
+    old_by_id = {str(activity['id']): activity for activity in old_activities if activity.get('id')}
+    new_ids = set()
+    delta = {'added': [], 'removed': [], 'patched': {}}
+
+    for activity in new_activities:
+        if not activity.get('id'):
+            continue
+        key = str(activity['id'])
+        new_ids.add(key)
+        old = old_by_id.get(key)
+        if old is None:
+            delta['added'].append(activity)
+            continue
+        if old == activity:
+            continue
+        patch = {}
+        changed = {field: value for field, value in activity.items() if old.get(field, object()) != value}
+        if changed:
+            patch['set'] = changed
+        unset = sorted(field for field in old if field not in activity)
+        if unset:
+            patch['unset'] = unset
+        delta['patched'][key] = patch
+
+    delta['removed'] = sorted(key for key in old_by_id if key not in new_ids)
+    return delta
+
+
+def apply_delta(activities_by_id, delta):
+    """Apply a delta in place to an id -> record dict."""
+    for key in delta['removed']:
+        activities_by_id.pop(key, None)
+    for key, patch in delta['patched'].items():
+        record = dict(activities_by_id[key], **patch.get('set', {}))
+        for field in patch.get('unset', []):
+            record.pop(field, None)
+        activities_by_id[key] = record
+    for activity in delta['added']:
+        activities_by_id[str(activity['id'])] = activity
+
+
+def restore_version(version_id=None, snapshot_dir=SNAPSHOT_DIR, manifest=None):
+    """Rebuild the activity list of a version (the latest by default)."""
+    manifest = manifest or load_manifest(snapshot_dir)
+    if manifest['base'] is None:
+        raise KeyError("no snapshots have been taken")
+
+    chain = [manifest['base']['id']] + [delta['id'] for delta in manifest['deltas']]
+    version_id = chain[-1] if version_id is None else version_id
+    if version_id not in chain:
+        raise KeyError(f"version {version_id} is not kept (available: {', '.join(map(str, chain))})")
+
+    base = load_json(version_path('base', manifest['base']['id'], snapshot_dir))
+    activities_by_id = {str(activity['id']): activity for activity in base if activity.get('id')}
+    for delta_id in chain[1:chain.index(version_id) + 1]:
+        apply_delta(activities_by_id, load_json(version_path('delta', delta_id, snapshot_dir)))
+    return sort_activities(list(activities_by_id.values()))
+
+
+def version_entry(version_id, activities, created=None):
+    """Manifest entry of a version."""
+    created = created or datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return {'id': version_id, 'created': created, 'count': len(activities)}
+
+
+def take_snapshot(activities, snapshot_dir=SNAPSHOT_DIR, background=True):
+    """
+    Record the saved activity list as a new version.
+
+    Nothing is recorded when it matches the latest version. Returns the new version id, or None.
+    """
+    with _lock:
+        manifest = load_manifest(snapshot_dir)
+
+        if manifest['base'] is None:
+            base_activities = activities
+            created = None
+            # Seed the history with the old full backup, so it is not lost with the file
+            if os.path.exists(LEGACY_BACKUP_FILE):
+                try:
+                    base_activities = load_json(LEGACY_BACKUP_FILE)
+                    created = datetime.fromtimestamp(os.path.getmtime(LEGACY_BACKUP_FILE), timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+                except (OSError, ValueError) as e:
+                    print(f"Warning: Failed to import {LEGACY_BACKUP_FILE}: {e}")
+
+            version_id = manifest['next_id']
+            save_store(version_path('base', version_id, snapshot_dir), base_activities)
+            manifest['base'] = version_entry(version_id, base_activities, created)
+            manifest['next_id'] = version_id + 1
+            save_manifest(manifest, snapshot_dir)
+            if base_activities is activities:
+                return version_id
+            os.remove(LEGACY_BACKUP_FILE)
+
+        delta = compute_delta(restore_version(snapshot_dir=snapshot_dir, manifest=manifest), activities)
+        if not (delta['added'] or delta['removed'] or delta['patched']):
+            return None
+
+        version_id = manifest['next_id']
+        save_store(version_path('delta', version_id, snapshot_dir), delta)
+        entry = version_entry(version_id, activities)
+        entry.update({'added': len(delta['added']), 'removed': len(delta['removed']), 'patched': len(delta['patched'])})
+        manifest['deltas'].append(entry)
+        manifest['next_id'] = version_id + 1
+        save_manifest(manifest, snapshot_dir)
+
+    if len(manifest['deltas']) + 1 > snapshot_count():
+        if background:
+            # Not a daemon thread, so a one-shot sync still finishes the rebase before exiting
+            threading.Thread(target=rebase_snapshots, args=(snapshot_dir,), name='snapshot-rebase').start()
+        else:
+            rebase_snapshots(snapshot_dir)
+    return version_id
+
+
+def rebase_snapshots(snapshot_dir=SNAPSHOT_DIR):
+    """
+    Fold the oldest deltas into the base until at most SNAPSHOT_COUNT versions remain.
+
+    Returns the number of versions dropped.
+    """
+    with _lock:
+        manifest = load_manifest(snapshot_dir)
+        excess = len(manifest['deltas']) + 1 - snapshot_count()
+        if manifest['base'] is None or excess <= 0:
+            return 0
+
+        folded = manifest['deltas'][:excess]
+        old_base = manifest['base']
+        new_base = folded[-1]
+        activities = restore_version(new_base['id'], snapshot_dir, manifest)
+        save_store(version_path('base', new_base['id'], snapshot_dir), activities)
+
+        manifest['base'] = {field: new_base[field] for field in ('id', 'created', 'count')}
+        manifest['deltas'] = manifest['deltas'][excess:]
+        save_manifest(manifest, snapshot_dir)
+
+        # Only removed once the manifest no longer points at them
+        remove_version_file('base', old_base['id'], snapshot_dir)
+        for delta in folded:
+            remove_version_file('delta', delta['id'], snapshot_dir)
+        return excess
+
+
+def snapshot_cold_refs(snapshot_dir=SNAPSHOT_DIR):
+    """Cold-storage references used by any kept version, so pruning keeps their detail."""
+    refs = set()
+    with _lock:
+        manifest = load_manifest(snapshot_dir)
+        if manifest['base'] is None:
+            return refs
+        records = list(load_json(version_path('base', manifest['base']['id'], snapshot_dir)))
+        for entry in manifest['deltas']:
+            delta = load_json(version_path('delta', entry['id'], snapshot_dir))
+            records.extend(delta['added'])
+            records.extend(patch['set'] for patch in delta['patched'].values() if 'set' in patch)
+    for record in records:
+        if isinstance(record.get('cold'), dict):
+            refs.add(record['cold']['ref'])
+    return refs
+
+
+def list_versions(snapshot_dir=SNAPSHOT_DIR):
+    """Manifest entries of every kept version, oldest first."""
+    manifest = load_manifest(snapshot_dir)
+    return ([manifest['base']] if manifest['base'] else []) + manifest['deltas']
+
+
+def main():
+    """List versions, or restore one with: restore <id>."""
+    if len(sys.argv) == 3 and sys.argv[1] == 'restore':
+        activities = restore_version(int(sys.argv[2]))
+        file_path = save_store(ACTIVITIES_FILE, activities, pretty=True)
+        print(f"Restored version {sys.argv[2]} ({len(activities)} activities) to {file_path}")
+        print("Run calculate_stats.py and generate_visualizations.py to rebuild the outputs")
+        return
+
+    versions = list_versions()
+    if not versions:
+        print(f"No snapshots in {SNAPSHOT_DIR}/")
+        return
+    for entry in versions:
+        changes = f" +{entry['added']} -{entry['removed']} ~{entry['patched']}" if 'added' in entry else ' (base)'
+        print(f"{entry['id']:>5}  {entry['created']}  {entry['count']} activities{changes}")
+
+
+if __name__ == "__main__":
+    main()
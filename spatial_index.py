@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Spatial index of activity routes.
+Buckets each route's bounding box into a fixed-zoom XYZ tile grid so the map can look up
+the routes inside the current viewport instead of decoding and drawing every polyline.
+"""
+
+import math
+from datetime import datetime, timedelta
+from polyline import get_activity_points, bounding_box
+from timezone_config import get_derived_fields
+from serialization import dump_json
+
+OUTPUT_FILE = 'generated/spatial_index.json'
+
+# Bump when the file layout changes (script.js checks it)
+INDEX_VERSION = 1
+
+# Tile zoom of the grid; a zoom-12 tile is about 8 km across at Shanghai's latitude
+GRID_ZOOM = 12
+
+# Routes covering more cells than this (long rides, flights) go to the "large" list,
+# which is checked on every query, instead of being copied into every cell
+MAX_ROUTE_CELLS = 64
+
+# Viewports covering more cells than this check every route box instead of walking the
+# cells (same limit as queryRouteIds in script.js)
+MAX_QUERY_CELLS = 1024
+
+# Matches the six-month window the map uses for its initial zoom
+RECENT_DAYS = 183
+
+MAX_LATITUDE = 85.05112878
+
+
+def tile_x(lng, zoom=GRID_ZOOM):
+    """Web Mercator tile column of a longitude."""
+    n = 2 ** zoom
+    return min(max(int((lng + 180.0) / 360.0 * n), 0), n - 1)
+
+
+def tile_y(lat, zoom=GRID_ZOOM):
+    """Web Mercator tile row of a latitude (row 0 is the north edge)."""
+    n = 2 ** zoom
+    lat = math.radians(min(max(lat, -MAX_LATITUDE), MAX_LATITUDE))
+    y = (1.0 - math.log(math.tan(lat) + 1.0 / math.cos(lat)) / math.pi) / 2.0 * n
+    return min(max(int(y), 0), n - 1)
+
+
+def bbox_cells(bbox, zoom=GRID_ZOOM):
+    """Grid cells ("x/y") covered by a [west, south, east, north] box."""
+    west, south, east, north = bbox
+    x_range = range(tile_x(west, zoom), tile_x(east, zoom) + 1)
+    y_range = range(tile_y(north, zoom), tile_y(south, zoom) + 1)
+    if len(x_range) * len(y_range) > MAX_ROUTE_CELLS:
+        return None
+    return [f'{x}/{y}' for x in x_range for y in y_range]
+
+
+def activity_bbox(activity):
+    """Route bounding box, falling back to the start point for activities without a polyline."""
+    bbox = bounding_box(get_activity_points(activity))
+    if bbox is None and activity.get('start_latlng') and len(activity['start_latlng']) == 2:
+        lat, lng = activity['start_latlng']
+        bbox = [lng, lat, lng, lat]
+    return bbox
+
+
+def merge_bbox(a, b):
+    """Union of two boxes (either may be None)."""
+    if a is None or b is None:
+        return a or b
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+def build_spatial_index(activities, today=None):
+    """
+    Build the index document.
+
+    Layout:
+        ids, bboxes     activity id and [west, south, east, north] of each doc number
+        cells           "x/y" tile at GRID_ZOOM -> doc numbers whose box touches it
+        large           doc numbers too large for the grid
+        bounds          box of every route
+        recent_bounds   box of routes from the last six months (initial map fit)
+        center          mean start point as [lng, lat] (initial map center)
+    """
+    today = today or datetime.now().date()
+    recent_since = (today - timedelta(days=RECENT_DAYS)).strftime('%Y-%m-%d')
+
+    index = {
+        'version': INDEX_VERSION,
+        'zoom': GRID_ZOOM,
+        'ids': [],
+        'bboxes': [],
+        'cells': {},
+        'large': [],
+        'bounds': None,
+        'recent_bounds': None,
+        'center': None
+    }
+
+    lat_sum = lng_sum = start_count = 0
+    for activity in activities:
+        start = activity.get('start_latlng')
+        if start and len(start) == 2:
+            lat_sum += start[0]
+            lng_sum += start[1]
+            start_count += 1
+
+        bbox = activity_bbox(activity) if activity.get('id') else None
+        if bbox is None:
+            continue
+
+        bbox = [round(value, 5) for value in bbox]
+        doc_number = len(index['ids'])
+        index['ids'].append(activity['id'])
+        index['bboxes'].append(bbox)
+
+        cells = bbox_cells(bbox)
+        if cells is None:
+            index['large'].append(doc_number)
+        else:
+            for cell in cells:
+                index['cells'].setdefault(cell, []).append(doc_number)
+
+        index['bounds'] = merge_bbox(index['bounds'], bbox)
+        if get_derived_fields(activity).get('local_date', '') >= recent_since:
+            index['recent_bounds'] = merge_bbox(index['recent_bounds'], bbox)
+
+    if start_count:
+        index['center'] = [round(lng_sum / start_count, 6), round(lat_sum / start_count, 6)]
+    return index
+
+
+def query_bbox(index, bbox):
+    """Ids of routes whose box intersects a [west, south, east, north] viewport."""
+    west, south, east, north = bbox
+    zoom = index['zoom']
+    x0, x1 = tile_x(west, zoom), tile_x(east, zoom)
+    y0, y1 = tile_y(north, zoom), tile_y(south, zoom)
+    if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_QUERY_CELLS:
+        # Zoomed far out: checking every box is cheaper than walking the cells
+        candidates = range(len(index['ids']))
+    else:
+        candidates = set(index['large'])
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                candidates.update(index['cells'].get(f'{x}/{y}', []))
+
+    return [
+        index['ids'][doc_number] for doc_number in sorted(candidates)
+        if index['bboxes'][doc_number][0] <= east and index['bboxes'][doc_number][2] >= west
+        and index['bboxes'][doc_number][1] <= north and index['bboxes'][doc_number][3] >= south
+    ]
+
+
+def generate_spatial_index(activities, output_file=OUTPUT_FILE):
+    """Write the spatial index. Returns the number of indexed routes."""
+    index = build_spatial_index(activities)
+    dump_json(output_file, index)
+    return len(index['ids'])
+
+
+if __name__ == "__main__":
+    from calculate_stats import load_activities
+    route_count = generate_spatial_index(load_activities())
+    print(f"Indexed {route_count} routes, saved to {OUTPUT_FILE}")
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Columnar split and pace-zone analytics.
+Flattens every run's splits_metric into compact NumPy columns once (appending only new
+activities), then computes pace histograms, time in pace and heart-rate zones and
+grade-adjusted pace trends per year with vectorized operations.
+"""
+
+import os
+import numpy as np
+from daily_aggregates import MAX_HEART_RATE, RUN_SPORT_TYPES
+from timezone_config import get_derived_fields
+from serialization import dump_json
+
+COLUMNS_FILE = 'data/split_columns.npz'
+OUTPUT_FILE = 'generated/split_analytics.json'
+
+# Pace histogram bins in seconds per km: 3'00" to 10'00" in 15 second steps
+PACE_BINS = np.arange(180, 601, 15)
+
+# Heart-rate zone lower bounds as a fraction of max heart rate (Z1..Z5)
+HR_ZONE_BOUNDS = np.array([0.6, 0.7, 0.8, 0.9]) * MAX_HEART_RATE
+
+# Splits shorter than this (usually the last partial km) are left out of pace stats
+MIN_SPLIT_DISTANCE = 500
+
+COLUMN_TYPES = {
+    'activity_id': np.int64,
+    'year': np.int16,
+    'month': np.int8,
+    'distance': np.float32,
+    'moving_time': np.float32,
+    'average_speed': np.float32,
+    'grade_adjusted_speed': np.float32,
+    'heartrate': np.float32,
+    'pace_zone': np.int8
+}
+
+
+def empty_columns():
+    """Create empty split columns."""
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMN_TYPES.items()}
+
+
+def load_split_columns(file_path=COLUMNS_FILE):
+    """Load the persisted split columns, or empty columns if missing or outdated."""
+    if not os.path.exists(file_path):
+        return empty_columns()
+
+    try:
+        with np.load(file_path) as data:
+            columns = {name: data[name] for name in COLUMN_TYPES}
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Warning: Failed to load {file_path}, rebuilding: {e}")
+        return empty_columns()
+    return columns
+
+
+def save_split_columns(columns, file_path=COLUMNS_FILE):
+    """Save the split columns."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    np.savez_compressed(file_path, **columns)
+
+
+def flatten_splits(activities):
+    """Flatten the splits_metric of the given runs into new columns."""
+    rows = {name: [] for name in COLUMN_TYPES}
+    for activity in activities:
+        derived = get_derived_fields(activity)
+        year = derived.get('year', 0)
+        month = int(derived['local_date'][5:7]) if derived.get('local_date') else 0
+        for split in activity.get('splits_metric') or []:
+            rows['activity_id'].append(activity['id'])
+            rows['year'].append(year)
+            rows['month'].append(month)
+            rows['distance'].append(split.get('distance') or 0)
+            rows['moving_time'].append(split.get('moving_time') or 0)
+            rows['average_speed'].append(split.get('average_speed') or 0)
+            rows['grade_adjusted_speed'].append(split.get('average_grade_adjusted_speed') or 0)
+            rows['heartrate'].append(split.get('average_heartrate') or np.nan)
+            rows['pace_zone'].append(split.get('pace_zone') if split.get('pace_zone') is not None else -1)
+    return {name: np.array(values, dtype=COLUMN_TYPES[name]) for name, values in rows.items()}
+
+
+def update_split_columns(columns, activities):
+    """
+    Append the splits of runs not yet flattened and drop those of deleted runs.
+
+    Returns the updated columns and whether anything changed.
+    """
+    runs = [
+        activity for activity in activities
+        if activity.get('id') and (activity.get('sport_type') or activity.get('type')) in RUN_SPORT_TYPES
+    ]
+    current_ids = np.array([activity['id'] for activity in runs], dtype=np.int64)
+    known_ids = set(columns['activity_id'].tolist())
+
+    keep = np.isin(columns['activity_id'], current_ids)
+    # Known ids are checked first so flattened runs never read splits_metric from cold storage
+    new_runs = [activity for activity in runs if activity['id'] not in known_ids and activity.get('splits_metric')]
+
+    if keep.all() and not new_runs:
+        return columns, False
+
+    new_columns = flatten_splits(new_runs)
+    merged = {name: np.concatenate([columns[name][keep], new_columns[name]]) for name in COLUMN_TYPES}
+    return merged, True
+
+
+def summarize_splits(columns, mask):
+    """Compute pace, zone and grade-adjusted stats over the selected splits."""
+    distance = columns['distance'][mask]
+    moving_time = columns['moving_time'][mask]
+    speed = columns['average_speed'][mask]
+    gas = columns['grade_adjusted_speed'][mask]
+    heartrate = columns['heartrate'][mask]
+    pace_zone = columns['pace_zone'][mask]
+    month = columns['month'][mask]
+
+    full = (distance >= MIN_SPLIT_DISTANCE) & (speed > 0)
+    pace = np.divide(1000.0, speed, out=np.zeros_like(speed), where=speed > 0)
+    histogram, _ = np.histogram(np.clip(pace[full], PACE_BINS[0], PACE_BINS[-1] - 1), bins=PACE_BINS)
+
+    # Time in Strava's pace zones (index = zone) and in heart-rate zones Z1..Z5
+    zones = pace_zone[pace_zone >= 0]
+    pace_zone_seconds = np.bincount(zones, weights=moving_time[pace_zone >= 0]) if zones.size else np.zeros(0)
+    has_hr = ~np.isnan(heartrate)
+    hr_zone_seconds = np.bincount(
+        np.digitize(heartrate[has_hr], HR_ZONE_BOUNDS), weights=moving_time[has_hr], minlength=len(HR_ZONE_BOUNDS) + 1
+    )
+
+    # Distance-weighted grade-adjusted pace per month: total time / total distance at GAP speed
+    with_gas = full & (gas > 0)
+    gap_seconds = np.bincount(month[with_gas], weights=distance[with_gas] / gas[with_gas], minlength=13)[1:13]
+    gap_distance = np.bincount(month[with_gas], weights=distance[with_gas], minlength=13)[1:13]
+    gap_by_month = np.divide(gap_seconds * 1000, gap_distance, out=np.zeros(12), where=gap_distance > 0)
+
+    return {
+        'splits': int(mask.sum()),
+        'distance_km': round(float(distance.sum()) / 1000, 1),
+        'pace_histogram': histogram.tolist(),
+        'median_pace': round(float(np.median(pace[full])), 1) if full.any() else None,
+        'pace_zone_seconds': [int(value) for value in pace_zone_seconds],
+        'hr_zone_seconds': [int(value) for value in hr_zone_seconds],
+        'gap_by_month': [round(float(value), 1) if value else None for value in gap_by_month]
+    }
+
+
+def build_split_analytics(columns):
+    """Build the per-year and all-time analytics document."""
+    analytics = {
+        'pace_bins': PACE_BINS.tolist(),
+        'hr_zone_bounds': [round(float(bound)) for bound in HR_ZONE_BOUNDS],
+        'years': {},
+        'all': summarize_splits(columns, np.ones(columns['year'].shape, dtype=bool))
+    }
+    for year in np.unique(columns['year']):
+        if year:
+            analytics['years'][str(int(year))] = summarize_splits(columns, columns['year'] == year)
+    return analytics
+
+
+def generate_split_analytics(activities, columns_file=COLUMNS_FILE, output_file=OUTPUT_FILE):
+    """Update the persisted split columns and write the analytics JSON."""
+    columns, changed = update_split_columns(load_split_columns(columns_file), activities)
+    if changed:
+        save_split_columns(columns, columns_file)
+
+    dump_json(output_file, build_split_analytics(columns))
+    return len(columns['activity_id'])
+
+
+if __name__ == "__main__":
+    from calculate_stats import load_activities
+    split_count = generate_split_analytics(load_activities())
+    print(f"Analyzed {split_count} splits, saved to {OUTPUT_FILE}")
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Compressed-at-rest storage codec.
+Reads gzip, zstd and dictionary-compressed zlib data transparently (by magic bytes), writes
+committed stores in the codec chosen by STORAGE_CODEC, trains shared dictionaries for the
+many small per-activity records, and publishes precompressed .gz/.br siblings of the
+browser-facing files in generated/.
+"""
+
+import gzip
+import os
+import re
+import zlib
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# File suffix of each codec; 'none' keeps the plain file
+CODEC_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+# zlib only uses the last 32 KB of a preset dictionary
+DICTIONARY_SIZE = 32 * 1024
+
+# Files in generated/ served to the browser, and the siblings written next to them
+PUBLISHED_EXTENSIONS = ('.json', '.svg')
+PRECOMPRESSED_SUFFIXES = ('.gz', '.br')
+
+
+def pick_storage_codec():
+    """Codec for committed stores: STORAGE_CODEC (gzip, zstd or none), gzip by default."""
+    codec = os.getenv('STORAGE_CODEC', 'gzip').lower()
+    if codec not in CODEC_SUFFIXES:
+        raise ValueError(f"STORAGE_CODEC={codec} is not one of {', '.join(CODEC_SUFFIXES)}")
+    if codec == 'zstd' and zstandard is None:
+        raise ValueError("STORAGE_CODEC=zstd needs the zstandard package")
+    return codec
+
+
+STORAGE_CODEC = pick_storage_codec()
+
+
+def compress(data, codec=None):
+    """Compress bytes with a codec (the storage codec by default)."""
+    codec = codec or STORAGE_CODEC
+    if codec == 'gzip':
+        # mtime=0 keeps the output identical for identical input, so git sees no change
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=19).compress(data)
+    return data
+
+
+def dictionary_id(dictionary):
+    """Id of a preset dictionary, as stored in the header of zlib streams that use it."""
+    return f'{zlib.adler32(dictionary):08x}'
+
+
+def compress_with_dictionary(data, dictionary):
+    """Compress bytes as a zlib stream with a preset dictionary (RFC 1950 FDICT)."""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, zlib.Z_DEFAULT_STRATEGY, zdict=dictionary)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data, load_dictionary=None):
+    """
+    Decompress gzip, zstd or dictionary zlib data; anything else is returned as is.
+
+    load_dictionary(dictionary_id) supplies the preset dictionary of zlib streams that need one.
+    """
+    if data[:2] == GZIP_MAGIC:
+        return gzip.decompress(data)
+    if data[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ValueError("zstd-compressed data needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    if len(data) > 6 and data[0] == 0x78 and (data[0] * 256 + data[1]) % 31 == 0 and data[1] & 0x20:
+        if load_dictionary is None:
+            raise ValueError("zlib stream needs a preset dictionary")
+        decompressor = zlib.decompressobj(zdict=load_dictionary(data[2:6].hex()))
+        return decompressor.decompress(data) + decompressor.flush()
+    return data
+
+
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    """
+    Build a preset dictionary from sample JSON documents.
+
+    Collects the runs of keys, strings and punctuation between numbers that recur across
+    samples and packs the most common ones last, where zlib finds them at the shortest distance.
+    """
+    document_counts = Counter()
+    for sample in samples:
+        document_counts.update(set(re.findall(rb'[^0-9]{4,128}', sample)))
+
+    common = sorted(
+        (token for token, count in document_counts.items() if count > 1),
+        key=lambda token: (-document_counts[token], token)
+    )
+    picked = []
+    used = 0
+    for token in common:
+        if used + len(token) > size:
+            break
+        picked.append(token)
+        used += len(token)
+    return b''.join(reversed(picked))
+
+
+def stored_path(file_path):
+    """Path a store is kept at on disk: its compressed sibling if there is one."""
+    for suffix in ('.zst', '.gz'):
+        if os.path.exists(file_path + suffix):
+            return file_path + suffix
+    return file_path
+
+
+def read_stored(file_path):
+    """Read a store's bytes, decompressing it if it is kept compressed."""
+    with open(stored_path(file_path), 'rb') as f:
+        return decompress(f.read())
+
+
+def write_stored(file_path, data, codec=None):
+    """
+    Write a store's bytes in the storage codec and remove copies kept in other codecs.
+
+    Returns the path written.
+    """
+    codec = codec or STORAGE_CODEC
+    target = file_path + CODEC_SUFFIXES[codec]
+    directory = os.path.dirname(target)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temp_path = f'{target}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(compress(data, codec))
+    os.replace(temp_path, target)
+
+    for suffix in CODEC_SUFFIXES.values():
+        if file_path + suffix != target and os.path.exists(file_path + suffix):
+            os.remove(file_path + suffix)
+    return target
+
+
+def precompress(data, suffix):
+    """Content of a precompressed .gz or .br sibling."""
+    if suffix == '.br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def publish_precompressed(root='generated'):
+    """
+    Write .gz (and .br, with the brotli package) siblings of the JSON and SVG files under root.
+
+    Siblings newer than their source are left alone, and siblings whose source is gone are
+    removed. Returns the number of siblings written.
+    """
+    suffixes = [suffix for suffix in PRECOMPRESSED_SUFFIXES if suffix != '.br' or brotli is not None]
+    written = 0
+    for directory, _, files in os.walk(root):
+        names = set(files)
+        for name in files:
+            path = os.path.join(directory, name)
+            base, suffix = os.path.splitext(name)
+            if suffix in PRECOMPRESSED_SUFFIXES:
+                if base not in names:
+                    os.remove(path)
+                continue
+            if not name.endswith(PUBLISHED_EXTENSIONS):
+                continue
+
+            source_mtime = os.path.getmtime(path)
+            data = None
+            for sibling_suffix in suffixes:
+                sibling = path + sibling_suffix
+                if os.path.exists(sibling) and os.path.getmtime(sibling) >= source_mtime:
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                content = precompress(data, sibling_suffix)
+                if os.path.exists(sibling):
+                    with open(sibling, 'rb') as f:
+                        if f.read() == content:
+                            # Same bytes: only mark it fresh so git sees no change
+                            os.utime(sibling)
+                            continue
+                with open(sibling, 'wb') as f:
+                    f.write(content)
+                written += 1
+    return written
+
+
+if __name__ == "__main__":
+    count = publish_precompressed()
+    print(f"Wrote {count} precompressed files under generated/")
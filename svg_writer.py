@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Size-optimized SVG emitter.
+Collects repeated presentation attributes into CSS classes, lets callers define shapes once
+and place them with <use>, rounds every coordinate to the same precision, drops <title>
+tooltips in compact mode and renders either readable or minified markup.
+"""
+
+from xml.sax.saxutils import escape
+
+# Decimal places kept for coordinates and lengths
+PRECISION = 1
+
+
+def fmt(value, precision=PRECISION):
+    """Shortest text of a number rounded to precision decimals ('3' rather than '3.0')."""
+    text = f'{value:.{precision}f}'
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+
+def short_color(color):
+    """Three-digit form of a #rrggbb color when it has one ('#444444' -> '#444')."""
+    if len(color) == 7 and color.startswith('#') and all(color[i] == color[i + 1] for i in (1, 3, 5)):
+        return f'#{color[1]}{color[3]}{color[5]}'
+    return color
+
+
+def numbers(*values):
+    """Path-data numbers, rounded and joined with the fewest separators ('1 2-3' for 1, 2, -3)."""
+    text = ''
+    for value in values:
+        number = fmt(value)
+        text += number if not text or number.startswith('-') else f' {number}'
+    return text
+
+
+class SvgWriter:
+    """
+    Builds one SVG document.
+
+    Rules are emitted in the order classes were first requested, so the output is stable for
+    the same drawing calls.
+    """
+
+    def __init__(self, width, height, view_box, compact=False):
+        self.width = width
+        self.height = height
+        self.view_box = view_box
+        self.compact = compact
+        self.classes = {}
+        self.generated_classes = 0
+        self.rules = []
+        self.defs = []
+        self.body = []
+
+    def css_class(self, declarations, name=None):
+        """Class for a set of CSS declarations, adding its rule the first time."""
+        if declarations not in self.classes:
+            if name is None:
+                name = f'c{self.generated_classes}'
+                self.generated_classes += 1
+            self.classes[declarations] = name
+            self.rules.append(f'.{self.classes[declarations]}{{{declarations}}}')
+        return self.classes[declarations]
+
+    def fill_class(self, color):
+        """Class setting a fill color."""
+        return self.css_class(f'fill:{short_color(color)}')
+
+    def rule(self, selector, declarations):
+        """Add a CSS rule for an arbitrary selector (e.g. an element type)."""
+        self.rules.append(f'{selector}{{{declarations}}}')
+
+    def define(self, element):
+        """Add an element to <defs> (shapes placed later with use())."""
+        self.defs.append(element)
+
+    def add(self, element):
+        """Add an element to the drawing."""
+        self.body.append(element)
+
+    def element(self, tag, attributes, content='', title=None):
+        """
+        Markup of one element.
+
+        attributes is a list of (name, value) pairs; numbers are rounded with fmt() and None
+        values are left out. The title becomes a <title> child unless the writer is compact.
+        """
+        text = ''.join(
+            f' {name}="{fmt(value) if isinstance(value, float) else value}"'
+            for name, value in attributes if value is not None
+        )
+        if title is not None and not self.compact:
+            content = f'<title>{escape(title)}</title>{content}'
+        if content:
+            return f'<{tag}{text}>{content}</{tag}>'
+        return f'<{tag}{text}/>'
+
+    def use(self, shape_id, x, y, class_name=None, title=None):
+        """Place a shape defined with define() at (x, y) (SVG 2 href, no xlink namespace)."""
+        return self.element('use', [('href', f'#{shape_id}'), ('x', x), ('y', y), ('class', class_name)], title=title)
+
+    def render(self, minify=False):
+        """The document as text: one element per line, or minified without the XML declaration."""
+        parts = [] if minify else ['<?xml version="1.0" encoding="utf-8"?>']
+        parts.append(
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}" height="{self.height}" viewBox="{self.view_box}">'
+        )
+        if self.rules:
+            parts.append(f'<style>{"".join(self.rules)}</style>')
+        if self.defs:
+            parts.append(f'<defs>{"".join(self.defs)}</defs>')
+        parts.extend(self.body)
+        parts.append('</svg>')
+        return ''.join(parts) if minify else '\n'.join(parts)
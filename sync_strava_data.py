@@ -5,13 +5,34 @@ This script fetches activity data from Strava API and updates the local activiti
 """
 
 import os
+import sys
 import json
 import requests
 import time
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+import base64
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Set
 import logging
-from timezone_config import parse_local_datetime, get_timezone_info
+from timezone_config import derive_activity_fields, get_derived_fields
+from daily_aggregates import refresh_daily_aggregates, load_daily_aggregates
+from cold_storage import split_activity, prune_cold, ensure_dictionary
+from activity_columns import write_activity_columns
+from snapshots import take_snapshot, snapshot_cold_refs
+from storage_codec import stored_path
+from serialization import load_json, save_store
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
 
 # Configure logging
 logging.basicConfig(
@@ -20,37 +41,213 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+# Summary fields that change after upload (edits, kudos, gear...); other summary fields either
+# never change or differ from the detailed record by design (resource_state, map)
+SUMMARY_FIELDS = (
+    'name', 'type', 'sport_type', 'start_date', 'start_date_local', 'timezone', 'utc_offset',
+    'distance', 'moving_time', 'elapsed_time', 'total_elevation_gain', 'average_speed', 'max_speed',
+    'average_heartrate', 'max_heartrate', 'suffer_score', 'gear_id', 'commute', 'trainer',
+    'private', 'visibility', 'hide_from_home', 'kudos_count', 'comment_count', 'achievement_count',
+    'pr_count', 'photo_count', 'total_photo_count'
+)
+
+
+def summary_changed(existing: Dict, summary: Dict) -> bool:
+    """Whether a summary from the activity list differs from the stored (detailed) record."""
+    if any(existing.get(field) != summary[field] for field in SUMMARY_FIELDS if field in summary):
+        return True
+    new_polyline = (summary.get('map') or {}).get('summary_polyline')
+    return new_polyline is not None and new_polyline != (existing.get('map') or {}).get('summary_polyline')
+
+
+def merge_summary(existing: Dict, summary: Dict) -> Dict:
+    """
+    Merge a summary over the stored record, keeping detail-only fields.
+    
+    resource_state keeps the detailed level, and map is merged key by key so the detailed
+    polyline survives.
+    """
+    merged = {**existing, **{key: value for key, value in summary.items() if key not in ('resource_state', 'map')}}
+    if summary.get('map'):
+        merged['map'] = {**(existing.get('map') or {}),
+                         **{key: value for key, value in summary['map'].items() if key != 'resource_state'}}
+    return merged
+
+
+def write_activity_store(activities: List[Dict]):
+    """
+    Save the full activity list in one batch, with everything kept in step with it.
+    
+    Writes data/activities.json (compressed, heavy detail split into cold storage), records a
+    snapshot version, prunes and recompresses cold files, and refreshes the column cache and
+    the daily aggregates. Returns (stored activities, daily aggregates).
+    """
+    os.makedirs('data', exist_ok=True)
+    
+    # Sort activities by start_date (newest first)
+    activities.sort(key=lambda x: x.get('start_date', ''), reverse=True)
+    
+    # Store the derived date/pace block with every activity (backfills older records)
+    for activity in activities:
+        get_derived_fields(activity)
+    
+    # Heavy detail goes to content-addressed files in data/cold/; the hot file keeps references
+    activities = [split_activity(activity) for activity in activities]
+    
+    # Compressed at rest: data/activities.json.gz, or the codec set by STORAGE_CODEC
+    activities_file = save_store('data/activities.json', activities, pretty=True)
+    
+    # Rolling point-in-time versions (deltas against a base) for history and rollback
+    version_id = take_snapshot(activities)
+    if version_id:
+        logger.info(f"Recorded snapshot version {version_id}")
+    
+    removed = prune_cold(activities, keep=snapshot_cold_refs())
+    if removed:
+        logger.info(f"Removed {removed} unreferenced cold detail files")
+    recompressed = ensure_dictionary()
+    if recompressed:
+        logger.info(f"Trained a cold-storage dictionary and recompressed {recompressed} detail files")
+    
+    logger.info(f"Saved {len(activities)} activities to {activities_file}")
+    
+    # Memory-mapped numeric columns so the stats scripts can skip parsing the JSON
+    write_activity_columns(activities)
+    
+    # Keep the daily-aggregate table in step (only changed days are rebuilt)
+    return activities, refresh_daily_aggregates(activities)
+
+
 class StravaSync:
+    # Shared by every client in this process so concurrent workers refresh only once
+    _token_thread_lock = threading.Lock()
+    
     def __init__(self):
         """Initialize Strava API client with credentials from environment variables."""
         self.client_id = os.getenv('STRAVA_CLIENT_ID')
         self.client_secret = os.getenv('STRAVA_CLIENT_SECRET')
         self.refresh_token = os.getenv('STRAVA_REFRESH_TOKEN')
         
+        # Fallback when a cached (rotated) refresh token stops working, e.g. after re-authorizing
+        self.env_refresh_token = self.refresh_token
+        
         if not all([self.client_id, self.client_secret, self.refresh_token]):
             raise ValueError("Missing required Strava API credentials in environment variables")
         
         self.access_token = None
         self.token_expires_at = None
+        self.token_cache_file = os.getenv('STRAVA_TOKEN_CACHE', '.strava_token_cache')
         self.base_url = "https://www.strava.com/api/v3"
         
+        # Reuse one HTTP connection pool across requests (and across syncs in watch mode)
+        self.session = requests.Session()
+        
+        # In-memory activity store, kept alive between syncs in watch mode
+        self._activities = None
+        
+        # Details of the most recent sync, used to regenerate only changed outputs
+        self.daily_aggregates = None
+        self.last_changed_ids = set()
+        self.pending_details = 0
+        
         # Rate limiting
         self.rate_limit_remaining = 600  # Strava allows 600 requests per 15 minutes
         self.rate_limit_reset_time = None
         
+        # Pick up a still-valid access token and the latest rotated refresh token
+        self.load_cached_token()
+    
+    def _get_token_cipher(self):
+        """Get the Fernet cipher for the token cache, or None if encryption is unavailable."""
+        if Fernet is None:
+            return None
+        
+        # Use an explicit key if given, otherwise derive one from the client secret
+        key = os.getenv('STRAVA_TOKEN_CACHE_KEY')
+        if not key:
+            derived = hashlib.pbkdf2_hmac('sha256', self.client_secret.encode('utf-8'),
+                                          f'strava-view:{self.client_id}'.encode('utf-8'), 100000)
+            key = base64.urlsafe_b64encode(derived).decode('ascii')
+        return Fernet(key)
+    
+    def load_cached_token(self) -> bool:
+        """Load the access token and refresh token from the encrypted local cache."""
+        cipher = self._get_token_cipher()
+        if cipher is None or not os.path.exists(self.token_cache_file):
+            return False
+        
+        try:
+            with open(self.token_cache_file, 'rb') as f:
+                token_data = json.loads(cipher.decrypt(f.read()))
+            
+            if str(token_data.get('client_id')) != str(self.client_id):
+                return False
+            
+            self.access_token = token_data['access_token']
+            self.refresh_token = token_data['refresh_token']
+            self.token_expires_at = token_data['expires_at']
+            logger.info("Loaded Strava token from local cache")
+            return True
+            
+        except (InvalidToken, ValueError, KeyError, OSError) as e:
+            logger.warning(f"Ignoring unreadable token cache: {e}")
+            return False
+    
+    def save_cached_token(self) -> bool:
+        """Write the current tokens to the encrypted local cache."""
+        cipher = self._get_token_cipher()
+        if cipher is None:
+            logger.warning("cryptography is not installed, rotated refresh token will not be cached")
+            return False
+        
+        token_data = {
+            'client_id': self.client_id,
+            'access_token': self.access_token,
+            'refresh_token': self.refresh_token,
+            'expires_at': self.token_expires_at
+        }
+        
+        try:
+            # Write to a temp file first so readers never see a partial cache
+            temp_file = f"{self.token_cache_file}.tmp"
+            fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(cipher.encrypt(json.dumps(token_data).encode('utf-8')))
+            os.replace(temp_file, self.token_cache_file)
+            return True
+        except OSError as e:
+            logger.error(f"Failed to write token cache: {e}")
+            return False
+
     def refresh_access_token(self) -> bool:
-        """Refresh the access token using the refresh token."""
+        """
+        Refresh the access token using the refresh token.
+        
+        If the cached refresh token is rejected (revoked, or replaced by re-authorizing), retry
+        once with STRAVA_REFRESH_TOKEN; a success overwrites the stale cache.
+        """
+        if self._request_access_token(self.refresh_token):
+            return True
+        if self.refresh_token == self.env_refresh_token:
+            return False
+        
+        logger.warning("Cached refresh token was rejected, retrying with STRAVA_REFRESH_TOKEN")
+        return self._request_access_token(self.env_refresh_token)
+    
+    def _request_access_token(self, refresh_token: str) -> bool:
+        """Exchange a refresh token for a new access token and cache the result."""
         try:
             logger.info("Refreshing Strava access token...")
             
             data = {
                 'client_id': self.client_id,
                 'client_secret': self.client_secret,
-                'refresh_token': self.refresh_token,
+                'refresh_token': refresh_token,
                 'grant_type': 'refresh_token'
             }
             
-            response = requests.post('https://www.strava.com/oauth/token', data=data)
+            response = self.session.post('https://www.strava.com/oauth/token', data=data)
             response.raise_for_status()
             
             token_data = response.json()
@@ -59,6 +256,7 @@ class StravaSync:
             self.token_expires_at = token_data['expires_at']
             
             logger.info("Access token refreshed successfully")
+            self.save_cached_token()
             return True
             
         except Exception as e:
@@ -74,10 +272,27 @@ class StravaSync:
         return time.time() < (self.token_expires_at - 300)
     
     def ensure_valid_token(self) -> bool:
-        """Ensure we have a valid access token."""
-        if not self.is_token_valid():
-            return self.refresh_access_token()
-        return True
+        """Ensure we have a valid access token, refreshing at most once across workers."""
+        if self.is_token_valid():
+            return True
+        
+        # Threads share a lock; other processes are serialized through a lock file
+        with self._token_thread_lock:
+            lock_file = open(f"{self.token_cache_file}.lock", 'w') if fcntl else None
+            try:
+                if lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                
+                # Another worker may have refreshed while we were waiting
+                self.load_cached_token()
+                if self.is_token_valid():
+                    return True
+                
+                return self.refresh_access_token()
+            finally:
+                if lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
     
     def handle_rate_limit(self, response: requests.Response) -> None:
         """Handle rate limiting based on response headers."""
@@ -105,7 +320,7 @@ class StravaSync:
         headers = {'Authorization': f'Bearer {self.access_token}'}
         
         try:
-            response = requests.get(url, headers=headers, params=params or {})
+            response = self.session.get(url, headers=headers, params=params or {})
             self.handle_rate_limit(response)
             
             if response.status_code == 429:
@@ -140,17 +355,20 @@ class StravaSync:
         return self.make_api_request(f'activities/{activity_id}')
     
     def load_existing_activities(self) -> List[Dict]:
-        """Load existing activities from local JSON file."""
+        """Load existing activities from local JSON file (cached in memory after the first load)."""
+        if self._activities is not None:
+            return self._activities
+        
         activities_file = 'data/activities.json'
         
-        if not os.path.exists(activities_file):
+        if not os.path.exists(stored_path(activities_file)):
             logger.info("No existing activities file found, starting fresh")
             return []
         
         try:
-            with open(activities_file, 'r', encoding='utf-8') as f:
-                activities = json.load(f)
+            activities = load_json(activities_file)
             logger.info(f"Loaded {len(activities)} existing activities")
+            self._activities = activities
             return activities
         except Exception as e:
             logger.error(f"Failed to load existing activities: {e}")
@@ -159,15 +377,7 @@ class StravaSync:
     def save_activities(self, activities: List[Dict]) -> bool:
         """Save activities to local JSON file."""
         try:
-            os.makedirs('data', exist_ok=True)
-            
-            # Sort activities by start_date (newest first)
-            activities.sort(key=lambda x: x.get('start_date', ''), reverse=True)
-            
-            with open('data/activities.json', 'w', encoding='utf-8') as f:
-                json.dump(activities, f, indent=2, ensure_ascii=False)
-            
-            logger.info(f"Saved {len(activities)} activities to data/activities.json")
+            self._activities, self.daily_aggregates = write_activity_store(activities)
             return True
             
         except Exception as e:
@@ -180,17 +390,10 @@ class StravaSync:
             return None
         
         try:
-            # Find the most recent start_date_local from all activities
-            latest_date = None
-            for activity in activities:
-                # Use start_date_local for local timezone or start_date as fallback
-                start_date_str = activity.get('start_date_local') or activity.get('start_date')
-                if start_date_str:
-                    activity_date = parse_local_datetime(start_date_str)
-                    if activity_date and (latest_date is None or activity_date > latest_date):
-                        latest_date = activity_date
-            
-            return latest_date
+            latest_epoch = max((get_derived_fields(activity).get('epoch', 0) for activity in activities), default=0)
+            if not latest_epoch:
+                return None
+            return datetime.fromtimestamp(latest_epoch, timezone.utc)
         except Exception as e:
             logger.error(f"Failed to parse activity dates: {e}")
             return None
@@ -205,8 +408,10 @@ class StravaSync:
         logger.info(f"Starting {'full' if full_sync else 'incremental'} sync...")
         
         # Load existing activities
-        existing_activities = self.load_existing_activities()
-        existing_ids = {act.get('id') for act in existing_activities if act.get('id')}
+        # Work on a copy: a failed save must leave the in-memory store matching the disk
+        existing_activities = list(self.load_existing_activities())
+        existing_index = {act.get('id'): i for i, act in enumerate(existing_activities) if act.get('id')}
+        self.last_changed_ids = set()
         
         # Determine sync parameters (based on running_page logic)
         after_timestamp = None
@@ -235,6 +440,10 @@ class StravaSync:
             if not activities:
                 break
             
+            # Queue new activities for detail fetching; pending_details is the queue depth
+            detail_queue = [a['id'] for a in activities if a.get('id') and a['id'] not in existing_index]
+            self.pending_details += len(detail_queue)
+            
             # Process activities immediately (streaming approach)
             for activity in activities:
                 activity_id = activity.get('id')
@@ -242,23 +451,28 @@ class StravaSync:
                     continue
                 
                 # Check if this is a new activity
-                if activity_id not in existing_ids:
+                if activity_id not in existing_index:
                     # Get detailed activity data only for new activities
                     detailed_activity = self.get_activity_details(activity_id)
+                    self.pending_details -= 1
                     if detailed_activity:
+                        detailed_activity['derived'] = derive_activity_fields(detailed_activity)
                         all_activities.append(detailed_activity)
+                        self.last_changed_ids.add(activity_id)
                         new_count += 1
                         print("+", end="", flush=True)  # Running_page style progress
                 else:
-                    # Activity already exists, just add the summary (for potential updates)
-                    # Find existing activity and update if needed
-                    for i, existing in enumerate(existing_activities):
-                        if existing.get('id') == activity_id:
-                            # Update with latest summary data
-                            existing_activities[i] = activity
-                            updated_count += 1
-                            print(".", end="", flush=True)  # Running_page style progress
-                            break
+                    # Activity already exists, merge the latest summary data over the stored
+                    # record so detail-only fields (laps, splits, efforts) are kept
+                    i = existing_index[activity_id]
+                    existing = existing_activities[i]
+                    if summary_changed(existing, activity):
+                        merged = merge_summary(existing, activity)
+                        merged['derived'] = derive_activity_fields(merged)
+                        existing_activities[i] = merged
+                        self.last_changed_ids.add(activity_id)
+                        updated_count += 1
+                        print(".", end="", flush=True)  # Running_page style progress
                     
                 # Small delay to respect rate limits
                 time.sleep(0.1)
@@ -271,11 +485,12 @@ class StravaSync:
             
             page += 1
         
+        self.pending_details = 0
         print()  # New line after progress indicators
         logger.info(f"Sync completed: {new_count} new, {updated_count} updated")
         
-        # Only save if we have new activities or this is a full sync
-        if new_count > 0 or full_sync:
+        # Only save if we have new or changed activities, or this is a full sync
+        if new_count > 0 or updated_count > 0 or full_sync:
             # Combine new activities with existing ones
             if full_sync:
                 final_activities = all_activities
@@ -302,6 +517,190 @@ class StravaSync:
             logger.info("No new activities found, skipping save")
             return True
 
+    def get_changed_years(self) -> Set[int]:
+        """Get the years touched by the activities changed in the most recent sync."""
+        years = set()
+        for activity in self.load_existing_activities():
+            if activity.get('id') in self.last_changed_ids:
+                year = get_derived_fields(activity).get('year')
+                if year:
+                    years.add(year)
+        return years
+
+
+class WatchStatus:
+    """Shared state of the watch daemon, reported by the status endpoint."""
+    
+    def __init__(self, sync_client: StravaSync):
+        self.sync_client = sync_client
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.sync_count = 0
+        self.consecutive_failures = 0
+        self.last_sync_at = None
+        self.last_success_at = None
+        self.last_sync_latency = None
+        self.last_changed_count = 0
+        self.next_sync_at = None
+    
+    def record_sync(self, success: bool, latency: float, changed_count: int, next_sync_at: float) -> None:
+        """Record the outcome of one sync cycle."""
+        with self.lock:
+            now = time.time()
+            self.sync_count += 1
+            self.last_sync_at = now
+            self.last_sync_latency = latency
+            self.last_changed_count = changed_count
+            self.next_sync_at = next_sync_at
+            if success:
+                self.last_success_at = now
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+    
+    def is_healthy(self) -> bool:
+        """The daemon is healthy unless the last three syncs in a row failed."""
+        return self.consecutive_failures < 3
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Snapshot of the daemon status as a JSON-serializable dict."""
+        with self.lock:
+            activities = self.sync_client._activities
+            return {
+                'status': 'ok' if self.is_healthy() else 'degraded',
+                'uptime': round(time.time() - self.started_at, 1),
+                'sync_count': self.sync_count,
+                'consecutive_failures': self.consecutive_failures,
+                'last_sync_at': self.last_sync_at,
+                'last_success_at': self.last_success_at,
+                'last_sync_latency': round(self.last_sync_latency, 3) if self.last_sync_latency is not None else None,
+                'last_changed_count': self.last_changed_count,
+                'next_sync_at': self.next_sync_at,
+                'queue_depth': self.sync_client.pending_details,
+                'activity_count': len(activities) if activities is not None else None,
+                'token_valid': self.sync_client.is_token_valid()
+            }
+
+
+def start_status_server(status: WatchStatus, port: int) -> ThreadingHTTPServer:
+    """Serve /health and /status for the watch daemon on a background thread."""
+    
+    class StatusHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/health':
+                code = 200 if status.is_healthy() else 503
+                body = {'status': 'ok' if code == 200 else 'degraded'}
+            elif self.path == '/status':
+                code = 200
+                body = status.to_dict()
+            else:
+                code = 404
+                body = {'error': 'not found'}
+            
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        
+        def log_message(self, format, *args):
+            logger.debug(f"Status server: {format % args}")
+    
+    server = ThreadingHTTPServer(('0.0.0.0', port), StatusHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logger.info(f"Status endpoint listening on port {port} (/health, /status)")
+    return server
+
+
+def regenerate_outputs(activities: List[Dict], aggregates: Dict, years: Set[int],
+                       year_rolled_over: bool = False) -> None:
+    """Regenerate stats and only the generated/ visualizations for the given years."""
+    import calculate_stats
+    import generate_visualizations
+    
+    calculate_stats.main()
+    
+    for year in sorted(years):
+        generate_visualizations.generate_year_outputs(aggregates, year)
+    
+    # All-time stats change with any year; the *_all SVGs show the current year, so only
+    # redraw them when it changed or a new year began
+    generate_visualizations.generate_all_time_stats(aggregates)
+    if year_rolled_over or datetime.now().year in years:
+        generate_visualizations.generate_current_year_outputs(aggregates)
+    
+    generate_visualizations.generate_training_load(aggregates)
+    generate_visualizations.generate_year_comparison(aggregates)
+    generate_visualizations.generate_api(activities, aggregates)
+    generate_visualizations.publish_precompressed()
+
+
+def refresh_current_year_outputs(aggregates: Optional[Dict]) -> None:
+    """Redraw the *_all SVGs for a new year when no activity changed."""
+    import generate_visualizations
+    
+    generate_visualizations.generate_current_year_outputs(aggregates or load_daily_aggregates())
+    generate_visualizations.publish_precompressed()
+
+
+def run_watch(sync_client: StravaSync) -> None:
+    """
+    Run the sync in a long-lived loop, keeping the token, HTTP session and activities in memory.
+    
+    The poll interval starts at WATCH_INTERVAL seconds, grows while nothing changes or syncs
+    fail, and snaps back to WATCH_INTERVAL as soon as new data arrives.
+    """
+    interval = int(os.getenv('WATCH_INTERVAL', '900'))
+    max_interval = int(os.getenv('WATCH_MAX_INTERVAL', '14400'))
+    port = int(os.getenv('WATCH_STATUS_PORT', '8787'))
+    
+    status = WatchStatus(sync_client)
+    start_status_server(status, port)
+    
+    delay = interval
+    # Year the *_all SVGs were last drawn for; unknown until the first pass
+    overall_year = None
+    while True:
+        started = time.time()
+        try:
+            success = sync_client.sync_activities()
+        except Exception as e:
+            logger.error(f"Sync cycle failed: {e}")
+            success = False
+        latency = time.time() - started
+        changed_count = len(sync_client.last_changed_ids) if success else 0
+        current_year = datetime.now().year
+        
+        if success and changed_count:
+            try:
+                years = sync_client.get_changed_years()
+                logger.info(f"Regenerating outputs for years: {sorted(years)}")
+                regenerate_outputs(sync_client.load_existing_activities(), sync_client.daily_aggregates, years,
+                                   year_rolled_over=current_year != overall_year)
+                overall_year = current_year
+            except Exception as e:
+                logger.error(f"Failed to regenerate outputs: {e}")
+            delay = interval
+        elif success:
+            if current_year != overall_year:
+                try:
+                    logger.info(f"Drawing current-year outputs for {current_year}")
+                    refresh_current_year_outputs(sync_client.daily_aggregates)
+                    overall_year = current_year
+                except Exception as e:
+                    logger.error(f"Failed to regenerate outputs: {e}")
+            # Nothing new: poll a little less often
+            delay = min(delay * 1.5, max_interval)
+        else:
+            # Failure: back off exponentially
+            delay = min(delay * 2, max_interval)
+        
+        status.record_sync(success, latency, changed_count, time.time() + delay)
+        logger.info(f"Sync took {latency:.1f}s, next sync in {delay:.0f}s")
+        time.sleep(delay)
+
 def main():
     """Main function to run the sync process."""
     try:
@@ -314,6 +713,11 @@ def main():
         # Initialize sync client
         sync_client = StravaSync()
         
+        # Run as a long-lived daemon if requested
+        if '--watch' in sys.argv or os.getenv('WATCH_MODE', '').lower() in ('true', '1', 'yes'):
+            run_watch(sync_client)
+            return
+        
         # Determine sync type
         full_sync = os.getenv('FULL_SYNC', '').lower() in ('true', '1', 'yes')
         
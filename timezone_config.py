@@ -85,6 +85,64 @@ def format_local_datetime(dt: datetime) -> str:
         return local_dt.strftime('%Y-%m-%d %H:%M:%S')
 
 
+# Bump when the derived block gains or changes fields so stored blocks are recomputed
+DERIVED_FIELDS_VERSION = 1
+
+
+def derive_activity_fields(activity: dict) -> dict:
+    """
+    Compute the normalized date and pace block stored with each activity at sync time.
+    
+    Strava's start_date is real UTC, while start_date_local is local wall-clock time that
+    also carries a 'Z' suffix. Local time is therefore built from start_date + utc_offset
+    (or the wall clock of start_date_local), never by converting start_date_local again.
+    """
+    start_date = activity.get('start_date')
+    start_date_local = activity.get('start_date_local')
+    utc_offset = activity.get('utc_offset')
+    
+    if start_date and utc_offset is not None:
+        utc_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+        epoch = int(utc_dt.timestamp())
+        local_dt = utc_dt.replace(tzinfo=None) + timedelta(seconds=utc_offset)
+    elif start_date_local:
+        local_dt = datetime.fromisoformat(start_date_local.rstrip('Z')).replace(tzinfo=None)
+        offset_hours = load_timezone_config()['offset']
+        epoch = int(local_dt.replace(tzinfo=timezone(timedelta(hours=offset_hours))).timestamp())
+    elif start_date:
+        utc_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+        epoch = int(utc_dt.timestamp())
+        local_dt = utc_dt.astimezone(get_local_timezone()).replace(tzinfo=None)
+    else:
+        return {}
+    
+    distance = activity.get('distance') or 0
+    moving_time = activity.get('moving_time') or 0
+    iso_year, iso_week, _ = local_dt.isocalendar()
+    
+    return {
+        'version': DERIVED_FIELDS_VERSION,
+        'local_date': local_dt.strftime('%Y-%m-%d'),
+        'year': local_dt.year,
+        'day_of_year': local_dt.timetuple().tm_yday,
+        'iso_year': iso_year,
+        'iso_week': iso_week,
+        'weekday': local_dt.weekday(),  # Monday = 0, Sunday = 6
+        'hour': local_dt.hour,
+        'epoch': epoch,
+        'pace': round(moving_time / (distance / 1000), 1) if distance > 0 and moving_time > 0 else None
+    }
+
+
+def get_derived_fields(activity: dict) -> dict:
+    """Get an activity's derived block, computing it for records synced before it existed."""
+    derived = activity.get('derived')
+    if not derived or derived.get('version') != DERIVED_FIELDS_VERSION:
+        derived = derive_activity_fields(activity)
+        activity['derived'] = derived
+    return derived
+
+
 def get_timezone_info() -> dict:
     """Get current timezone configuration info."""
     config = load_timezone_config()
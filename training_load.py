@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Training load and rolling-window analytics.
+Maintains daily ATL/CTL/TSB fitness curves and rolling weekly/monthly running distance from
+the daily-aggregate table, updating persisted state only from the earliest changed day.
+"""
+
+import os
+from datetime import datetime, timedelta
+from daily_aggregates import (
+    RUN_SPORT_TYPES, get_change_cursor, get_changed_dates_since, get_day_totals, refresh_daily_aggregates
+)
+from storage_codec import stored_path
+from serialization import load_json, dump_json, save_store
+
+STATE_FILE = 'data/training_load.json'
+OUTPUT_FILE = 'generated/training_load.json'
+
+# Bump when the series layout or constants change so stale state is recomputed
+STATE_VERSION = 1
+
+ATL_DAYS = 7    # Acute training load (fatigue) time constant
+CTL_DAYS = 42   # Chronic training load (fitness) time constant
+WEEK_DAYS = 7
+MONTH_DAYS = 30
+
+
+def new_training_state():
+    """Create empty training-load state."""
+    return {
+        'version': STATE_VERSION,
+        'cursor': None,
+        'start_date': None,
+        # Daily series aligned to start_date
+        'load': [],
+        'distance': [],
+        'atl': [],
+        'ctl': [],
+        'weekly_distance': [],
+        'monthly_distance': []
+    }
+
+
+def load_training_state(file_path=STATE_FILE):
+    """Load persisted training-load state, or return empty state if missing or outdated."""
+    if not os.path.exists(stored_path(file_path)):
+        return new_training_state()
+
+    try:
+        state = load_json(file_path)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to load {file_path}, recomputing: {e}")
+        return new_training_state()
+
+    if state.get('version') != STATE_VERSION:
+        return new_training_state()
+    return state
+
+
+def save_training_state(state, file_path=STATE_FILE):
+    """Save training-load state."""
+    save_store(file_path, state)
+
+
+def update_training_load(state, aggregates, today=None):
+    """
+    Extend the training-load series up to today.
+
+    Days from the earliest date changed in the aggregate table since the last update are
+    recomputed; everything before that is reused, so a normal run costs O(new days).
+    Returns the number of days computed.
+    """
+    today = today or datetime.now().date()
+    first_year = min((int(year) for year in aggregates['years']), default=None)
+    if first_year is None:
+        state.update(new_training_state())
+        return 0
+
+    changed = get_changed_dates_since(aggregates, state['cursor'])
+    start_date = datetime.strptime(state['start_date'], '%Y-%m-%d').date() if state['start_date'] else None
+    first_date = datetime.strptime(min(aggregates['years'][str(first_year)]), '%Y-%m-%d').date()
+
+    # Recompute from scratch when there is no usable history or history moved earlier
+    if changed is None or start_date is None or first_date < start_date:
+        state.update(new_training_state())
+        state['start_date'] = first_date.strftime('%Y-%m-%d')
+        start_date = first_date
+        resume = 0
+    else:
+        resume = len(state['load'])
+        if changed:
+            earliest = datetime.strptime(min(changed), '%Y-%m-%d').date()
+            resume = min(resume, max((earliest - start_date).days, 0))
+
+    # Drop everything from the resume point onwards
+    for key in ('load', 'distance', 'atl', 'ctl', 'weekly_distance', 'monthly_distance'):
+        del state[key][resume:]
+
+    total_days = (today - start_date).days + 1
+    load, distance = state['load'], state['distance']
+    atl, ctl = state['atl'], state['ctl']
+    weekly, monthly = state['weekly_distance'], state['monthly_distance']
+
+    for index in range(resume, total_days):
+        local_date = (start_date + timedelta(days=index)).strftime('%Y-%m-%d')
+        totals = get_day_totals(aggregates, local_date)
+        run_totals = get_day_totals(aggregates, local_date, RUN_SPORT_TYPES)
+        day_load = totals['load'] if totals else 0.0
+        day_distance = round(run_totals['distance'], 3) if run_totals else 0.0
+
+        previous_atl = atl[-1] if atl else 0.0
+        previous_ctl = ctl[-1] if ctl else 0.0
+        previous_week = weekly[-1] if weekly else 0.0
+        previous_month = monthly[-1] if monthly else 0.0
+
+        # Rolling sums: add today, drop the day falling out of the window
+        week_drop = distance[index - WEEK_DAYS] if index >= WEEK_DAYS else 0.0
+        month_drop = distance[index - MONTH_DAYS] if index >= MONTH_DAYS else 0.0
+
+        load.append(round(day_load, 1))
+        distance.append(day_distance)
+        atl.append(previous_atl + (day_load - previous_atl) / ATL_DAYS)
+        ctl.append(previous_ctl + (day_load - previous_ctl) / CTL_DAYS)
+        weekly.append(max(previous_week + day_distance - week_drop, 0.0))
+        monthly.append(max(previous_month + day_distance - month_drop, 0.0))
+
+    state['cursor'] = get_change_cursor(aggregates)
+    return max(total_days - resume, 0)
+
+
+def build_training_series(state):
+    """Build the compact JSON series written for the frontend."""
+    return {
+        'start_date': state['start_date'],
+        'atl_days': ATL_DAYS,
+        'ctl_days': CTL_DAYS,
+        'load': state['load'],
+        'atl': [round(value, 1) for value in state['atl']],
+        'ctl': [round(value, 1) for value in state['ctl']],
+        'tsb': [round(c - a, 1) for a, c in zip(state['atl'], state['ctl'])],
+        'weekly_km': [round(value, 1) for value in state['weekly_distance']],
+        'monthly_km': [round(value, 1) for value in state['monthly_distance']]
+    }
+
+
+def generate_training_load(aggregates, state_file=STATE_FILE, output_file=OUTPUT_FILE):
+    """Update the persisted state from the aggregate table and write the frontend series."""
+    state = load_training_state(state_file)
+    days = update_training_load(state, aggregates)
+    save_training_state(state, state_file)
+
+    dump_json(output_file, build_training_series(state))
+    return days
+
+
+def main():
+    """Update training-load analytics from data/activities.json."""
+    from generate_visualizations import load_activities
+
+    aggregates = refresh_daily_aggregates(load_activities())
+    days = generate_training_load(aggregates)
+    print(f"Training load updated ({days} days computed), saved to {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
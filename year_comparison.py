@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Year-over-year comparison data.
+Precomputes cumulative distance, time and activity count by day of year for every year,
+plus deltas against the previous year, so the dashboard's comparison view needs no
+per-activity work in the browser.
+"""
+
+from datetime import datetime
+from daily_aggregates import RUN_SPORT_TYPES, get_daily_totals
+from serialization import dump_json
+
+OUTPUT_FILE = 'generated/year_comparison.json'
+
+# Series are indexed on a leap-year calendar so the same index is the same month/day in
+# every year; in other years Feb 29 repeats the Feb 28 value.
+DAYS = 366
+
+
+def day_index(local_date):
+    """Index of a YYYY-MM-DD date on the leap-year calendar (Jan 1 = 0, Mar 1 = 60)."""
+    month, day = int(local_date[5:7]), int(local_date[8:10])
+    return datetime(2000, month, day).timetuple().tm_yday - 1
+
+
+def build_cumulative_series(daily):
+    """Build cumulative distance (km), moving time (s) and count arrays from one year's daily totals."""
+    distance = [0.0] * DAYS
+    moving_time = [0] * DAYS
+    count = [0] * DAYS
+    for local_date, day in daily.items():
+        index = day_index(local_date)
+        distance[index] += day['distance']
+        moving_time[index] += day['moving_time']
+        count[index] += day['count']
+
+    for index in range(1, DAYS):
+        distance[index] += distance[index - 1]
+        moving_time[index] += moving_time[index - 1]
+        count[index] += count[index - 1]
+
+    return {
+        'distance': [round(value, 1) for value in distance],
+        'time': moving_time,
+        'count': count
+    }
+
+
+def build_year_comparison(aggregates, today=None):
+    """Build the comparison document for all sports and for runs only."""
+    from generate_visualizations import calculate_yearly_stats
+
+    today = today or datetime.now().date()
+    years = sorted(int(year) for year in aggregates['years'])
+    comparison = {'days': DAYS, 'years': years, 'series': {}, 'deltas': {}, 'totals': {}}
+
+    for group, sport_types in (('all', None), ('run', RUN_SPORT_TYPES)):
+        series = {}
+        deltas = {}
+        for year in years:
+            daily = get_daily_totals(aggregates, year, sport_types)
+            series[str(year)] = build_cumulative_series(daily)
+            if group == 'all':
+                comparison['totals'][str(year)] = calculate_yearly_stats(daily)
+
+            # The current year's curve stops at today instead of running flat to Dec 31
+            if year == today.year:
+                last = day_index(today.strftime('%Y-%m-%d')) + 1
+                for key in ('distance', 'time', 'count'):
+                    del series[str(year)][key][last:]
+
+            previous = series.get(str(year - 1))
+            if previous:
+                current = series[str(year)]
+                deltas[str(year)] = {
+                    'vs': year - 1,
+                    'distance': [round(a - b, 1) for a, b in zip(current['distance'], previous['distance'])],
+                    'time': [a - b for a, b in zip(current['time'], previous['time'])]
+                }
+
+        comparison['series'][group] = series
+        comparison['deltas'][group] = deltas
+
+    return comparison
+
+
+def generate_year_comparison(aggregates, output_file=OUTPUT_FILE):
+    """Write the comparison document."""
+    comparison = build_year_comparison(aggregates)
+    dump_json(output_file, comparison)
+    return comparison['years']
+
+
+if __name__ == "__main__":
+    from daily_aggregates import refresh_daily_aggregates
+    from generate_visualizations import load_activities
+    years = generate_year_comparison(refresh_daily_aggregates(load_activities()))
+    print(f"Year comparison for {years} saved to {OUTPUT_FILE}")